@@ -0,0 +1,138 @@
+"""
+benchmark tile compressed FITS writing - server-side
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy
+from astropy.io import fits as pyfits
+
+import azcam
+from azcam_server.tools.fits_compress import CompressedFitsWriter
+
+# typical frames as [numamps, numrows_amp, numcols_amp]
+FRAME_SHAPES = {
+    "1amp_2k": [1, 2068, 2100],
+    "4amp_4k": [4, 2068, 2100],
+    "16amp_4k": [16, 2020, 540],
+}
+
+
+def benchmark_compression(loops: int = 3, use_image: int = 0, jsonfile: str = ""):
+    """
+    Compare write time and file size of uncompressed and tile compressed MEF files.
+    Frames are synthetic bias-like data of typical shapes, or the current exposure
+    image data if use_image is True.
+    loops is the number of writes of each frame and compression type.
+    jsonfile is an optional filename to write results as JSON.
+    Returns a dictionary of results.
+    """
+
+    loops = int(loops)
+    use_image = int(use_image)
+
+    frames = {}
+    if use_image:
+        image = azcam.db.tools["exposure"].image
+        fp = image.focalplane
+        shape = [fp.numamps_image, fp.numrows_amp, fp.numcols_amp]
+        frames["image"] = image.data[:, : shape[1] * shape[2]].reshape(shape)
+    else:
+        rng = numpy.random.default_rng(0)
+        for name, shape in FRAME_SHAPES.items():
+            data = 1000.0 + rng.normal(0.0, 5.0, shape)
+            frames[name] = data.astype("<u2")
+
+    writer = CompressedFitsWriter()
+    folder = tempfile.mkdtemp()
+    filename = os.path.join(folder, "benchmark.fits")
+
+    results = {"loops": loops, "frames": {}}
+
+    try:
+        for name, data in frames.items():
+            shape = list(data.shape)
+            mbytes = data.nbytes / 1.0e6
+            flat = data.reshape(shape[0], -1)
+            ext_headers = [pyfits.Header().tostring()] * shape[0]
+            ext_names = [f"im{i + 1}" for i in range(shape[0])]
+
+            frame = {"shape": shape}
+
+            # uncompressed in server process
+            times = []
+            for _ in range(loops):
+                t0 = time.perf_counter()
+                hdulist = pyfits.HDUList([pyfits.PrimaryHDU()])
+                for ext in range(shape[0]):
+                    hdulist.append(pyfits.ImageHDU(data=data[ext], name=ext_names[ext]))
+                hdulist.writeto(filename, overwrite=True)
+                times.append(time.perf_counter() - t0)
+            frame["NONE"] = _result(times, mbytes, os.path.getsize(filename), data.nbytes)
+
+            # compressed in worker processes
+            for ctype in ["RICE_1", "GZIP_1", "GZIP_2"]:
+                times = []
+                for _ in range(loops):
+                    t0 = time.perf_counter()
+                    size = writer.write_data(
+                        filename,
+                        flat,
+                        shape,
+                        data.dtype,
+                        pyfits.Header().tostring(),
+                        ext_headers,
+                        ext_names,
+                        ctype,
+                    )
+                    times.append(time.perf_counter() - t0)
+                frame[ctype] = _result(times, mbytes, size, data.nbytes)
+
+            results["frames"][name] = frame
+
+    finally:
+        writer.close()
+        if os.path.exists(filename):
+            os.remove(filename)
+        os.rmdir(folder)
+
+    # report
+    azcam.log(f"{'frame':<10s} {'type':<8s} {'time_s':>8s} {'MB/s':>8s} {'ratio':>7s}")
+    for name, frame in results["frames"].items():
+        for ctype, res in frame.items():
+            if ctype == "shape":
+                continue
+            azcam.log(
+                f"{name:<10s} {ctype:<8s} {res['median_s']:8.3f} "
+                f"{res['mbytes_per_s']:8.1f} {res['ratio']:7.2f}"
+            )
+
+    if jsonfile != "":
+        with open(jsonfile, "w") as f:
+            json.dump(results, f, indent=2)
+
+    return results
+
+
+def _result(times, mbytes, filesize, nbytes):
+    """
+    Summary of one frame and compression type.
+    """
+
+    median = float(numpy.median(times))
+
+    return {
+        "median_s": median,
+        "mbytes_per_s": mbytes / median,
+        "filesize": int(filesize),
+        "ratio": nbytes / filesize,
+    }
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    benchmark_compression(*args)
@@ -0,0 +1,166 @@
+"""
+benchmark controller datalink latency and image transfer throughput - server-side
+"""
+
+import json
+import sys
+import time
+
+import numpy
+
+import azcam
+
+
+def benchmark_datalink(loops: int = 100, images: int = 3, jsonfile: str = ""):
+    """
+    Benchmark controller datalink for ARC and Mag controllers.
+    Measures round trip latency of test_datalink() for each board and image transfer
+    throughput of zero exposures using synthetic data when the controller supports it.
+    loops is the number of latency measurements for each board.
+    images is the number of images to read for throughput.
+    jsonfile is an optional filename to write results as JSON.
+    Returns a dictionary of results.
+    """
+
+    loops = int(loops)
+    images = int(images)
+
+    controller = azcam.db.tools["controller"]
+
+    results = {
+        "controller": controller.controller_class,
+        "loops": loops,
+        "latency": {},
+        "throughput": {},
+    }
+
+    # boards to test, Mag controllers ignore board number
+    if controller.controller_class == "mag":
+        boards = {"controller": 2}
+    else:
+        boards = {}
+        if controller.pci_board_installed:
+            boards["pci"] = controller.PCIBOARD
+        if controller.timing_board_installed:
+            boards["timing"] = controller.TIMINGBOARD
+        if controller.utility_board_installed:
+            boards["utility"] = controller.UTILITYBOARD
+
+    # round trip latency
+    for name, board in boards.items():
+        times = []
+        for loop in range(loops):
+            t0 = time.perf_counter()
+            controller.test_datalink(board, loop, 1)
+            times.append(time.perf_counter() - t0)
+        times = numpy.array(times) * 1000.0
+        results["latency"][name] = {
+            "min_ms": float(times.min()),
+            "median_ms": float(numpy.median(times)),
+            "p99_ms": float(numpy.percentile(times, 99)),
+            "max_ms": float(times.max()),
+        }
+
+    # image transfer throughput
+    if images > 0:
+        if controller.controller_class in ["arc", "mag"]:
+            results["throughput"] = _benchmark_throughput(images)
+        else:
+            azcam.log("Image transfer throughput is only measured for ARC and Mag controllers")
+
+    # report
+    azcam.log("Datalink latency (ms)")
+    azcam.log(f"{'board':<12s} {'min':>8s} {'median':>8s} {'p99':>8s} {'max':>8s}")
+    for name, lat in results["latency"].items():
+        azcam.log(
+            f"{name:<12s} {lat['min_ms']:8.3f} {lat['median_ms']:8.3f} "
+            f"{lat['p99_ms']:8.3f} {lat['max_ms']:8.3f}"
+        )
+    if results["throughput"]:
+        tp = results["throughput"]
+        azcam.log(
+            f"Image transfer: {tp['pixels']} pixels, median transfer {tp['median_s']:.3f} s, "
+            f"{tp['mpix_per_s']:.3f} Mpix/s, {tp['mbytes_per_s']:.3f} MB/s "
+            f"(synthetic {tp['synthetic']})"
+        )
+
+    if jsonfile != "":
+        with open(jsonfile, "w") as f:
+            json.dump(results, f, indent=2)
+
+    return results
+
+
+def _benchmark_throughput(images):
+    """
+    Time the image data transfer of zero exposures from the exposure timeline.
+    Images are not saved, displayed, or sent.
+    """
+
+    controller = azcam.db.tools["controller"]
+    exposure = azcam.db.tools["exposure"]
+
+    # synthetic data is used only if the controller state can be read and restored
+    synthetic = hasattr(controller, "set_synthetic_data") and hasattr(
+        controller, "get_synthetic_data"
+    )
+    if synthetic:
+        old_synthetic = controller.get_synthetic_data()
+        controller.set_synthetic_data("synthetic")
+
+    old_testimage = exposure.test_image
+    old_imagetype = exposure.image_type
+    old_exposuretime = exposure.exposure_time
+    old_savefile = exposure.save_file
+    old_displayimage = exposure.display_image
+    old_sendimage = exposure.send_image
+    exposure.test_image = 1
+    exposure.save_file = 0
+    exposure.display_image = 0
+    exposure.send_image = 0
+
+    times = []
+    try:
+        for _ in range(images):
+            exposure.timeline.start("benchmark")
+            try:
+                exposure.begin(0, "zero", "datalink benchmark")
+                exposure.integrate()
+                exposure.readout()
+                exposure.end()
+                record = exposure.timeline.get_current()
+            finally:
+                exposure.timeline.finish()
+                exposure.exposure_flag = exposure.exposureflags["NONE"]
+            if "transfer" not in record["phases"]:
+                raise azcam.AzcamError("No image transfer time recorded")
+            times.append(record["phases"]["transfer"]["duration"])
+    finally:
+        exposure.test_image = old_testimage
+        exposure.image_type = old_imagetype
+        exposure.exposure_time = old_exposuretime
+        exposure.save_file = old_savefile
+        exposure.display_image = old_displayimage
+        exposure.send_image = old_sendimage
+        if synthetic:
+            controller.set_synthetic_data("synthetic" if old_synthetic else "real")
+
+    pixels = exposure.image.focalplane.numpix_image
+    median = float(numpy.median(times))
+
+    throughput = {
+        "images": images,
+        "pixels": pixels,
+        "synthetic": synthetic,
+        "min_s": float(min(times)),
+        "median_s": median,
+        "mpix_per_s": pixels / median / 1.0e6,
+        "mbytes_per_s": 2 * pixels / median / 1.0e6,
+    }
+
+    return throughput
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    benchmark_datalink(*args)
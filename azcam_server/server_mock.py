@@ -27,6 +27,7 @@ from azcam_server.cmdserver import CommandServer
 from azcam_server.tools.webserver.fastapi_server import WebServer
 from azcam_server.tools.webtools.exptool.exptool import Exptool
 from azcam_server.tools.webtools.status.status import Status
+from azcam_server.tools.webtools.preview.preview import Preview
 from azcam_server.tools.observe.observe import Observe
 from azcam_server.tools.focus import Focus
 import azcam_server.shortcuts
@@ -140,6 +141,9 @@ if 0:
     exptool = Exptool()
     exptool.initialize()
 
+    webpreview = Preview()
+    webpreview.initialize()
+
     # queue = Queue()
     # queue.initialize()
 
@@ -2,6 +2,8 @@
 Contains the CameraServerInterface class for ARC controllers.
 """
 
+import shlex
+
 import azcam
 import azcam.sockets
 
@@ -20,6 +22,12 @@ class CameraServerInterface(object):
 
         self.demo_mode = 0
 
+        # True to send command batches in one write and then read all replies
+        # not yet verified with the controller server, so off by default
+        self.pipeline_commands = 0
+        # seconds to wait for replies to a pipelined command batch
+        self.reply_timeout = 5
+
     def set_server(self, host: str, port: int = 2405) -> None:
         """
         Set host and port of controller server.
@@ -46,9 +54,54 @@ class CameraServerInterface(object):
                 return reply
             except azcam.AzcamError as e:
                 if e.error_code == 2:
-                    raise azcam.AzcamError("Could not connect to camserver")
+                    raise azcam.AzcamError("Could not connect to camserver", error_code=2)
                 else:
-                    raise azcam.AzcamError("Could not connect to camserver")
+                    raise
+
+    def command_batch(self, commands: list, terminator: str = "\n") -> list:
+        """
+        Send a list of commands to controller server and return a list of all replies.
+        Commands are sent together and replies are read back in order, so a batch
+        costs one network round trip.
+        """
+
+        if self.demo_mode:
+            return [["DEMO", 0] for _ in commands]
+
+        if not self.pipeline_commands:
+            return [self.command(cmd, terminator) for cmd in commands]
+
+        replies = []
+        with self.socketserver.lock:
+            if not self.socketserver.open():
+                raise azcam.AzcamError("Could not connect to camserver", error_code=2)
+
+            timeout = self.socketserver.timeout
+            self.socketserver.set_timeout(self.reply_timeout)
+            try:
+                self.socketserver.send(terminator.join(commands), terminator)
+
+                # replies may arrive split or merged across reads
+                while len(replies) < len(commands):
+                    msg = self.socketserver.recv(-1, "\n")
+                    for line in msg.split("\n"):
+                        line = line.rstrip("\r")
+                        if line != "":
+                            replies.append(shlex.split(line))
+            except OSError as e:
+                # missing replies would be read by the next command
+                self.socketserver.close()
+                raise azcam.AzcamError(
+                    f"Received {len(replies)} of {len(commands)} camserver replies: {e}"
+                )
+            except azcam.AzcamError:
+                self.socketserver.close()
+                raise
+            finally:
+                if self.socketserver.socket is not None:
+                    self.socketserver.set_timeout(timeout if timeout else 0)
+
+        return replies
 
     def test(self):
         """
@@ -8,6 +8,7 @@ import azcam
 from azcam_server.tools.controller import Controller
 
 from .camera_server import CameraServerInterface
+from .dsp_code import DspCodeCache
 
 
 class ControllerArc(Controller):
@@ -51,6 +52,18 @@ class ControllerArc(Controller):
         # utility DSP code filename
         self.utility_file = ""
 
+        # True to skip uploading DSP code which is already loaded on a board
+        self.use_dsp_cache = 1
+        # parsed DSP code files and code loaded on each board
+        self.dsp_code = DspCodeCache()
+
+        # True to skip DSP memory writes of values already in controller memory
+        self.use_memory_shadow = 1
+        # last value written to or read from DSP memory by (space, board, address)
+        self.memory_shadow = {}
+        # last NumberPixelsImage sent to ControllerServer
+        self.numpix_image_sent = None
+
         # video speed setting
         self.video_speed = 1
 
@@ -186,6 +199,11 @@ class ControllerArc(Controller):
 
         # SYR = 0x00535952
 
+        # controller memory and DSP code are no longer known after reset,
+        # SYR does not clear SRAM so signatures may still read back
+        self.clear_memory_shadow()
+        self.dsp_code.clear_loaded()
+
         try:
             reply = self.camserver.command("resetcontroller")
             if reply[0] == "ERROR":
@@ -263,7 +281,11 @@ class ControllerArc(Controller):
 
         # update ControllerServer for image size
         if self.is_reset:
-            self.camserver.set("NumberPixelsImage", self.detpars.numpix_image)
+            if not (
+                self.use_memory_shadow and self.numpix_image_sent == self.detpars.numpix_image
+            ):
+                self.camserver.set("NumberPixelsImage", self.detpars.numpix_image)
+                self.numpix_image_sent = self.detpars.numpix_image
 
         return
 
@@ -272,37 +294,35 @@ class ControllerArc(Controller):
         Write clocking parameters to controller.
         """
 
-        # number of total pixels in image for data transfer
-        self.write_memory("Y", self.TIMINGBOARD, self.Y_NSIMAGE, self.detpars.numcols_image)
-        self.write_memory("Y", self.TIMINGBOARD, self.Y_NPIMAGE, self.detpars.numrows_image)
-
-        # frame transfer skip size
-        self.write_memory("Y", self.TIMINGBOARD, self.Y_FRAMET, self.detpars.framet)
-
-        # number of data pixels to shift
-        self.write_memory("Y", self.TIMINGBOARD, self.Y_NSDATA, self.detpars.xdata)
-        self.write_memory("Y", self.TIMINGBOARD, self.Y_NPDATA, self.detpars.ydata)
-
-        # set binning
-        self.write_memory("Y", self.TIMINGBOARD, self.Y_NSBIN, self.detpars.col_bin)
-        self.write_memory("Y", self.TIMINGBOARD, self.Y_NPBIN, self.detpars.row_bin)
-
-        # write number of pixels to flush
-        self.write_memory("Y", self.TIMINGBOARD, self.Y_NSCLEAR, self.detpars.xflush)
-        self.write_memory("Y", self.TIMINGBOARD, self.Y_NPCLEAR, self.detpars.yflush)
-
-        # write skipping parameters
-        self.write_memory("Y", self.TIMINGBOARD, self.Y_NSPRESKIP, self.detpars.xpreskip)
-        self.write_memory("Y", self.TIMINGBOARD, self.Y_NSUNDERSCAN, self.detpars.xunderscan)
-        self.write_memory("Y", self.TIMINGBOARD, self.Y_NSSKIP, self.detpars.xskip)
-        self.write_memory("Y", self.TIMINGBOARD, self.Y_NSPOSTSKIP, self.detpars.xpostskip)
-        self.write_memory("Y", self.TIMINGBOARD, self.Y_NSOVERSCAN, self.detpars.xoverscan)
-
-        self.write_memory("Y", self.TIMINGBOARD, self.Y_NPPRESKIP, self.detpars.ypreskip)
-        self.write_memory("Y", self.TIMINGBOARD, self.Y_NPUNDERSCAN, self.detpars.yunderscan)
-        self.write_memory("Y", self.TIMINGBOARD, self.Y_NPSKIP, self.detpars.yskip)
-        self.write_memory("Y", self.TIMINGBOARD, self.Y_NPPOSTSKIP, self.detpars.ypostskip)
-        self.write_memory("Y", self.TIMINGBOARD, self.Y_NPOVERSCAN, self.detpars.yoverscan)
+        words = [
+            # number of total pixels in image for data transfer
+            [self.Y_NSIMAGE, self.detpars.numcols_image],
+            [self.Y_NPIMAGE, self.detpars.numrows_image],
+            # frame transfer skip size
+            [self.Y_FRAMET, self.detpars.framet],
+            # number of data pixels to shift
+            [self.Y_NSDATA, self.detpars.xdata],
+            [self.Y_NPDATA, self.detpars.ydata],
+            # set binning
+            [self.Y_NSBIN, self.detpars.col_bin],
+            [self.Y_NPBIN, self.detpars.row_bin],
+            # write number of pixels to flush
+            [self.Y_NSCLEAR, self.detpars.xflush],
+            [self.Y_NPCLEAR, self.detpars.yflush],
+            # write skipping parameters
+            [self.Y_NSPRESKIP, self.detpars.xpreskip],
+            [self.Y_NSUNDERSCAN, self.detpars.xunderscan],
+            [self.Y_NSSKIP, self.detpars.xskip],
+            [self.Y_NSPOSTSKIP, self.detpars.xpostskip],
+            [self.Y_NSOVERSCAN, self.detpars.xoverscan],
+            [self.Y_NPPRESKIP, self.detpars.ypreskip],
+            [self.Y_NPUNDERSCAN, self.detpars.yunderscan],
+            [self.Y_NPSKIP, self.detpars.yskip],
+            [self.Y_NPPOSTSKIP, self.detpars.ypostskip],
+            [self.Y_NPOVERSCAN, self.detpars.yoverscan],
+        ]
+
+        self.write_memory_words("Y", self.TIMINGBOARD, words)
 
         return
 
@@ -332,9 +352,25 @@ class ControllerArc(Controller):
         # make a synthetic image by setting bit 10 in X:<STATUS
         bits = (value & 0xFFFBFF) | ((flag & 1) << 10)
         self.write_memory("X", self.TIMINGBOARD, self.X_STATUS, bits)
+        self.synthetic_data = flag
 
         return
 
+    def get_synthetic_data(self):
+        """
+        Return 1 if controller creates synthetic image data, 0 for real data.
+        """
+
+        # gen1 not supported
+        if self.controller_type == "gen1":
+            return 0
+
+        # timing board X:<STATUS bit 10
+        value = self.read_memory("X", self.TIMINGBOARD, self.X_STATUS)
+        self.synthetic_data = (value >> 10) & 1
+
+        return self.synthetic_data
+
     # *** video ***
 
     def select_video_outputs(self, video_select=-1):
@@ -495,23 +531,43 @@ class ControllerArc(Controller):
         ArgN are arguments for command.
         """
 
+        reply = self.camserver.command(
+            self._board_command_string(Command, BoardNumber, Arg1, Arg2, Arg3, Arg4)
+        )
+
+        return self._board_command_reply(reply)
+
+    def board_commands(self, commands):
+        """
+        Send a list of board commands in one batch and return a list of the replies.
+        Each command is a list [Command, BoardNumber, Arg1, ...] as for board_command().
+        """
+
+        if len(commands) == 0:
+            return []
+
+        if len(commands) == 1:
+            return [self.board_command(*commands[0])]
+
+        cmdstrings = [self._board_command_string(*cmd) for cmd in commands]
+        replies = self.camserver.command_batch(cmdstrings)
+
+        return [self._board_command_reply(reply) for reply in replies]
+
+    def _board_command_string(self, Command, BoardNumber, Arg1=-1, Arg2=-1, Arg3=-1, Arg4=-1):
+        """
+        Return the controller server command string for a board command.
+        """
+
         # change 3 char ascii string to integer
         cmdnum = (ord(Command[0]) << 16) + (ord(Command[1]) << 8) + (ord(Command[2]))
 
-        reply = self.camserver.command(
-            "BoardCommand "
-            + str(cmdnum)
-            + " "
-            + str(BoardNumber)
-            + " "
-            + str(Arg1)
-            + " "
-            + str(Arg2)
-            + " "
-            + str(Arg3)
-            + " "
-            + str(Arg4)
-        )
+        return f"BoardCommand {cmdnum} {BoardNumber} {Arg1} {Arg2} {Arg3} {Arg4}"
+
+    def _board_command_reply(self, reply):
+        """
+        Check and convert a controller server reply to a board command.
+        """
 
         # check for ERROR
         if reply[0] == "ERROR":
@@ -558,6 +614,8 @@ class ControllerArc(Controller):
         ApplicationNumber is application number to load.
         """
 
+        self.clear_memory_shadow(BoardNumber)
+
         self.board_command("LDA", BoardNumber, ApplicationNumber)
 
         return
@@ -635,15 +693,30 @@ class ControllerArc(Controller):
         DacValue is DAC value for voltage.
         """
 
+        self.set_bias_numbers([[BoardNumber, DAC, Type, DacValue]])
+
+        return
+
+    def set_bias_numbers(self, biases):
+        """
+        Sets a list of bias values in one batch.
+        biases is a list of [BoardNumber, DAC, Type, DacValue] as for set_bias_number().
+        """
+
         if self.video_boards[0] == "gen1":
             raise azcam.AzcamError("Command set_bias_number not supported for this controller")
-        elif self.video_boards[0] in [
-            "arc48",
-            "arc47",
-        ]:  # assume all board types are the same
-            self.board_command("SBN", self.TIMINGBOARD, BoardNumber, Type, DAC, DacValue)
-        else:
-            self.board_command("SBN", self.TIMINGBOARD, BoardNumber, DAC, Type, DacValue)
+
+        commands = []
+        for BoardNumber, DAC, Type, DacValue in biases:
+            if self.video_boards[0] in [
+                "arc48",
+                "arc47",
+            ]:  # assume all board types are the same
+                commands.append(["SBN", self.TIMINGBOARD, BoardNumber, Type, DAC, DacValue])
+            else:
+                commands.append(["SBN", self.TIMINGBOARD, BoardNumber, DAC, Type, DacValue])
+
+        self.board_commands(commands)
 
         return
 
@@ -715,18 +788,7 @@ class ControllerArc(Controller):
         value is data to write.
         """
 
-        if Type == "P":
-            arg = 0x100000
-        elif Type == "X":
-            arg = 0x200000
-        elif Type == "Y":
-            arg = 0x400000
-        elif Type == "R":
-            arg = 0x800000
-        else:
-            raise azcam.AzcamError("Invalue write_memory type")
-
-        self.board_command("WRM", BoardNumber, arg | Address, value)
+        self.write_memory_words(Type, BoardNumber, [[Address, value]])
 
         return
 
@@ -738,6 +800,130 @@ class ControllerArc(Controller):
         Address is memory address to read.
         """
 
+        arg = self._memory_space(Type)
+
+        BoardNumber = int(BoardNumber)
+        Address = int(Address)
+
+        reply = self.board_command("RDM", BoardNumber, arg | Address)
+        value = int(reply)
+
+        self.memory_shadow[(arg, BoardNumber, Address)] = value
+
+        return value
+
+    def write_memory_words(self, Type, BoardNumber, words):
+        """
+        Write DSP memory locations in one batch.
+        Type is P, X, Y, or R memory space.
+        BoardNumber is controller board number.
+        words is a list of [Address, value] to write.
+        Words whose value is already in controller memory are not written when
+        use_memory_shadow is True.
+        """
+
+        arg = self._memory_space(Type)
+        BoardNumber = int(BoardNumber)
+
+        words = [[int(address), value] for address, value in words]
+        if self.use_memory_shadow:
+            words = [
+                [address, value]
+                for address, value in words
+                if self.memory_shadow.get((arg, BoardNumber, address)) != value
+            ]
+        if len(words) == 0:
+            return
+
+        try:
+            self.board_commands(
+                [["WRM", BoardNumber, arg | address, value] for address, value in words]
+            )
+        except Exception:
+            # memory state unknown after a failed write
+            self.clear_memory_shadow(BoardNumber)
+            raise
+
+        for address, value in words:
+            self.memory_shadow[(arg, BoardNumber, address)] = value
+
+        return
+
+    def write_memory_block(self, Type, BoardNumber, Address, values):
+        """
+        Write a block of consecutive DSP memory locations in one batch.
+        Type is P, X, Y, or R memory space.
+        BoardNumber is controller board number.
+        Address is first memory address to write.
+        values is list of data to write.
+        """
+
+        Address = int(Address)
+
+        self.write_memory_words(
+            Type, BoardNumber, [[Address + i, value] for i, value in enumerate(values)]
+        )
+
+        return
+
+    def read_memory_words(self, Type, BoardNumber, addresses):
+        """
+        Read DSP memory locations in one batch.
+        Type is P, X, Y, or R memory space.
+        BoardNumber is controller board number.
+        addresses is a list of memory addresses to read (may repeat).
+        Returns a list of values.
+        """
+
+        arg = self._memory_space(Type)
+
+        BoardNumber = int(BoardNumber)
+        addresses = [int(address) for address in addresses]
+        replies = self.board_commands(
+            [["RDM", BoardNumber, arg | address] for address in addresses]
+        )
+        values = [int(reply) for reply in replies]
+
+        for address, value in zip(addresses, values):
+            self.memory_shadow[(arg, BoardNumber, address)] = value
+
+        return values
+
+    def clear_memory_shadow(self, BoardNumber=None):
+        """
+        Forget DSP memory values for a board or for all boards, so they are written again.
+        """
+
+        if BoardNumber is None:
+            self.memory_shadow = {}
+            self.numpix_image_sent = None
+        else:
+            BoardNumber = int(BoardNumber)
+            self.memory_shadow = {
+                key: value for key, value in self.memory_shadow.items() if key[1] != BoardNumber
+            }
+
+        return
+
+    def read_memory_block(self, Type, BoardNumber, Address, count):
+        """
+        Read a block of consecutive DSP memory locations in one batch.
+        Type is P, X, Y, or R memory space.
+        BoardNumber is controller board number.
+        Address is first memory address to read.
+        count is number of locations to read.
+        Returns a list of values.
+        """
+
+        Address = int(Address)
+
+        return self.read_memory_words(Type, BoardNumber, range(Address, Address + int(count)))
+
+    def _memory_space(self, Type):
+        """
+        Return the DSP memory space bits for a memory type.
+        """
+
         if Type == "P":
             arg = 0x100000
         elif Type == "X":
@@ -747,14 +933,9 @@ class ControllerArc(Controller):
         elif Type == "R":
             arg = 0x800000
         else:
-            raise azcam.AzcamError("Invalue Type")
+            raise azcam.AzcamError("Invalid memory type")
 
-        BoardNumber = int(BoardNumber)
-        Address = int(Address)
-
-        reply = self.board_command("RDM", BoardNumber, arg | Address)
-
-        return int(reply)
+        return arg
 
     # *** DSP files ***
 
@@ -766,9 +947,21 @@ class ControllerArc(Controller):
         if filename == "":
             return
 
-        csfile = self.upload_file(filename)
+        code = self.dsp_code.get(filename)
+
+        if self.use_dsp_cache and self.is_dsp_code_loaded(BoardNumber, code):
+            azcam.log(
+                f"DSP code {os.path.basename(filename)} already loaded on board {BoardNumber}",
+                level=2,
+            )
+        else:
+            self.dsp_code.clear_loaded(BoardNumber)
+
+            # send file as binary, reply is filename on controller server
+            csfile = self.camserver.upload_file(code.contents)
+            self.load_file(BoardNumber, csfile)
 
-        self.load_file(BoardNumber, csfile)
+            self.dsp_code.set_loaded(BoardNumber, code)
 
         # set keyword for file loaded
         if BoardNumber == 1:
@@ -795,6 +988,33 @@ class ControllerArc(Controller):
 
         return
 
+    def is_dsp_code_loaded(self, BoardNumber, code):
+        """
+        Return True if DSP code is currently loaded on a board.
+        The code must be the last code loaded on the board and its signature words
+        must read back from P memory, which fails if the board was reset or power cycled.
+        """
+
+        if self.interface_type == 0:
+            return False
+
+        if not self.dsp_code.is_loaded(BoardNumber, code):
+            return False
+
+        if len(code.signature) == 0:
+            return False
+
+        addresses = [address for address, value in code.signature]
+        try:
+            values = self.read_memory_words("P", BoardNumber, addresses)
+        except Exception:
+            return False
+
+        if values != [value for address, value in code.signature]:
+            return False
+
+        return True
+
     def load_file(self, BoardNumber, filename):
         """
         Write a file containing DSP code to the PCI, timing, or utility boards.
@@ -815,6 +1035,8 @@ class ControllerArc(Controller):
         else:
             raise azcam.AzcamError("Invalid board number")
 
+        self.clear_memory_shadow(BoardNumber)
+
         return
 
     # *** files ***
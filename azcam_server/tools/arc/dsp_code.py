@@ -0,0 +1,138 @@
+"""
+Contains the DspCode and DspCodeCache classes for ARC controllers.
+"""
+
+import hashlib
+import os
+
+
+class DspCode(object):
+    """
+    A parsed ARC DSP code (.lod) file.
+    """
+
+    def __init__(self, filename, num_signature_words=8):
+        self.filename = filename
+
+        # file state when read, used to detect changes
+        stat = os.stat(filename)
+        self.mtime = stat.st_mtime
+        self.size = stat.st_size
+
+        with open(filename, "r") as f:
+            self.contents = f.read()
+
+        # content hash identifies the code independent of filename
+        self.digest = hashlib.sha1(self.contents.encode()).hexdigest()
+
+        # [address, value] of P memory words which identify this code when read back
+        self.signature = []
+
+        self._make_signature(num_signature_words)
+
+    def _make_signature(self, num_words):
+        """
+        Parse P memory data records and select evenly spaced signature words.
+        """
+
+        pwords = []
+        space = None
+        address = 0
+
+        for line in self.contents.splitlines():
+            tokens = line.split()
+            if len(tokens) == 0:
+                continue
+            if tokens[0].startswith("_"):
+                # _DATA P 0000 starts a data record, other records end it
+                if tokens[0] == "_DATA" and len(tokens) >= 3:
+                    space = tokens[1]
+                    address = int(tokens[2], 16)
+                else:
+                    space = None
+                continue
+            if space is None:
+                continue
+            for token in tokens:
+                try:
+                    value = int(token, 16)
+                except ValueError:
+                    continue
+                if space == "P":
+                    pwords.append([address, value])
+                address += 1
+
+        if len(pwords) == 0:
+            return
+
+        step = max(1, len(pwords) // num_words)
+        self.signature = pwords[::step][:num_words]
+
+        return
+
+    def is_current(self):
+        """
+        Return True if the file on disk is unchanged since it was read.
+        """
+
+        try:
+            stat = os.stat(self.filename)
+        except OSError:
+            return False
+
+        return stat.st_mtime == self.mtime and stat.st_size == self.size
+
+
+class DspCodeCache(object):
+    """
+    Cache of parsed DSP code files and record of code loaded on each board.
+    """
+
+    def __init__(self):
+        # parsed DspCode objects by filename
+        self.files = {}
+
+        # digest of code last loaded by board number
+        self.loaded = {}
+
+    def get(self, filename):
+        """
+        Return the DspCode for a file, reading it only if new or changed.
+        """
+
+        filename = os.path.normpath(filename)
+
+        code = self.files.get(filename)
+        if code is None or not code.is_current():
+            code = DspCode(filename)
+            self.files[filename] = code
+
+        return code
+
+    def set_loaded(self, board_number, code):
+        """
+        Record that code was loaded on a board.
+        """
+
+        self.loaded[board_number] = code.digest
+
+        return
+
+    def clear_loaded(self, board_number=None):
+        """
+        Forget loaded code for a board or for all boards.
+        """
+
+        if board_number is None:
+            self.loaded = {}
+        else:
+            self.loaded.pop(board_number, None)
+
+        return
+
+    def is_loaded(self, board_number, code):
+        """
+        Return True if code was the last code loaded on a board.
+        """
+
+        return self.loaded.get(board_number) == code.digest
@@ -3,7 +3,6 @@ Contains the ExposureArc class.
 """
 
 import os
-import threading
 import time
 
 import azcam
@@ -56,8 +55,12 @@ class ExposureArc(Exposure):
         """
         self.dark_time_start = time.time()
 
-        reply = self.get_exposuretime_remaining()
-        remtime = reply
+        # controller times the integration, timer follows it for status
+        timer = self.integration_timer
+        timer.start(self.exposure_time)
+
+        remtime = azcam.db.tools["controller"].update_exposuretime_remaining()
+        timer.sync(remtime)
         lasttime = remtime
 
         # countdown and check for async. ExposureFlag changes
@@ -65,9 +68,9 @@ class ExposureArc(Exposure):
 
         while remtime > 0.6:
             if self.exposure_flag == self.exposureflags["EXPOSING"]:  # no EF changes
-                time.sleep(min(remtime, 0.5))
-                reply = self.get_exposuretime_remaining()
-                remtime = reply
+                timer.wait(min(remtime, 0.5))
+                remtime = azcam.db.tools["controller"].update_exposuretime_remaining()
+                timer.sync(remtime)
                 azcam.log(f"Integration: {remtime:0.3f} seconds remaining", level=3)
                 if remtime == lasttime:
                     loopcount += 1
@@ -91,20 +94,22 @@ class ExposureArc(Exposure):
                     break
             elif self.exposure_flag == self.exposureflags["PAUSE"]:  # PauseExposure received
                 azcam.db.tools["controller"].exposure_pause()
+                timer.pause()
                 self.exposure_flag = self.exposureflags["PAUSED"]
                 azcam.log("Integration paused")
             elif self.exposure_flag == self.exposureflags["RESUME"]:  # ResumeExposure received
                 azcam.db.tools["controller"].exposure_resume()
+                timer.resume()
                 self.exposure_flag = self.exposureflags["EXPOSING"]
-                reply = self.get_exposuretime_remaining()
-                remtime = reply
+                remtime = azcam.db.tools["controller"].update_exposuretime_remaining()
+                timer.sync(remtime)
                 azcam.log("Integration resumed")
             elif self.exposure_flag == self.exposureflags["READ"]:  # ReadExposure received
                 remtime = 0.0
-                self.exposure_time_actual = self.exposure_time - self.exposure_time_remaining
+                self.exposure_time_actual = timer.elapsed()
                 break
-            elif self.exposure_flag == self.exposureflags["PAUSE"]:  # already paused so just loop
-                time.sleep(0.5)
+            elif self.exposure_flag == self.exposureflags["PAUSED"]:  # already paused so just wait
+                timer.wait(0.5)
 
         if self.exposure_flag == self.exposureflags["ABORT"]:  # abort in remaining time
             azcam.log("Integration aborted")
@@ -112,6 +117,7 @@ class ExposureArc(Exposure):
             time.sleep(remtime + 0.1)
             self.exposure_flag = self.exposureflags["READ"]  # set to readout
 
+        timer.stop()
         self.dark_time = time.time() - self.dark_time_start
 
         # return OD voltages
@@ -176,7 +182,11 @@ class ExposureArc(Exposure):
         if azcam.db.abortflag and self.is_exposure_sequence:  # stop exposure sequence
             azcam.log("User abort in exposure sequence")
 
-        self.image.valid = 1
+        self.set_image_valid()
+
+        if self.exposure_flag not in [self.exposureflags["ABORT"], self.exposureflags["ERROR"]]:
+            self.update_image_stats()
+            self.update_quicklook()
 
         if imagetype == "ramp":
             azcam.db.tools["controller"].set_shutter(0)
@@ -227,18 +237,18 @@ class ExposureArc(Exposure):
         self.last_filename = LocalFile
 
         # wait for image data to be received
-        loop = 0
-        while not self.image.valid and loop < 100:
-            loop += 1
-            time.sleep(0.050)
-            if loop >= 100:
-                azcam.log("ERROR image data not received in time")
+        if not self.wait_image_valid(5.0):
+            azcam.log("ERROR image data not received in time")
+
+        # wait for headers to be updated
+        self.wait_headers()
 
         # update controller header with keywords which might have changed
         et = float(int(self.exposure_time_actual * 1000.0) / 1000.0)
         dt = float(int(self.dark_time * 1000.0) / 1000.0)
         azcam.db.headers["exposure"].set_keyword("EXPTIME", et, "Exposure time (seconds)", "float")
         azcam.db.headers["exposure"].set_keyword("DARKTIME", dt, "Dark time (seconds)", "float")
+        self.write_timeline_keywords()
 
         # write file(s) to disk
         if self.save_file:
@@ -247,7 +257,8 @@ class ExposureArc(Exposure):
             # write the file to disk
             self.image.overwrite = self.overwrite
             self.image.test_image = self.test_image
-            self.image.write_file(LocalFile, self.filetype)
+            with self.timeline.phase("write"):
+                self.write_image_file(LocalFile)
             azcam.log("Writing finished", level=2)
 
             # set flag that image now written to disk
@@ -255,7 +266,8 @@ class ExposureArc(Exposure):
 
             # send image to guider software
             if self.guide_mode:
-                azcam.db.tools["sendimage"].send_image(LocalFile)
+                with self.timeline.phase("sendimage"):
+                    azcam.db.tools["sendimage"].send_image(LocalFile)
 
             # send image to remote image server
             elif self.send_image:
@@ -264,12 +276,7 @@ class ExposureArc(Exposure):
                         "NONE"
                     ]  # reset flag now so next exposure can start
                     azcam.log("Sending image asynchronously")
-                    sendthread = threading.Thread(
-                        target=azcam.db.tools["sendimage"].send_image,
-                        name="writeasync",
-                        args=(self.get_filename()),
-                    )
-                    sendthread.start()
+                    self.send_image_async(LocalFile, self.get_filename())
 
                     # increment file sequence number now and return
                     self.increment_filenumber()
@@ -278,7 +285,8 @@ class ExposureArc(Exposure):
 
                 else:
                     azcam.log("Sending image")
-                    azcam.db.tools["sendimage"].send_image(LocalFile, self.get_filename())
+                    with self.timeline.phase("sendimage"):
+                        azcam.db.tools["sendimage"].send_image(LocalFile, self.get_filename())
 
         # image data and file are now ready
         self.image.toggle = 1
@@ -290,7 +298,7 @@ class ExposureArc(Exposure):
         # display image
         if self.display_image and not self.write_async:
             azcam.log("Displaying image")
-            azcam.db.tools["display"].display(self.image)
+            self.display_file(self.image)
 
         # increment file sequence number if image was written
         if self.save_file:
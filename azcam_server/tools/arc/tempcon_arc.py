@@ -4,6 +4,8 @@ Contains the TempConArc class.
 
 import math
 
+import numpy
+
 import azcam
 from azcam_server.tools.tempcon import TempCon
 
@@ -24,6 +26,9 @@ class TempConArc(TempCon):
 
         self.last_temps = 3 * [self.bad_temp_value]  # last readings for during exposure
 
+        # calibration lookup tables by calflag, made when first used
+        self.cal_tables = {}
+
         return
 
     def define_keywords(self):
@@ -112,22 +117,19 @@ class TempConArc(TempCon):
         if flag != azcam.db.tools["exposure"].exposureflags["NONE"]:
             return self.last_temps[temperature_id]
 
-        # read temperature
-        cmd = "RDM"
-        avecount = 0
+        # read temperature, all reads in one batch
         try:
-            for _ in range(self.num_temp_reads):
-                reply = azcam.db.tools["controller"].board_command(
-                    cmd, azcam.db.tools["controller"].UTILITYBOARD, 0x400000 | Address
-                )  # Y space
-                counts = int(reply)
-                avecount += counts
+            readings = azcam.db.tools["controller"].read_memory_words(
+                "Y",
+                azcam.db.tools["controller"].UTILITYBOARD,
+                self.num_temp_reads * [Address],
+            )
         except ValueError:
             raise azcam.AzcamError("could not read temperature")
-        counts = avecount / self.num_temp_reads
+        counts = sum(readings) / self.num_temp_reads
 
         # convert from counts to Celsius
-        temp = self.convert_counts_to_temp(self.temperature_cals[temperature_id], counts)
+        temp = float(self.convert_counts_to_temps(self.temperature_cals[temperature_id], counts))
 
         temp = self.apply_corrections(temp, temperature_id)
 
@@ -306,12 +308,76 @@ class TempConArc(TempCon):
         else:
             raise azcam.AzcamError("ConvertCountsToTemp", "invalid calflag")
 
+    def convert_counts_to_temps(self, calflag: int, counts) -> numpy.ndarray:
+        """
+        Convert counts (DN) to degrees Celsius for an array of readings at once.
+        Interpolates a lookup table made from convert_counts_to_temp().
+
+        :param calflag: calibration curve to use, as for convert_counts_to_temp()
+        :param counts: value or array of values to convert
+        """
+
+        counts = numpy.asarray(counts, dtype="float64")
+
+        if calflag not in self.cal_tables:
+            self.cal_tables[calflag] = self._make_cal_table(calflag)
+        x, y, under, over = self.cal_tables[calflag]
+
+        temps = numpy.array(numpy.interp(counts, x, y))
+
+        # values outside table use the out of range values of the calibration
+        temps[counts < x[0]] = under
+        temps[counts > x[-1]] = over
+
+        return temps
+
+    def _make_cal_table(self, calflag: int) -> list:
+        """
+        Make a lookup table for a calibration curve.
+        Returns [counts, temperatures, value below range, value above range].
+        """
+
+        # counts of the calibration voltage limits (see convert_counts_to_temp)
+        def volts_to_counts(voltage):
+            return voltage * 2.0 * 4096 / 6.0 + 2048
+
+        if calflag == 0:
+            lo = volts_to_counts(0.07000)
+            hi = volts_to_counts(1.122751)
+            breaks = [volts_to_counts(0.986974)]  # change of Chebyshev fit
+            under, over = +999.9, -999.9
+        elif calflag == 1 or calflag == 3:
+            lo, hi = 0, 4095
+            breaks = []
+            under, over = None, None
+        elif calflag == 2:
+            lo, hi = 2600, 3417
+            breaks = []
+            under, over = +999.9, -999.9
+        else:
+            raise azcam.AzcamError("ConvertCountsToTemp", "invalid calflag")
+
+        # quarter counts in range plus range limits and fit changes
+        x = numpy.arange(math.floor(lo), hi, 0.25)
+        x = x[x > lo]
+        x = numpy.union1d(x, [lo, hi] + [b - 1.0e-6 for b in breaks] + breaks)
+
+        # keep limits just inside range of scalar conversion
+        xeval = numpy.clip(x, lo + 1.0e-6, hi - 1.0e-6)
+        y = numpy.array([self.convert_counts_to_temp(calflag, c) for c in xeval])
+
+        # linear and polynomial curves have no out of range values
+        if under is None:
+            under, over = y[0], y[-1]
+
+        return [x, y, under, over]
+
     def convert_temp_to_counts(self, calflag: int, temperature: float) -> float:
         """
         Convert degrees Celsius to counts.
 
         :param calflag: calibration flag to use
-        :param temperature: temperature in C to convert
+        :param temperature: temperature in C to convert, value or numpy array
         """
 
         NOAOINV = [6.00e-09, -3.50e-06, -0.0021, 1.1616]  # inverse of NOAO
@@ -6,6 +6,8 @@ import socket
 import time
 import threading
 
+import numpy
+
 import azcam
 import azcam.sockets
 from azcam_server.tools.controller import Controller
@@ -18,6 +20,143 @@ EXP_READY = 3
 EXP_FETCH = 4
 EXP_DONE = 5
 
+# FETCH data is returned in blocks of '<xx:' preamble plus BURST_LEN bytes
+BURST_LEN = 1024
+
+
+def decode_fetch_blocks(buffer, lines, numpix):
+    """
+    Decode FETCH blocks, each '<xx:' followed by BURST_LEN data bytes.
+    Returns a uint16 array of numpix pixels.
+    """
+
+    blocksize = BURST_LEN + 4
+
+    blocks = numpy.frombuffer(buffer, dtype="uint8", count=lines * blocksize)
+    blocks = blocks.reshape(lines, blocksize)
+    if not numpy.all(blocks[:, 3] == 58):
+        raise azcam.AzcamError("Bad data block preamble from controller")
+
+    data = blocks[:, 4:].view("<u2").reshape(-1)
+
+    return data[:numpix]
+
+
+class ArchonSnapshot(object):
+    """
+    Parsed reply of one Archon STATUS or FRAME command.
+    A snapshot is shared between readers and must be treated as read-only.
+    """
+
+    def __init__(self, command: str, reply: str):
+        #: command which created this snapshot
+        self.command = command
+
+        #: monotonic time the reply was received
+        self.timestamp = time.monotonic()
+
+        #: reply items as 'keyword=value' strings
+        self.items = reply.split(" ")
+
+        #: keyword:value pairs of the reply, values as strings
+        self.values = {}
+
+        for item in self.items:
+            if len(item) > 0:
+                keyword, _, value = item.partition("=")
+                self.values[keyword] = value
+
+    def age(self) -> float:
+        """
+        Return age of snapshot in seconds.
+        """
+
+        return time.monotonic() - self.timestamp
+
+    def get_int(self, keyword: str, base: int = 10) -> int:
+        """
+        Return a keyword value as an integer.
+        """
+
+        return int(self.values[keyword], base)
+
+    def get_float(self, keyword: str) -> float:
+        """
+        Return a keyword value as a float.
+        """
+
+        return float(self.values[keyword])
+
+
+class ArchonSnapshotCache(object):
+    """
+    Thread-safe cache of the latest snapshot for one Archon query command.
+    Readers within max_age share the cached snapshot and simultaneous requests
+    for a new snapshot are coalesced into a single controller command.
+    """
+
+    def __init__(self, controller, command: str, max_age: float = 0.0):
+        self.controller = controller
+        self.command = command
+
+        #: default maximum age in seconds of a snapshot which may be reused
+        self.max_age = max_age
+
+        self.snapshot = None
+
+        self._condition = threading.Condition()
+        self._pending = 0
+        self._generation = 0
+
+    def get(self, max_age: float = None) -> ArchonSnapshot:
+        """
+        Return a snapshot no older than max_age seconds, querying the controller if needed.
+        """
+
+        if max_age is None:
+            max_age = self.max_age
+
+        with self._condition:
+            generation = None
+            while True:
+                # another thread queried the controller while waiting, use its reply
+                if generation is not None and generation != self._generation:
+                    return self.snapshot
+                if self.snapshot is not None and self.snapshot.age() <= max_age:
+                    return self.snapshot
+                if not self._pending:
+                    break
+                generation = self._generation
+                self._condition.wait()
+            self._pending = 1
+
+        try:
+            reply = self.controller.archon_command(self.command)
+            snapshot = ArchonSnapshot(self.command, reply)
+        except Exception:
+            with self._condition:
+                self._pending = 0
+                self._condition.notify_all()
+            raise
+
+        with self._condition:
+            self.snapshot = snapshot
+            self._generation += 1
+            self._pending = 0
+            self._condition.notify_all()
+
+        return snapshot
+
+    def invalidate(self):
+        """
+        Discard the cached snapshot so the next reader queries the controller.
+        """
+
+        with self._condition:
+            self.snapshot = None
+
+        return
+
 
 class ControllerArchon(Controller):
     """
@@ -72,6 +211,10 @@ class ControllerArchon(Controller):
         # STATUS data dictionary
         self.dict_status = {}
 
+        # shared STATUS and FRAME snapshots, max age in seconds for reuse by readers
+        self.status_cache = ArchonSnapshotCache(self, "STATUS", 1.0)
+        self.frame_cache = ArchonSnapshotCache(self, "FRAME", 0.2)
+
         # ronfig data lines read from a file or downloaded - raw format 'parameter=value'
         self.config_data = []
 
@@ -193,8 +336,12 @@ class ControllerArchon(Controller):
         # Raw data received from the Archon controller
         self.rawdata = 0
 
-        #: lock for threads
-        self.lock = threading.Lock()
+        #: lock for threads using the command connection, re-entrant as it is also
+        #: the data lock when use_data_connection is False
+        self.lock = threading.RLock()
+
+        #: lock for threads using the bulk data connection
+        self.data_lock = threading.RLock()
 
         # controller server
         self.camserver = azcam.sockets.SocketInterface()
@@ -203,6 +350,17 @@ class ControllerArchon(Controller):
         self.camserver.cmd_id = 0x00
         self.camserver.lastcmd_id = 0x00
 
+        #: True to transfer image data on a dedicated connection so commands are not blocked
+        self.use_data_connection = 1
+
+        #: seconds to wait for data on the data connection before a transfer fails
+        self.data_timeout = 10
+
+        # controller data connection, host and port are copied from camserver on connect
+        self.dataserver = azcam.sockets.SocketInterface()
+        self.dataserver.cmd_id = 0x80
+        self.dataserver.lastcmd_id = 0x80
+
     def connect(self):
         """
         Connects Azcam to the controller.
@@ -214,6 +372,9 @@ class ControllerArchon(Controller):
         else:
             self.connected_controller = 0
 
+        self.dataserver.host = self.camserver.host
+        self.dataserver.port = self.camserver.port
+
         return
 
     def disconnect(self):
@@ -222,6 +383,8 @@ class ControllerArchon(Controller):
         """
 
         self.camserver.close()
+        with self.data_lock:
+            self.dataserver.close()
         self.connected_controller = 0
 
         return
@@ -262,22 +425,98 @@ class ControllerArchon(Controller):
 
         return None  # no Archon reponse is OK
 
+    def get_data_connection(self):
+        """
+        Return the socket interface and lock used for binary data transfers.
+        This is the dedicated data connection unless use_data_connection is False.
+        """
+
+        if self.use_data_connection:
+            return self.dataserver, self.data_lock
+        else:
+            return self.camserver, self.lock
+
     def archon_bin_command(self, command):
         """
-        Send binary command to the Archon controller.
+        Send binary command to the Archon controller on the data connection.
+        The caller reads the binary reply and should hold the data lock for the whole transfer.
         """
 
-        with self.lock:
-            self.camserver.lastcmd_id = self.camserver.cmd_id
-            self.camserver.cmd_id = (self.camserver.cmd_id + 1) & 0xFF
+        server, lock = self.get_data_connection()
 
-            preCmd = ">%02X" % (self.camserver.cmd_id)
+        with lock:
+            if not server.open():
+                raise azcam.AzcamError("Could not open data connection to controller")
+            if server is self.dataserver:
+                server.set_timeout(self.data_timeout)
+
+            server.lastcmd_id = server.cmd_id
+            server.cmd_id = (server.cmd_id + 1) & 0xFF
+
+            preCmd = ">%02X" % (server.cmd_id)
             cmd = preCmd + command
 
-            self.camserver.send(cmd, "\r\n")
+            server.send(cmd, "\r\n")
 
         return
 
+    def fetch_data(self, address, lines, numpix):
+        """
+        Read frame buffer memory with the FETCH command on the data connection.
+        address is the memory start address.
+        lines is the number of BURST_LEN byte blocks to read.
+        numpix is the number of 16-bit pixels returned.
+        Returns a uint16 array of numpix pixels.
+        """
+
+        buffer = self.fetch_blocks(address, lines)
+
+        return decode_fetch_blocks(buffer, lines, numpix)
+
+    def fetch_blocks(self, address, lines, buffer=None):
+        """
+        Receive undecoded FETCH blocks of frame buffer memory on the data connection.
+        buffer is an optional writable buffer of at least lines * (BURST_LEN + 4) bytes,
+        such as shared memory, which is filled directly from the socket.
+        Returns the buffer.
+        """
+
+        blocksize = BURST_LEN + 4
+        totalbytes = lines * blocksize
+        if buffer is None:
+            buffer = bytearray(totalbytes)
+        view = memoryview(buffer)
+        received = 0
+
+        server, lock = self.get_data_connection()
+
+        # the command connection stays available to other threads during the transfer
+        with lock:
+            try:
+                self.archon_bin_command("FETCH%08X%08X" % (address, lines))
+
+                while received < totalbytes:
+                    count = server.socket.recv_into(view[received:], totalbytes - received)
+                    if count == 0:
+                        break
+                    received += count
+            except OSError as e:
+                server.close()
+                raise azcam.AzcamError(
+                    f"Data connection error after {received} of {totalbytes} bytes: {e}"
+                )
+            finally:
+                view.release()
+
+            # unread data would be taken as the reply to the next command
+            if received != totalbytes:
+                server.close()
+                raise azcam.AzcamError(
+                    f"Received {received} of {totalbytes} bytes from controller"
+                )
+
+        return buffer
+
     def initialize(self):
         """
         Initializes the Archon controller.
@@ -353,7 +592,7 @@ class ControllerArchon(Controller):
                 continue
 
             try:
-                self.get_status()
+                self.get_status(0)
             except ConnectionResetError:
                 time.sleep(1)
                 pass
@@ -396,6 +635,7 @@ class ControllerArchon(Controller):
 
         cmd = "REBOOT"
         self.archon_command(cmd)
+        self.invalidate_snapshots()
 
         return
 
@@ -406,15 +646,16 @@ class ControllerArchon(Controller):
 
         cmd = "WARMBOOT"
         self.archon_command(cmd)
+        self.invalidate_snapshots()
 
         return
 
-    def get_power_status(self):
+    def get_power_status(self, max_age=None):
         """
         Get power status: ON, OFF, NOT_CONFIGURED, UNKNOWN, INTERMEDIATE, STANDBY.
         """
 
-        self.get_status()
+        self.get_status(max_age)
         self.power_status = self.power_values[int(self.status_power)]
 
         return self.power_status
@@ -429,67 +670,52 @@ class ControllerArchon(Controller):
 
         return self.status_valid
 
-    def get_status(self):
+    def get_status(self, max_age=None):
         """
         Get status value.
+        A STATUS reply no older than max_age seconds is reused (default status_cache.max_age).
         """
 
-        cmd = "STATUS"
-        reply = self.archon_command(cmd)
-
-        # if reply == "OK":
-        retVal = reply
-        self.status = retVal.split(" ")
-        self.dict_status = {}
+        snapshot = self.status_cache.get(max_age)
 
-        # Create a dictionary
-        for item in self.status:
-            if len(item) > 0:
-                line = item.split("=")
-                self.dict_status[line[0]] = line[1]
+        self.status = snapshot.items
+        self.dict_status = dict(snapshot.values)
 
         # Update staus keywords
-        StatusDict = {}
-        for line in self.status:
-            if len(line) > 0:
-                item = line.split("=")
-                StatusDict[item[0]] = item[1]
-
-        self.status_valid = int(StatusDict["VALID"])
-        self.status_count = StatusDict["COUNT"]
-        self.status_log = StatusDict["LOG"]
-        self.status_power = StatusDict["POWER"]
-        self.status_backplane_temp = StatusDict["BACKPLANE_TEMP"]
+        self.status_valid = snapshot.get_int("VALID")
+        self.status_count = snapshot.values["COUNT"]
+        self.status_log = snapshot.values["LOG"]
+        self.status_power = snapshot.values["POWER"]
+        self.status_backplane_temp = snapshot.values["BACKPLANE_TEMP"]
 
         return self.dict_status
 
-    def get_frame(self):
+    def get_frame(self, max_age=None):
         """
         Get and updates frame status value.
+        A FRAME reply no older than max_age seconds is reused (default frame_cache.max_age).
         """
 
-        cmd = "FRAME"
-
         try:
-            reply = self.archon_command(cmd)
+            snapshot = self.frame_cache.get(max_age)
         except socket.timeout:
             azcam.log("Socket timeout for FRAME command")
             return
 
-        retVal = reply
-        self.frame = retVal.split(" ")
+        self.frame = snapshot.items
+        self.dict_frame = dict(snapshot.values)
 
-        # Update frame status values
+        return self.dict_frame
 
-        self.dict_frame = {}
+    def invalidate_snapshots(self):
+        """
+        Discard cached STATUS and FRAME replies after a command which changes controller state.
+        """
 
-        # Create a dictionary
-        for item in self.frame:
-            if len(item) > 0:
-                line = item.split("=")
-                self.dict_frame[line[0]] = line[1]
+        self.status_cache.invalidate()
+        self.frame_cache.invalidate()
 
-        return self.dict_frame
+        return
 
     def get_size(self):
         """
@@ -589,6 +815,7 @@ class ControllerArchon(Controller):
 
         cmd = "LOADPARAMS"
         self.archon_command(cmd)
+        self.invalidate_snapshots()
 
         return
 
@@ -797,6 +1024,7 @@ class ControllerArchon(Controller):
         cmd = "POWERON"
 
         self.archon_command(cmd)
+        self.invalidate_snapshots()
 
         if wait == 1:
             # check power status - wait up to 10 second
@@ -804,7 +1032,7 @@ class ControllerArchon(Controller):
             cnt = 0
             powerOK = 0
             while cnt < 10:
-                self.get_power_status()
+                self.get_power_status(0)
                 if self.power_status == "ON":
                     # exit
                     cnt = 10
@@ -829,6 +1057,7 @@ class ControllerArchon(Controller):
         cmd = "POWEROFF"
 
         self.archon_command(cmd)
+        self.invalidate_snapshots()
 
         return
 
@@ -839,7 +1068,10 @@ class ControllerArchon(Controller):
 
         cmd = "APPLYALL"
 
-        return self.archon_command(cmd)
+        reply = self.archon_command(cmd)
+        self.invalidate_snapshots()
+
+        return reply
 
     def update_cds(self, ucds=None):
         """
@@ -1453,9 +1685,10 @@ class ControllerArchon(Controller):
 
         # important especially for first exposure
         self.archon_command("RESETTIMING")
+        self.invalidate_snapshots()
 
         # Check frame status
-        self.get_frame()
+        self.get_frame(0)
 
         # Save current frame numbers
         self.currframe1 = self.dict_frame["BUF1FRAME"]
@@ -1471,11 +1704,15 @@ class ControllerArchon(Controller):
         self.exp_start = time.time()
 
         # Exposure start time (internal Archon controller timer - resolution 10 ns)
-        self.get_frame()
+        self.get_frame(0)
         self.exp_timer = int(self.dict_frame["TIMER"], 16)
 
         int_time = (int(self.int_ms) + int(self.noint_ms)) / 1000
 
+        # controller times the integration, exposure timer is for status and wakeups
+        timer = azcam.db.tools["exposure"].integration_timer
+        timer.start(int_time)
+
         # if no wait, just set status and exit
         if wait == 0:
             self.archon_status = EXP_EXPOSE
@@ -1528,7 +1765,9 @@ class ControllerArchon(Controller):
                         self.read_buffer = -1
                         azcam.AzcamWarning("Timed out waiting for integration")
                         stop = 1
-                time.sleep(0.5)
+                timer.wait(0.5)
+
+        timer.stop()
 
         # check for abort
         if (
@@ -1557,9 +1796,10 @@ class ControllerArchon(Controller):
         dataReady = 0
         cnt = 0
 
+        exposure = azcam.db.tools["exposure"]
         while dataReady == 0 and cnt < 500:
-            # Get frame and update frame dictionary
-            time.sleep(0.50)
+            # Get frame and update frame dictionary, returns at once on abort
+            exposure.wait_for_flag([exposure.exposureflags["ABORT"]], 0.50)
             self.get_frame()
 
             # Check if frame is ready
@@ -9,6 +9,9 @@ import numpy
 
 import azcam
 from azcam_server.tools.exposure import Exposure
+from azcam_server.tools.archon.controller_archon import BURST_LEN
+from azcam_server.tools.archon.offload_archon import ArchonOffload
+from azcam_server.tools.archon.rawdata_archon import RawDataArchon
 from astropy.io import fits as pyfits
 
 
@@ -24,6 +27,7 @@ class ExposureArchon(Exposure):
 
         self.receive_data = ReceiveDataArchon(self)
         self.fileconverter = ArchonFileConverter()
+        self.rawdata = RawDataArchon()
 
         # add extra extensions for additional non-image data
         self.add_extensions = 0
@@ -31,6 +35,18 @@ class ExposureArchon(Exposure):
         # shutter delay in msec
         self.shutter_delay = 250
 
+        # image data of last readout_roi()
+        self.roi_image = None
+
+        # extension and [first_col, last_col, first_row, last_row] fetched for each guide frame,
+        # starting at 1 with -1 for the last column or row
+        self.guide_extension = 1
+        self.guide_roi = [1, -1, 1, -1]
+
+        # decode, deinterlace, and write MEF files in a worker process
+        self.offload_enable = 0
+        self.offload = None
+
     def abort(self):
         """
         Abort an exposure in progress.
@@ -42,6 +58,7 @@ class ExposureArchon(Exposure):
 
         if self.exposure_flag != self.exposureflags["NONE"]:
             self.exposure_flag = self.exposureflags["ABORT"]
+        self.integration_timer.wake()
 
         return
 
@@ -52,6 +69,7 @@ class ExposureArchon(Exposure):
 
         if self.exposure_flag != self.exposureflags["NONE"]:
             self.exposure_flag = self.exposureflags["READ"]
+        self.integration_timer.wake()
 
         azcam.db.tools["controller"].archon_command("FASTLOADPARAM StopExposure 1")
         time.sleep(0.1)
@@ -77,7 +95,11 @@ class ExposureArchon(Exposure):
         self.dark_time_start = time.time()
         # azcam.log("Integration started")
 
-        azcam.db.tools["controller"].start_exposure(1)
+        # controller starts integration timer when exposure starts
+        try:
+            azcam.db.tools["controller"].start_exposure(1)
+        finally:
+            self.integration_timer.stop()
 
         # dark time includes readout
         self.dark_time = time.time() - self.dark_time_start
@@ -93,7 +115,8 @@ class ExposureArchon(Exposure):
         if self.image_type == "zero":
             self.exposure_time = self.exposure_time_saved
 
-        self.exposure_flag == self.exposureflags["READ"]
+        if self.exposure_flag != self.exposureflags["ABORT"]:
+            self.exposure_flag = self.exposureflags["READ"]
 
         # azcam.log("Integration finished", level=2)
 
@@ -115,21 +138,42 @@ class ExposureArchon(Exposure):
         else:
             LocalFile = self.get_filename()
 
+        offload = self.get_offload()
+
         # get the image data and put into buffer controller.imagedata
-        self.receive_data.receive_archon_image_data()
+        with self.timeline.phase("transfer"):
+            self.receive_data.receive_archon_image_data(offload)
 
         self.pixels_remaining = 0
 
-        # create buffer for entire image, including all overscans
-        self.image.data = numpy.empty(
-            shape=(
-                self.image.focalplane.numamps_image,
-                self.image.focalplane.numcols_amp * self.image.focalplane.numrows_amp,
-            ),
-            dtype="uint16",
+        # buffer for entire image, including all overscans
+        shape = (
+            self.image.focalplane.numamps_image,
+            self.image.focalplane.numcols_amp * self.image.focalplane.numrows_amp,
         )
 
-        self.fileconverter.copy_to_buffer(azcam.db.tools["controller"].imagedata, self.image.data)
+        if offload is not None:
+            # image data are in shared memory of the worker process stage
+            self.image.data = offload.deinterlace(
+                self.receive_data.fetch_lines,
+                self.receive_data.fetch_numpix,
+                shape,
+                self.fileconverter.get_deinterlace_params(),
+            )
+            self.timeline.add_phase("deinterlace", offload.deinterlace_time)
+        else:
+            self.image.data = self.get_image_buffer(shape, "uint16")
+            self.fileconverter.copy_to_buffer(
+                azcam.db.tools["controller"].imagedata, self.image.data
+            )
+            self.timeline.add_phase(
+                "deinterlace", self.fileconverter.StopTime - self.fileconverter.StartTime
+            )
+
+        # data are flipped into extension orientation
+        flips = self.fileconverter.get_extension_flips()
+        self.update_image_stats(flips)
+        self.update_quicklook(flips, True)
 
         # why is this necessary?
         self.image.data.reshape(
@@ -137,6 +181,9 @@ class ExposureArchon(Exposure):
             self.image.focalplane.numcols_amp * self.image.focalplane.numrows_amp,
         )
 
+        # wait for headers to be updated
+        self.wait_headers()
+
         # write MEF file
         self.image.overwrite = self.overwrite
         self.image.test_image = self.test_image
@@ -154,8 +201,14 @@ class ExposureArchon(Exposure):
         dt = float(int(self.dark_time * 1000.0) / 1000.0)
         azcam.db.headers["exposure"].set_keyword("EXPTIME", et, "Exposure time (seconds)", "float")
         azcam.db.headers["exposure"].set_keyword("DARKTIME", dt, "Dark time (seconds)", "float")
+        self.write_timeline_keywords()
 
-        self.image.write_file(LocalFile, self.filetype)
+        with self.timeline.phase("write"):
+            if offload is not None and self.filetype == self.filetypes["MEF"]:
+                compression = "NONE" if self.compression == "" else self.compression
+                offload.write(self.image, LocalFile, compression)
+            else:
+                self.write_image_file(LocalFile)
 
         # add info data in extra extensions
         if self.add_extensions:
@@ -191,6 +244,10 @@ class ExposureArchon(Exposure):
 
         azcam.log(f"Writing finished: {LocalFile}", level=2)
 
+        # write raw channel data in background
+        if azcam.db.tools["controller"].rawdata_enable and self.rawdata.save_file:
+            self.rawdata.write_file(LocalFile)
+
         # set flag that image now written to disk
         self.image.written = 1
 
@@ -200,11 +257,12 @@ class ExposureArchon(Exposure):
         # display image
         if self.display_image:
             azcam.log("Displaying image")
-            azcam.db.tools["display"].display(LocalFile)
+            self.display_file(LocalFile)
 
         if self.send_image:
             azcam.log("Sending image")
-            azcam.db.tools["sendimage"].send_image(LocalFile, self.get_filename())
+            with self.timeline.phase("sendimage"):
+                azcam.db.tools["sendimage"].send_image(LocalFile, self.get_filename())
 
         # increment file sequence number if image was written
         if self.save_file:
@@ -261,6 +319,68 @@ class ExposureArchon(Exposure):
 
         return azcam.db.tools["controller"].get_pixels_remaining()
 
+    def readout_roi(self, extension=1, first_col=1, last_col=-1, first_row=1, last_row=-1):
+        """
+        Fetch only the controller memory lines covering an ROI of the last frame read.
+        Used for quick-look, focus, and guiding instead of fetching the whole frame.
+        extension is the image extension number (starting at 1).
+        Columns and rows start at 1 in extension orientation, -1 for the last one.
+        Returns the ROI as a 2D array in extension orientation.
+        """
+
+        # receive_archon_roi_data() uses 0-based values, -1 is still the last one
+        roi = []
+        for value in [first_col, last_col, first_row, last_row]:
+            value = int(value)
+            roi.append(value - 1 if value >= 1 else value)
+        first_col, last_col, first_row, last_row = roi
+
+        roi = self.receive_data.receive_archon_roi_data(
+            int(extension) - 1, first_col, last_col, first_row, last_row
+        )
+        self.roi_image = roi
+
+        return roi
+
+    def get_offload(self):
+        """
+        Return the worker process stage if offload_enable is True, otherwise None.
+        """
+
+        if not self.offload_enable:
+            if self.offload is not None:
+                self.image.data = None
+                self.offload.close()
+                self.offload = None
+            return None
+
+        if self.offload is None:
+            self.offload = ArchonOffload(self.compression_workers)
+
+        # previous image data may be in a pool buffer
+        if self.image_buffer is not None:
+            self.image.data = None
+            self.buffer_pool.release(self.image_buffer)
+            self.image_buffer = None
+
+        return self.offload
+
+    def guide_readout(self):
+        """
+        Fetch only the guide ROI of the frame just read.
+        Pixels of the full frame are fetched by end() when a guide image is written.
+        Returns the ROI as a 2D array in extension orientation.
+        """
+
+        return self.readout_roi(self.guide_extension, *self.guide_roi)
+
+    def get_rawdata_stats(self):
+        """
+        Return statistics of the last raw channel data as a dictionary.
+        """
+
+        return self.rawdata.get_stats()
+
 
 class ArchonFileConverter(object):
     """
@@ -357,18 +477,9 @@ class ArchonFileConverter(object):
         Process input buffer to output MEF file.
         """
 
-        frameBase = "BUF%d" % (azcam.db.tools["controller"].read_buffer)
-
-        self.NAMPS = self.numparamps * self.numseramps
-        self.NAXIS1 = int(azcam.db.tools["controller"].dict_frame[frameBase + "WIDTH"])
-        self.NAXIS2 = int(azcam.db.tools["controller"].dict_frame[frameBase + "HEIGHT"])
-        self.PIXELS = int(azcam.db.tools["controller"].dict_frame[frameBase + "PIXELS"])
-        self.LINES = int(azcam.db.tools["controller"].dict_frame[frameBase + "LINES"])
+        self.get_deinterlace_params()
 
         self.data_type = "<u2"
-        self.exptime = float(azcam.db.tools["controller"].int_ms / 1000)
-        self.intms = azcam.db.tools["controller"].int_ms
-        self.nointms = azcam.db.tools["controller"].noint_ms
 
         # make a copy on the input data
         self.data = numpy.ndarray(
@@ -484,6 +595,36 @@ class ArchonFileConverter(object):
 
         return
 
+    def get_deinterlace_params(self):
+        """
+        Read frame size and exposure times of the current frame buffer.
+        Returns the parameters used to deinterlace the frame as a dictionary.
+        """
+
+        frameBase = "BUF%d" % (azcam.db.tools["controller"].read_buffer)
+
+        self.NAMPS = self.numparamps * self.numseramps
+        self.NAXIS1 = int(azcam.db.tools["controller"].dict_frame[frameBase + "WIDTH"])
+        self.NAXIS2 = int(azcam.db.tools["controller"].dict_frame[frameBase + "HEIGHT"])
+        self.PIXELS = int(azcam.db.tools["controller"].dict_frame[frameBase + "PIXELS"])
+        self.LINES = int(azcam.db.tools["controller"].dict_frame[frameBase + "LINES"])
+
+        self.exptime = float(azcam.db.tools["controller"].int_ms / 1000)
+        self.intms = azcam.db.tools["controller"].int_ms
+        self.nointms = azcam.db.tools["controller"].noint_ms
+
+        return {
+            "numparamps": int(self.numparamps),
+            "numseramps": int(self.numseramps),
+            "naxis1": self.NAXIS1,
+            "lines": self.LINES,
+            "pixels": self.PIXELS,
+            "extpos_x": [int(x) for x in self.extpos_x],
+            "extpos_y": [int(x) for x in self.extpos_y],
+            "amp_cfg": [int(x) for x in self.amp_cfg],
+            "mosaic": azcam.db.tools["exposure"].image.focalplane.num_detectors > 1,
+        }
+
     def set_detector_config(self, sensor_data):
         """
         Set detector configuration parameters.
@@ -531,6 +672,72 @@ class ArchonFileConverter(object):
         return
 
 
+    def get_extension_flips(self):
+        """
+        Return the amplifier configuration (flip) of the data in each image extension.
+        """
+
+        NAMPS = self.numparamps * self.numseramps
+
+        flips = [0] * NAMPS
+        for posAmp in range(NAMPS):
+            indxAmp = (self.extpos_y[posAmp] - 1) * self.numseramps + self.extpos_x[posAmp] - 1
+            flips[indxAmp] = self.amp_cfg[posAmp]
+
+        return flips
+
+    def get_amp_region(self, ext_index, first_col, last_col, first_row, last_row):
+        """
+        Return the Archon buffer region for an ROI in one image extension.
+        ROI values are 0-based and inclusive in extension orientation.
+        Returns [first_row, last_row, first_col, last_col, flip_x, flip_y] in the Archon buffer.
+        """
+
+        frameBase = "BUF%d" % (azcam.db.tools["controller"].read_buffer)
+        PIXELS = int(azcam.db.tools["controller"].dict_frame[frameBase + "PIXELS"])
+        LINES = int(azcam.db.tools["controller"].dict_frame[frameBase + "LINES"])
+        NAMPS = self.numparamps * self.numseramps
+
+        # find the Archon amplifier position which is written to this extension
+        for posAmp in range(NAMPS):
+            indxAmp = (self.extpos_y[posAmp] - 1) * self.numseramps + self.extpos_x[posAmp] - 1
+            if indxAmp == ext_index:
+                break
+        else:
+            raise azcam.AzcamError(f"Invalid extension index {ext_index}")
+
+        if last_col < 0:
+            last_col = PIXELS - 1
+        if last_row < 0:
+            last_row = LINES - 1
+        if not (0 <= first_col <= last_col < PIXELS and 0 <= first_row <= last_row < LINES):
+            raise azcam.AzcamError("ROI is outside of the amplifier image")
+
+        flip_x = self.amp_cfg[posAmp] in [1, 3]
+        flip_y = self.amp_cfg[posAmp] in [2, 3]
+        if flip_x:
+            first_col, last_col = PIXELS - 1 - last_col, PIXELS - 1 - first_col
+        if flip_y:
+            first_row, last_row = LINES - 1 - last_row, LINES - 1 - first_row
+
+        # same amplifier tiling of the Archon buffer as buffer_processing()
+        if azcam.db.tools["exposure"].image.focalplane.num_detectors > 1:
+            col0 = posAmp * PIXELS
+            row0 = 0
+        else:
+            col0 = (posAmp % self.numseramps) * PIXELS
+            row0 = (posAmp // self.numseramps) * LINES
+
+        return [
+            row0 + first_row,
+            row0 + last_row,
+            col0 + first_col,
+            col0 + last_col,
+            flip_x,
+            flip_y,
+        ]
+
+
 class ReceiveDataArchon(object):
     """
     Exposure subclass to receive image data.
@@ -556,195 +763,143 @@ class ReceiveDataArchon(object):
         # Number of amplifiers
         self.numamps_image = 0
 
-    def receive_archon_image_data(self):
+        # FETCH blocks and pixels of last image
+        self.fetch_lines = 0
+        self.fetch_numpix = 0
+
+    def receive_archon_image_data(self, offload=None):
         """
         Receives image data and raw data (if rawdata_enable=1) from the Archon controller in the Direct Mode.
+        Data is fetched on the controller data connection so commands are not blocked.
+        If offload is an ArchonOffload, image data are received undecoded into its shared memory.
         Last change: 06Feb2018 Zareba
         """
 
+        controller = azcam.db.tools["controller"]
+
         # initial values
         self.PixelsReadout = 0
         self.pixels_remaining = 0
 
         # values taken from the Archon GUI
-        BURST_LEN = 1024
         lineSize = BURST_LEN
-        # chunkSize = 1024 * BURST_LEN
         rawBlockSize = 2048
 
-        if (
-            azcam.db.tools["controller"].read_buffer > 0
-            and azcam.db.tools["controller"].read_buffer < 4
-        ):
-            frameBase = "BUF%d" % (azcam.db.tools["controller"].read_buffer)
+        if controller.read_buffer > 0 and controller.read_buffer < 4:
+            frameBase = "BUF%d" % (controller.read_buffer)
             frame = frameBase + "FRAME"
 
-            if int(azcam.db.tools["controller"].dict_frame[frame]) > 0:
+            if int(controller.dict_frame[frame]) > 0:
                 # frame buffer base address
-                addr = int(azcam.db.tools["controller"].dict_frame[frameBase + "BASE"])
+                addr = int(controller.dict_frame[frameBase + "BASE"])
                 # get frame width and height
-                frameW = int(azcam.db.tools["controller"].dict_frame[frameBase + "WIDTH"])
-                frameH = int(azcam.db.tools["controller"].dict_frame[frameBase + "HEIGHT"])
+                frameW = int(controller.dict_frame[frameBase + "WIDTH"])
+                frameH = int(controller.dict_frame[frameBase + "HEIGHT"])
                 # get sample mode
-                sampleMode = int(azcam.db.tools["controller"].dict_frame[frameBase + "SAMPLE"]) + 1
+                sampleMode = int(controller.dict_frame[frameBase + "SAMPLE"]) + 1
 
                 # calculate fetch command values
                 frameSize = sampleMode * 2 * frameW * frameH
                 lines = int((frameSize + lineSize - 1) / lineSize)
-                rawBlocks = int(azcam.db.tools["controller"].dict_frame[frameBase + "RAWBLOCKS"])
-                rawLines = int(azcam.db.tools["controller"].dict_frame[frameBase + "RAWLINES"])
+                rawBlocks = int(controller.dict_frame[frameBase + "RAWBLOCKS"])
+                rawLines = int(controller.dict_frame[frameBase + "RAWLINES"])
                 rawSize = rawBlocks * rawLines * rawBlockSize
-                rawOffset = int(azcam.db.tools["controller"].dict_frame[frameBase + "RAWOFFSET"])
+                rawOffset = int(controller.dict_frame[frameBase + "RAWOFFSET"])
 
-                cmd = "FETCH%08X%08X" % (addr, lines)
+                self.pixels_remaining = frameSize // 2
+                self.fetch_lines = lines
+                self.fetch_numpix = frameSize // 2
 
-                azcam.db.tools["controller"].archon_bin_command(cmd)
-
-                # frameSize = frameSize + 4
-                totalRecv = 0
-
-                self.TData = numpy.empty(shape=int(frameSize / 2), dtype="<u2")
-
-                self.pixels_remaining = frameSize / 2
-                self.PixelsReadout = 0
-
-                # total bytes received from the Archon controller | each data frame starts with preamble '<NN:' | last data frame includes padding bytes
-                totalBytes = lines * (lineSize + 4)
-
-                totalRecv = 0
-                currLine = lineSize + 4
-
-                dataBuff = b""
-                totalPix = 0
-                imgPix = frameSize / 2
-
-                while totalRecv < totalBytes:
-                    getData = azcam.db.tools["controller"].camserver.socket.recv(currLine)
-
-                    totalRecv += len(getData)
-
-                    dataBuff += getData
-                    currLen = len(dataBuff)
-
-                    if currLen >= 1028:
-                        # got one fulle data frame
-                        if dataBuff[3] == 58:
-                            if totalPix + 512 < imgPix:
-                                pixCnt = 512
-                            else:
-                                pixCnt = imgPix - totalPix
-
-                            currBytes = 2 * pixCnt
-
-                            lData = int(currBytes + 4)
-                            ImageBufferTemp = numpy.ndarray(
-                                shape=(int(pixCnt)),
-                                dtype="<u2",
-                                buffer=dataBuff[4:lData],
-                            )
-
-                            lData = int(totalPix + pixCnt)
-                            self.TData[totalPix:lData] = ImageBufferTemp[0 : int(pixCnt)]
-                            totalPix += pixCnt
+                try:
+                    if offload is None:
+                        self.TData = controller.fetch_data(addr, lines, frameSize // 2)
+                    else:
+                        self.TData = None
+                        controller.fetch_blocks(addr, lines, offload.get_raw_buffer(lines))
+                except azcam.AzcamError as e:
+                    azcam.log(f"Image fetch error: {e}", level=3)
+                    if self.exposure.exposure_flag != self.exposure.exposureflags["ABORT"]:
+                        s = "ERROR did not receive entire image buffer"
+                        raise azcam.AzcamError(s)
+                    else:
+                        raise azcam.AzcamError("Exposure ABORTED")
 
-                            dataBuff = dataBuff[1028:]
-                        else:
-                            azcam.log("-----> dataBuff length:", len(dataBuff), level=3)
-                            totalRecv = totalBytes
-
-                azcam.log("----> totalRecv =", totalRecv, level=3)
-                if totalRecv == totalBytes:
-                    self.exposure.image.valid = 1
-                    self.pixels_remaining = 0
-                    azcam.db.tools["controller"].imagedata = self.TData
+                self.PixelsReadout = frameSize // 2
+                self.exposure.set_image_valid()
+                self.pixels_remaining = 0
+                controller.imagedata = self.TData
+                if self.TData is not None:
                     self.exposure.image.data = self.TData
 
-                    if azcam.db.tools["controller"].rawdata_enable == 1:
-                        # receive rad data
-                        lines = int((rawSize + lineSize - 1) / lineSize)
-
-                        cmd = "FETCH%08X%08X" % (addr + rawOffset, lines)
-
-                        azcam.db.tools["controller"].archon_bin_command(cmd)
-
-                        # frameSize = frameSize + 4
-                        totalRecv = 0
-
-                        self.RData = numpy.empty(shape=int(rawSize / 2), dtype="<u2")
+                if controller.rawdata_enable == 1:
+                    # receive raw data
+                    lines = int((rawSize + lineSize - 1) / lineSize)
 
-                        self.pixels_remaining = rawSize / 2
-                        self.PixelsReadout = 0
-
-                        # total bytes received from the Archon controller | each data frame starts with preamble '<NN:' | last data frame includes padding bytes
-                        totalBytes = lines * (lineSize + 4)
-
-                        totalRecv = 0
-                        currLine = lineSize + 4
-
-                        dataBuff = b""
-                        totalPix = 0
-                        imgPix = frameSize / 2
-
-                        # total bytes received from the Archon controller | each data frame starts with preamble '<NN:' | last data frame includes padding bytes
-                        totalBytes = lines * (lineSize + 4)
-
-                        totalRecv = 0
+                    try:
+                        self.RData = controller.fetch_data(addr + rawOffset, lines, rawSize // 2)
+                        controller.rawdata = self.RData
+                    except azcam.AzcamError as e:
+                        azcam.log(f"Raw data fetch error: {e}", level=3)
+                    else:
+                        try:
+                            self.exposure.rawdata.analyze(
+                                self.RData, controller.rawdata_channel, rawBlocks
+                            )
+                        except Exception as e:
+                            azcam.log(f"ERROR analyzing raw data: {e}")
 
-                        self.RData = numpy.empty(shape=int(rawSize / 2), dtype="<u2")
+                return
 
-                        while totalRecv < totalBytes:
-                            getData = azcam.db.tools["controller"].camserver.socket.recv(currLine)
+            else:
+                raise azcam.AzcamError("No frame available for fetching")
 
-                            totalRecv += len(getData)
+        else:
+            raise azcam.AzcamError("Wrong frame number")
 
-                            dataBuff += getData
-                            currLen = len(dataBuff)
+    def receive_archon_roi_data(self, ext_index, first_col, last_col, first_row, last_row):
+        """
+        Receives only the frame buffer lines which contain an ROI of one image extension.
+        Extension index and ROI values start at 0, with -1 for the last column or row.
+        Returns the ROI as a 2D array in extension orientation.
+        """
 
-                            if currLen >= 1028:
-                                # got one fulle data frame
-                                if dataBuff[3] == 58:
-                                    if totalPix + 512 < imgPix:
-                                        pixCnt = 512
-                                    else:
-                                        pixCnt = imgPix - totalPix
+        controller = azcam.db.tools["controller"]
 
-                                    currBytes = 2 * pixCnt
+        if not (controller.read_buffer > 0 and controller.read_buffer < 4):
+            raise azcam.AzcamError("Wrong frame number")
 
-                                    lData = int(currBytes + 4)
-                                    ImageBufferTemp = numpy.ndarray(
-                                        shape=(int(pixCnt)),
-                                        dtype="<u2",
-                                        buffer=dataBuff[4:lData],
-                                    )
+        frameBase = "BUF%d" % (controller.read_buffer)
+        if int(controller.dict_frame[frameBase + "FRAME"]) <= 0:
+            raise azcam.AzcamError("No frame available for fetching")
 
-                                    lData = int(totalPix + pixCnt)
-                                    self.RData[totalPix:lData] = ImageBufferTemp[0 : int(pixCnt)]
-                                    totalPix += pixCnt
+        addr = int(controller.dict_frame[frameBase + "BASE"])
+        frameW = int(controller.dict_frame[frameBase + "WIDTH"])
+        sampleMode = int(controller.dict_frame[frameBase + "SAMPLE"]) + 1
+        bytes_pixel = 2 * sampleMode
+        data_type = "<u2" if sampleMode == 1 else "<u4"
 
-                                    dataBuff = dataBuff[1028:]
-                                else:
-                                    azcam.log(
-                                        "-----> dataBuff length:",
-                                        len(dataBuff),
-                                        level=3,
-                                    )
-                                    azcam.log("ERROR ", dataBuff[:4].decode(), level=3)
-                                    totalRecv = totalBytes
+        row1, row2, col1, col2, flip_x, flip_y = self.exposure.fileconverter.get_amp_region(
+            ext_index, first_col, last_col, first_row, last_row
+        )
+        numrows = row2 - row1 + 1
 
-                        if totalRecv == totalBytes:
-                            azcam.db.tools["controller"].rawdata = self.RData
+        # memory blocks covering all buffer lines of the ROI
+        start_byte = row1 * frameW * bytes_pixel
+        end_byte = (row2 + 1) * frameW * bytes_pixel
+        first_block = start_byte // BURST_LEN
+        lines = (end_byte + BURST_LEN - 1) // BURST_LEN - first_block
 
-                    return
+        data = controller.fetch_data(
+            addr + first_block * BURST_LEN, lines, lines * BURST_LEN // 2
+        ).view(data_type)
 
-                else:
-                    if self.exposure_flag != self.EF_ABORT:
-                        s = "ERROR did not receive entire image buffer"
-                        raise azcam.AzcamError(s)
-                    else:
-                        raise azcam.AzcamError("Exposure ABORTED")
+        offset = (start_byte - first_block * BURST_LEN) // bytes_pixel
+        roi = data[offset : offset + numrows * frameW].reshape(numrows, frameW)
+        roi = roi[:, col1 : col2 + 1]
 
-            else:
-                raise azcam.AzcamError("No frame available for fetching")
+        if flip_x:
+            roi = roi[:, ::-1]
+        if flip_y:
+            roi = roi[::-1, :]
 
-        else:
-            raise azcam.AzcamError("Wrong frame number")
+        return numpy.ascontiguousarray(roi)
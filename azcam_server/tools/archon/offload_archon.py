@@ -0,0 +1,141 @@
+"""
+Contains the ArchonOffload class.
+Decodes, deinterlaces, and writes Archon frames in a worker process.
+"""
+
+import time
+
+import numpy
+
+from azcam_server.tools.archon.controller_archon import BURST_LEN, decode_fetch_blocks
+from azcam_server.tools.fits_compress import CompressedFitsWriter, attach_shared_memory
+
+
+def deinterlace_frame(data, out, params):
+    """
+    Deinterlace decoded Archon frame data into out as [extension, pixels].
+    Each amplifier is moved to its extension and flipped by amp_cfg
+    (0 none, 1 flip x, 2 flip y, 3 flip xy).
+    Same result as ArchonFileConverter.buffer_processing().
+    """
+
+    numparamps = params["numparamps"]
+    numseramps = params["numseramps"]
+    lines = params["lines"]
+    pixels = params["pixels"]
+    namps = numparamps * numseramps
+
+    if params["mosaic"]:
+        # mosaic Archon buffer has all amplifiers side by side in each line
+        frame = data[: lines * params["naxis1"]].reshape(lines, params["naxis1"])
+    else:
+        # single CCD buffer has numparamps blocks of lines, each numseramps amplifiers wide
+        cube = data[: namps * lines * pixels].reshape(numparamps, lines, numseramps, pixels)
+
+    for posAmp in range(namps):
+        if params["mosaic"]:
+            amp = frame[:, posAmp * pixels : (posAmp + 1) * pixels]
+        else:
+            amp = cube[posAmp // numseramps, :, posAmp % numseramps, :]
+
+        if params["amp_cfg"][posAmp] in [1, 3]:
+            amp = amp[:, ::-1]
+        if params["amp_cfg"][posAmp] in [2, 3]:
+            amp = amp[::-1, :]
+
+        indxAmp = (params["extpos_y"][posAmp] - 1) * numseramps + params["extpos_x"][posAmp] - 1
+        out[indxAmp, : lines * pixels].reshape(lines, pixels)[:] = amp
+
+    return
+
+
+def _process_frame(raw_name, lines, numpix, out_name, out_shape, params):
+    """
+    Worker process function which decodes raw FETCH blocks and deinterlaces
+    them into the output shared memory block.
+    Returns processing time in seconds.
+    """
+
+    start = time.time()
+
+    shm_raw = attach_shared_memory(raw_name)
+    shm_out = attach_shared_memory(out_name)
+    try:
+        data = decode_fetch_blocks(shm_raw.buf, lines, numpix)
+        out = numpy.ndarray(out_shape, dtype="<u2", buffer=shm_out.buf)
+        deinterlace_frame(data, out, params)
+
+        # release views before closing shared memory
+        del data, out
+    finally:
+        shm_raw.close()
+        shm_out.close()
+
+    return time.time() - start
+
+
+class ArchonOffload(CompressedFitsWriter):
+    """
+    Process pool stage for Archon frames.
+    Raw FETCH blocks are received directly into shared memory, then decoded and
+    deinterlaced by a worker process into a second shared memory block which is
+    used as image data and written by the worker without another copy.
+    The server process only waits for completion, so command threads are not
+    blocked by the GIL during large readouts.
+    """
+
+    def __init__(self, workers=1):
+        super().__init__(workers)
+
+        # shared memory for raw FETCH blocks
+        self.shm_raw = None
+
+        # seconds used by the worker for the last decode and deinterlace
+        self.deinterlace_time = 0.0
+
+    def get_raw_buffer(self, lines):
+        """
+        Return a writable shared memory buffer for lines FETCH blocks.
+        """
+
+        with self.lock:
+            self.shm_raw = self._allocate_shared_memory(self.shm_raw, lines * (BURST_LEN + 4))
+
+        return self.shm_raw.buf
+
+    def deinterlace(self, lines, numpix, shape, params):
+        """
+        Decode and deinterlace the raw frame in a worker process.
+        lines and numpix are the FETCH blocks and pixels received into the raw buffer.
+        shape is [numamps, pixels per amplifier] of the output.
+        params is from ArchonFileConverter.get_deinterlace_params().
+        Returns the image data as a view of shared memory, valid until the next frame.
+        """
+
+        shape = tuple(int(x) for x in shape)
+
+        with self.lock:
+            self.shm = self._allocate_shared_memory(self.shm, int(numpy.prod(shape)) * 2)
+
+            future = self._get_pool().submit(
+                _process_frame, self.shm_raw.name, lines, numpix, self.shm.name, shape, params
+            )
+            self.deinterlace_time = self._get_result(future, "deinterlacing frame")
+
+            data = numpy.ndarray(shape, dtype="<u2", buffer=self.shm.buf)
+
+        return data
+
+    def close(self):
+        """
+        Stop worker processes and free shared memory.
+        """
+
+        super().close()
+
+        with self.lock:
+            if self.shm_raw is not None:
+                self._free_shared_memory(self.shm_raw)
+                self.shm_raw = None
+
+        return
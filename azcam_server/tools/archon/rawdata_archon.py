@@ -0,0 +1,185 @@
+"""
+Contains the RawDataArchon class.
+"""
+
+import os
+import threading
+
+import numpy
+from astropy.io import fits as pyfits
+
+import azcam
+
+
+class RawDataArchon(object):
+    """
+    Analyze and save Archon raw channel (ADC sample) data.
+    Raw data is fetched after the image data when the controller rawdata_enable flag is set.
+    Statistics and the noise spectrum are computed only if analyze_enable is set.
+    """
+
+    def __init__(self):
+        # True to compute raw data statistics and noise spectrum after each readout
+        self.analyze_enable = 0
+        # True to write raw data to a side file next to each image file
+        self.save_file = 0
+        # suffix added to image filename root for the raw data file
+        self.file_suffix = "_raw"
+
+        # ADC sample time in seconds (Archon samples at 100 MHz)
+        self.sample_time = 1.0e-8
+        # number of raw samples in each raw data block
+        self.block_samples = 1024
+
+        # raw channel number of the last data received
+        self.channel = 0
+        # raw data of last exposure, one row per raw line
+        self.data = None
+
+        # statistics of last raw data
+        self.mean = 0.0
+        self.rms = 0.0
+        # mean of each raw line
+        self.line_means = None
+        # frequencies (Hz) and one-sided noise density (DN/sqrt(Hz)) averaged over lines
+        self.frequencies = None
+        self.noise_density = None
+
+        self.write_thread = None
+
+    def analyze(self, rawdata, channel, rawblocks):
+        """
+        Keep raw data and compute its statistics and noise spectrum if analyze_enable is set.
+        rawdata is the uint16 sample array.
+        channel is the raw channel number.
+        rawblocks is the number of raw blocks per line.
+        """
+
+        self.channel = channel
+
+        samples_line = rawblocks * self.block_samples
+        if samples_line == 0 or rawdata.size < samples_line:
+            self.data = None
+            return
+
+        numlines = rawdata.size // samples_line
+        self.data = rawdata[: numlines * samples_line].reshape(numlines, samples_line)
+
+        self.line_means = None
+        self.frequencies = None
+        self.noise_density = None
+        if not self.analyze_enable:
+            return
+
+        data = self.data.astype("float64")
+        self.line_means = data.mean(axis=1)
+        self.mean = float(data.mean())
+        self.rms = float(data.std())
+
+        # remove each line mean and average power spectrum over lines
+        data -= self.line_means[:, None]
+        power = numpy.abs(numpy.fft.rfft(data, axis=1)) ** 2
+        power = power.mean(axis=0) * 2.0 * self.sample_time / samples_line
+        power[0] = power[0] / 2.0
+        if samples_line % 2 == 0:
+            power[-1] = power[-1] / 2.0
+
+        self.frequencies = numpy.fft.rfftfreq(samples_line, self.sample_time)
+        self.noise_density = numpy.sqrt(power)
+
+        # record in controller header for the image file
+        controller = azcam.db.tools["controller"]
+        controller.set_keyword("RAWCHAN", self.channel, "Raw data channel", "int")
+        controller.set_keyword("RAWMEAN", round(self.mean, 3), "Raw data mean (DN)", "float")
+        controller.set_keyword("RAWRMS", round(self.rms, 3), "Raw data RMS (DN)", "float")
+
+        return
+
+    def get_stats(self):
+        """
+        Return a dictionary of the last raw data statistics.
+        """
+
+        if self.data is None:
+            return {}
+
+        stats = {
+            "channel": self.channel,
+            "lines": int(self.data.shape[0]),
+            "samples": int(self.data.shape[1]),
+        }
+
+        if self.noise_density is None:
+            return stats
+
+        # strongest noise frequency, ignoring DC
+        peak = int(numpy.argmax(self.noise_density[1:])) + 1
+
+        stats.update(
+            {
+                "mean": self.mean,
+                "rms": self.rms,
+                "peak_frequency": float(self.frequencies[peak]),
+                "peak_noise_density": float(self.noise_density[peak]),
+            }
+        )
+
+        return stats
+
+    def get_filename(self, image_filename):
+        """
+        Return the raw data filename for an image filename.
+        """
+
+        root, ext = os.path.splitext(image_filename)
+
+        return f"{root}{self.file_suffix}{ext}"
+
+    def write_file(self, image_filename):
+        """
+        Write raw data and spectrum to a side file in a background thread.
+        """
+
+        if self.data is None:
+            return
+
+        # wait for a previous write to finish so files are written in order
+        if self.write_thread is not None:
+            self.write_thread.join()
+
+        filename = self.get_filename(image_filename)
+        arglist = [filename, self.data, self.frequencies, self.noise_density, self.get_stats()]
+        self.write_thread = threading.Thread(
+            target=self._write_file, name="rawdata_write", args=arglist
+        )
+        self.write_thread.start()
+
+        return
+
+    def _write_file(self, filename, data, frequencies, noise_density, stats):
+        """
+        Write raw data file. Primary HDU is the raw data, SPECTRUM extension is the noise density
+        if the raw data were analyzed.
+        """
+
+        try:
+            hdu = pyfits.PrimaryHDU(data)
+            hdu.header["RAWCHAN"] = (stats["channel"], "Raw data channel")
+            hdu.header["SAMPTIME"] = (self.sample_time, "ADC sample time (s)")
+            hdulist = pyfits.HDUList([hdu])
+
+            if noise_density is not None:
+                hdu.header["RAWMEAN"] = (stats["mean"], "Raw data mean (DN)")
+                hdu.header["RAWRMS"] = (stats["rms"], "Raw data RMS (DN)")
+                c1 = pyfits.Column(name="Frequency", format="D", unit="Hz", array=frequencies)
+                c2 = pyfits.Column(
+                    name="Noise", format="D", unit="DN/sqrt(Hz)", array=noise_density
+                )
+                hdulist.append(pyfits.BinTableHDU.from_columns([c1, c2], name="SPECTRUM"))
+
+            hdulist.writeto(filename, overwrite=True)
+            azcam.log(f"Raw data written: {filename}", level=2)
+        except Exception as e:
+            azcam.log(f"ERROR writing raw data file {filename}: {e}")
+
+        return
@@ -71,11 +71,12 @@ class TempConArchon(TempCon):
         if flag != azcam.db.tools["exposure"].exposureflags["NONE"]:
             return self.last_temps[temperature_id]
 
-        # read temperature
+        # read temperature, first reading may share a recent STATUS snapshot
         avetemp = 0
-        for _ in range(self.num_temp_reads):
-            temp = float(azcam.db.tools["controller"].get_status()[Address])
-            avetemp += temp
+        for read_number in range(self.num_temp_reads):
+            max_age = None if read_number == 0 else 0
+            snapshot = azcam.db.tools["controller"].status_cache.get(max_age)
+            avetemp += snapshot.get_float(Address)
         temp = avetemp / self.num_temp_reads
 
         temp = self.apply_corrections(temp, temperature_id)
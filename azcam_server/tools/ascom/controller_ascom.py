@@ -141,12 +141,17 @@ class ControllerASCOM(Controller):
 
         flag = self.camera.ImageReady
 
+        exposure = azcam.db.tools["exposure"]
+        abort = exposure.exposureflags["ABORT"]
+
         count = 0
         if wait:
             while not flag:
                 if count > 100:
                     raise azcam.AzcamError("Camera timeout reading image")
-                time.sleep(0.05)
+                # returns at once on abort
+                if exposure.wait_for_flag([abort], 0.05):
+                    raise azcam.AzcamError("Exposure aborted")
                 count += 1
                 # print("waiting...")
                 flag = self.camera.ImageReady
@@ -47,9 +47,11 @@ class ExposureASCOM(Exposure):
         self.exp_start = time.time()
         self.dark_time_start = self.exp_start
         azcam.db.tools["controller"].start_exposure()
+        self.integration_timer.start(self.exposure_time)
 
         # wait for integration
-        time.sleep(self.exposure_time)
+        self.wait_integration()
+        self.integration_timer.stop()
 
         # exposure finished
         if imagetype == "zero":
@@ -84,7 +86,7 @@ class ExposureASCOM(Exposure):
             return
 
         # allow readout to complete
-        self.image.valid = 1
+        self.set_image_valid()
 
         imagetype = self.image_type.lower()
         if imagetype == "ramp":
@@ -93,14 +95,17 @@ class ExposureASCOM(Exposure):
         if self.exposure_flag == self.exposureflags["ABORT"]:
             azcam.log("Readout aborted")
             return
-        else:
-            azcam.log("Readout finished", level=2)
-            self.exposure_flag = self.exposureflags["NONE"]
-            return
 
-    def end(self):
+        self.transfer_image()
+
+        azcam.log("Readout finished", level=2)
+        self.exposure_flag = self.exposureflags["NONE"]
+
+        return
+
+    def transfer_image(self):
         """
-        Completes an exposure by writing file and displaying image.
+        Transfer image data from the camera into image.data.
         """
 
         # this can be slow for big image
@@ -111,12 +116,23 @@ class ExposureASCOM(Exposure):
             azcam.db.tools["controller"].detpars.numcols_image
             * azcam.db.tools["controller"].detpars.numrows_image
         )
-        self.image.data[0] = (
-            numpy.array(azcam.db.tools["controller"].camera.ImageArray)
-            .reshape(size)
-            .astype("uint16")
-        )
+        with self.timeline.phase("transfer"):
+            self.image.data[0] = (
+                numpy.array(azcam.db.tools["controller"].camera.ImageArray)
+                .reshape(size)
+                .astype("uint16")
+            )
+        self.update_image_stats()
+        self.update_quicklook()
+
+        return
 
+    def end(self):
+        """
+        Completes an exposure by writing file and displaying image.
+        """
+
+        # image data were transferred by readout()
         self.exposure_flag = self.exposureflags["WRITING"]
 
         if self.send_image:
@@ -128,11 +144,15 @@ class ExposureASCOM(Exposure):
         else:
             local_file = self.get_filename()
 
+        # wait for headers to be updated
+        self.wait_headers()
+
         # update controller header with keywords which might have changed
         et = float(int(self.exposure_time_actual * 1000.0) / 1000.0)
         dt = float(int(self.dark_time * 1000.0) / 1000.0)
         azcam.db.headers["exposure"].set_keyword("EXPTIME", et, "Exposure time (seconds)", "float")
         azcam.db.headers["exposure"].set_keyword("DARKTIME", dt, "Dark time (seconds)", "float")
+        self.write_timeline_keywords()
 
         # write file(s) to disk
         if self.save_file:
@@ -142,7 +162,8 @@ class ExposureASCOM(Exposure):
             self.image.overwrite = self.overwrite
             self.image.test_image = self.test_image
 
-            self.image.write_file(local_file, self.filetype)
+            with self.timeline.phase("write"):
+                self.write_image_file(local_file)
 
             azcam.log("Writing finished", level=2)
 
@@ -151,7 +172,8 @@ class ExposureASCOM(Exposure):
 
             if self.send_image:
                 azcam.log("Sending image")
-                azcam.db.tools["sendimage"].send_image()
+                with self.timeline.phase("sendimage"):
+                    azcam.db.tools["sendimage"].send_image()
 
         # image data and file are now ready
         self.image.toggle = 1
@@ -160,7 +182,7 @@ class ExposureASCOM(Exposure):
         if self.display_image:
             try:
                 azcam.log("Displaying image")
-                azcam.db.tools["display"].display(self.image)
+                self.display_file(self.image)
             except Exception:
                 pass
 
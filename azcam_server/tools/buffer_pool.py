@@ -0,0 +1,167 @@
+"""
+Contains the BufferPool class.
+"""
+
+import collections
+import mmap
+import threading
+
+import numpy
+
+
+class BufferPool(object):
+    """
+    Defines the BufferPool class.
+    Pool of preallocated page aligned numpy arrays keyed by shape and dtype,
+    so image buffers are reused rather than allocated for each exposure.
+    A buffer from get() has one reference. Code which uses a buffer after its owner
+    may release it calls hold(), and the buffer is reused after the last release().
+    Used by the exposure tool.
+    """
+
+    def __init__(self, max_free_bytes=2 * 1024 * 1024 * 1024):
+
+        # maximum bytes held in free buffers
+        self.max_free_bytes = max_free_bytes
+
+        # buffer alignment in bytes
+        self.alignment = mmap.PAGESIZE
+
+        # free buffers by (shape, dtype), least recently used first
+        self.free = collections.OrderedDict()
+        self.free_bytes = 0
+
+        # reference counts of buffers with more than one reference, by id
+        self.references = {}
+
+        # number of buffers allocated and reused, for status
+        self.allocated = 0
+        self.reused = 0
+
+        self.lock = threading.Lock()
+
+        return
+
+    def get(self, shape, dtype="<u2"):
+        """
+        Return an array of shape and dtype, reused from the pool if available.
+        Contents are not initialized.
+        """
+
+        key = self._key(shape, dtype)
+
+        with self.lock:
+            buffers = self.free.get(key)
+            if buffers:
+                buffer = buffers.pop()
+                if len(buffers) == 0:
+                    del self.free[key]
+                self.free_bytes -= buffer.nbytes
+                self.reused += 1
+                return buffer
+            self.allocated += 1
+
+        return self._allocate(key[0], key[1])
+
+    def hold(self, buffer):
+        """
+        Add a reference to a buffer so it is not reused until release() is called again.
+        Returns the buffer.
+        """
+
+        if buffer is None:
+            return None
+
+        with self.lock:
+            self.references[id(buffer)] = self.references.get(id(buffer), 1) + 1
+
+        return buffer
+
+    def release(self, buffer):
+        """
+        Release a reference to a buffer, which is returned to the pool for reuse
+        when no references remain.
+        The caller must not use the buffer after release.
+        """
+
+        if buffer is None:
+            return
+
+        key = self._key(buffer.shape, buffer.dtype)
+
+        with self.lock:
+            count = self.references.pop(id(buffer), 1) - 1
+            if count > 0:
+                if count > 1:
+                    self.references[id(buffer)] = count
+                return
+
+            # check buffer is not already free
+            for free_buffer in self.free.get(key, []):
+                if free_buffer is buffer:
+                    return
+
+            # drop least recently used buffers to stay under limit
+            while self.free and self.free_bytes + buffer.nbytes > self.max_free_bytes:
+                oldkey, buffers = next(iter(self.free.items()))
+                old = buffers.pop(0)
+                self.free_bytes -= old.nbytes
+                if len(buffers) == 0:
+                    del self.free[oldkey]
+
+            if buffer.nbytes > self.max_free_bytes:
+                return
+
+            self.free.setdefault(key, []).append(buffer)
+            self.free.move_to_end(key)
+            self.free_bytes += buffer.nbytes
+
+        return
+
+    def clear(self):
+        """
+        Drop all free buffers.
+        """
+
+        with self.lock:
+            self.free = collections.OrderedDict()
+            self.free_bytes = 0
+
+        return
+
+    def get_status(self):
+        """
+        Return pool counters as a dictionary.
+        """
+
+        with self.lock:
+            return {
+                "allocated": self.allocated,
+                "reused": self.reused,
+                "free_buffers": sum(len(b) for b in self.free.values()),
+                "free_bytes": self.free_bytes,
+                "held_buffers": len(self.references),
+            }
+
+    def _key(self, shape, dtype):
+        """
+        Pool key for shape and dtype.
+        """
+
+        if isinstance(shape, int):
+            shape = (shape,)
+
+        return (tuple(int(x) for x in shape), numpy.dtype(dtype).str)
+
+    def _allocate(self, shape, dtype):
+        """
+        Allocate a new page aligned array.
+        """
+
+        dtype = numpy.dtype(dtype)
+        nbytes = int(numpy.prod(shape, dtype=numpy.int64)) * dtype.itemsize
+
+        raw = numpy.empty(nbytes + self.alignment, dtype=numpy.uint8)
+        offset = (-raw.ctypes.data) % self.alignment
+
+        return raw[offset : offset + nbytes].view(dtype).reshape(shape)
@@ -29,6 +29,9 @@ class Controller(Tools, ObjectHeaderMethods):
         self.header = Header("Controller")
         self.header.set_header("controller", 2)
 
+        # keywords which do not change between exposures, set when DSP code is loaded
+        self.static_keywords = ["PCIFILE", "TIMFILE", "UTILFILE", "DSPFILE"]
+
         #:  exposure time (secs)
         self.exposure_time = 0
 
@@ -11,6 +11,7 @@ import os
 import shutil
 import subprocess
 import tempfile
+import threading
 import time
 from typing import List
 
@@ -76,6 +77,13 @@ class Ds9Display(Display):
         # set default display server
         self.default_display = 0
 
+        # background display requests, only the newest is kept
+        self.display_condition = threading.Condition()
+        self.display_request = None
+        self.display_thread = None
+        # number of requests replaced by a newer one before being displayed
+        self.display_dropped = 0
+
     def initialize(self):
         """
         Initialize Ds9.
@@ -205,23 +213,17 @@ class Ds9Display(Display):
     # *************************************************************************************************
     #   display image
     # *************************************************************************************************
-    def display(self, image, extension_number=-1):
+    def display(self, image, extension_number=-1, num_extensions=-1):
         """
         Display a file in ds9, making a copy so locking does not occur.
         If specified for an MEF file, only extension_number is displayed.
 
         :param image: a filename or an image object
         :param int extension_number: FITS extension number of image, -1 for all
+        :param int num_extensions: number of FITS extensions, -1 to read from file
         :return None:
         """
 
-        self.initialize()
-
-        # test, could be slow but seems to work nicely
-        self.set_display()
-
-        ds9 = self.host + ":" + self.port
-
         if type(image) == str:
             filename1 = azcam.utils.make_image_filename(image)
         else:
@@ -233,10 +235,31 @@ class Ds9Display(Display):
         filename = os.path.join(tempfile.gettempdir(), "tempdisplayfile" + ext)
         shutil.copyfile(filename1, filename)
 
+        self._display_copy(filename, extension_number, num_extensions)
+
+        return
+
+    def _display_copy(self, filename, extension_number=-1, num_extensions=-1):
+        """
+        Display a copy of an image file in ds9 with XPA.
+        """
+
+        self.initialize()
+
+        # test, could be slow but seems to work nicely
+        self.set_display()
+
+        ds9 = self.host + ":" + self.port
+
+        ext = os.path.splitext(filename)[-1]
+
         if ext == ".fits":
-            im = pyfits.open(filename)
-            ne = max(0, len(im) - 1)
-            im.close()
+            if num_extensions < 0:
+                im = pyfits.open(filename)
+                ne = max(0, len(im) - 1)
+                im.close()
+            else:
+                ne = num_extensions
             if ne in [0, 1]:
                 # s = self.xpaset_app + " " + ds9 + "fits iraf < " + filename
                 s = [self.xpaset_app, ds9, f"fits iraf < {filename}"]
@@ -276,6 +299,83 @@ class Ds9Display(Display):
 
         return
 
+    def display_nowait(self, image, extension_number=-1, num_extensions=-1):
+        """
+        Display a file in ds9 from a background thread and return immediately.
+        The file is copied before returning, so it may then be removed or overwritten.
+        If a previous request has not started yet it is replaced, so only the
+        newest image is displayed when images arrive faster than ds9 can show them.
+
+        :param image: a filename or an image object
+        :param int extension_number: FITS extension number of image, -1 for all
+        :param int num_extensions: number of FITS extensions, -1 to read from file
+        :return None:
+        """
+
+        if type(image) == str:
+            filename1 = azcam.utils.make_image_filename(image)
+        else:
+            filename1 = image.filename
+
+        # copy to a unique file which is removed after display
+        fd, filename = tempfile.mkstemp(
+            prefix="tempdisplayfile", suffix=os.path.splitext(filename1)[-1]
+        )
+        os.close(fd)
+        try:
+            shutil.copyfile(filename1, filename)
+        except Exception:
+            os.remove(filename)
+            raise
+
+        with self.display_condition:
+            if self.display_request is not None:
+                self.display_dropped += 1
+                self._remove_copy(self.display_request[0])
+            self.display_request = (filename, extension_number, num_extensions)
+
+            if self.display_thread is None:
+                self.display_thread = threading.Thread(
+                    target=self._display_loop, name="ds9display"
+                )
+                self.display_thread.daemon = True
+                self.display_thread.start()
+
+            self.display_condition.notify()
+
+        return
+
+    def _display_loop(self):
+        """
+        Display requests from display_nowait().
+        """
+
+        while True:
+            with self.display_condition:
+                while self.display_request is None:
+                    self.display_condition.wait()
+                request = self.display_request
+                self.display_request = None
+
+            try:
+                self._display_copy(*request)
+            except Exception as e:
+                azcam.log(f"ds9 display error: {e}")
+            finally:
+                self._remove_copy(request[0])
+
+    def _remove_copy(self, filename):
+        """
+        Remove a file copied for display.
+        """
+
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
+
+        return
+
     # *************************************************************************************************
 
     #   ROI's
@@ -2,16 +2,26 @@
 Contains the base Exposure class.
 """
 
+import collections
+import concurrent.futures
 import datetime
 import os
+import tempfile
 import threading
 import time
 from typing import Union, List, Optional
 
 import azcam
 import numpy
+from astropy.io import fits as pyfits
+from azcam_server.tools.buffer_pool import BufferPool
 from azcam_server.tools.exposure_filename import Filename
 from azcam_server.tools.exposure_obstime import ObsTime
+from azcam_server.tools.exposure_timer import ExposureTimer
+from azcam_server.tools.exposure_timeline import ExposureTimeline, PHASE_KEYWORDS
+from azcam_server.tools.fits_compress import CompressedFitsWriter
+from azcam_server.tools.image_stats import get_amp_stats
+from azcam_server.tools.quicklook import assemble_quicklook
 from azcam.header import Header, ObjectHeaderMethods
 from azcam.image import Image
 from azcam.tools import Tools
@@ -34,6 +44,51 @@ class Exposure(Tools, Filename, ObjectHeaderMethods):
         self.obstime = ObsTime()
         self.image = Image()
 
+        # integration timer, also woken when exposure flag is changed
+        self.integration_timer = ExposureTimer()
+
+        # reusable image data buffers
+        self.buffer_pool = BufferPool()
+        # pool buffer currently used for image.data
+        self.image_buffer = None
+
+        # True to compute quick-look amplifier statistics after readout
+        self.image_stats_enable = 1
+        # True to write amplifier statistics as exposure header keywords
+        self.image_stats_keywords = 1
+        # pixel value counted as saturated
+        self.image_stats_saturation = 65535
+        # image median uses every Nth pixel
+        self.image_stats_sample = 16
+        # amplifier statistics of last readout
+        self.image_stats = []
+        # statistics keywords written for last readout
+        self.image_stats_written = []
+
+        # True to make an assembled, overscan corrected and trimmed image after readout
+        self.quicklook_enable = 0
+        # overscan correction of quick-look image, "row", "mean" or "none"
+        self.quicklook_overscan = "row"
+        # float32 quick-look image of last readout or None, a new array for each readout
+        self.quicklook = None
+        # exposure number of the quick-look image
+        self.quicklook_number = 0
+
+        # tile compression of MEF files, "" for none or RICE_1, GZIP_1, GZIP_2
+        self.compression = ""
+        # number of worker processes for compression
+        self.compression_workers = 1
+        # writer for compressed files, created when first used
+        self.compressed_writer = None
+
+        # records time of each exposure phase
+        self.timeline = ExposureTimeline()
+        # True to write phase times as image header keywords
+        self.timeline_keywords = 0
+
+        # notified when exposure flag or image valid flag changes
+        self.state_condition = threading.Condition()
+
         # exposure flags, may be used anywhere
         self.exposureflags = {
             "NONE": 0,
@@ -73,6 +128,10 @@ class Exposure(Tools, Filename, ObjectHeaderMethods):
         self.flush_array = 1
         # True to display an image after readout
         self.display_image = 1
+        # True to display images in the background without waiting for the display
+        self.display_nowait = 1
+        # True to display the quick-look image instead of the image file
+        self.display_quicklook = 0
         # True to send image to remote image server after readout
         self.send_image = 0
 
@@ -80,6 +139,19 @@ class Exposure(Tools, Filename, ObjectHeaderMethods):
         self.guide_status = 0
         self.guide_image_copy = 0
 
+        # guide loop: write and send image file every Nth frame, 0 never
+        self.guide_write_interval = 1
+        # guide loop: number of frames used to measure frame rate
+        self.guide_rate_frames = 10
+        # guide loop: measured frames per second
+        self.guide_frame_rate = 0.0
+        # guide loop: number of frames read in current guide loop
+        self.guide_frame_number = 0
+        # guide loop: copy of data from last good frame
+        self.guide_data = None
+        # notified when a new guide frame is in guide_data
+        self.guide_condition = threading.Condition()
+
         # TdiMode flag, 0=not in TDI mode, 1=TDI mode
         self.tdi_mode = 0
         # TdiDelay mode
@@ -136,6 +208,31 @@ class Exposure(Tools, Filename, ObjectHeaderMethods):
         self.update_headers_in_background = 0
         self.updating_header = 0
 
+        # seconds to wait for each tool header, by tool name or default
+        self.header_timeout = 2.0
+        self.header_timeouts = {}
+        # tool headers are read in parallel in this pool
+        self.header_pool = None
+        self.header_futures = {}
+        # last good header values by tool name, used when a tool times out
+        self.header_lastgood = {}
+        # locks changes to published tool headers
+        self.header_lock = threading.Lock()
+        # set when header update is finished, files are written after this
+        self.header_done = threading.Event()
+        self.header_done.set()
+
+        # True to reuse static header keywords and only read dynamic keywords each exposure
+        self.use_static_headers = 1
+        # static keywords by header name, added to each tool's static_keywords
+        self.header_static_keywords = {}
+        # cached static keywords by header name, [[keyword, value, comment, type], ...]
+        self.static_headers = {}
+        # True when the static keywords of all headers are rendered in static_header
+        self.static_header_valid = 0
+        # True when the focalplane header is current
+        self.focalplane_header_valid = 0
+
         # True to save image file after exposure
         self.save_file = 1
 
@@ -168,6 +265,10 @@ class Exposure(Tools, Filename, ObjectHeaderMethods):
         self.new_roi = 0
         self.header.set_header("exposure", 1)
 
+        # static keywords of all headers, rendered once and written with each image
+        self.static_header = Header("Static")
+        self.static_header.set_header("static")
+
         # data order
         self.data_order = []
 
@@ -175,6 +276,56 @@ class Exposure(Tools, Filename, ObjectHeaderMethods):
 
         self.pgress = 0  # debug
 
+    @property
+    def exposure_flag(self):
+        """
+        Exposure flag defining state of current exposure.
+        """
+
+        return self._exposure_flag
+
+    @exposure_flag.setter
+    def exposure_flag(self, flag):
+        with self.state_condition:
+            self._exposure_flag = flag
+            self.state_condition.notify_all()
+
+        self.integration_timer.wake()
+
+    def wait_for_flag(self, flags, timeout=None):
+        """
+        Wait until the exposure flag is one of flags or timeout seconds.
+        flags is a list of exposure flag values.
+        Returns True if the exposure flag is one of flags.
+        """
+
+        with self.state_condition:
+            return self.state_condition.wait_for(lambda: self._exposure_flag in flags, timeout)
+
+    def set_image_valid(self, flag=1):
+        """
+        Set image valid flag when image data has been received, waking waiters.
+        """
+
+        with self.state_condition:
+            self.image.valid = flag
+            self.state_condition.notify_all()
+
+        return
+
+    def wait_image_valid(self, timeout=5.0):
+        """
+        Wait until image data has been received or the exposure is aborted.
+        Returns True if image data is valid.
+        """
+
+        abort = self.exposureflags["ABORT"]
+        with self.state_condition:
+            self.state_condition.wait_for(
+                lambda: self.image.valid or self._exposure_flag == abort, timeout
+            )
+            return bool(self.image.valid)
+
     def initialize(self):
         """
         Initialize exposure.
@@ -208,6 +359,9 @@ class Exposure(Tools, Filename, ObjectHeaderMethods):
         self.save_file = 1
         self.exposure_flag = self.exposureflags["NONE"]
 
+        # static header values are read again after reset
+        self.invalidate_static_headers()
+
         # call reset() method on other tools
         for tool in azcam.db.tools_reset:
             azcam.db.tools[tool].reset()
@@ -297,6 +451,7 @@ class Exposure(Tools, Filename, ObjectHeaderMethods):
         self.start()
 
         azcam.log("Exposure started")
+        self.timeline.start(imagetype if imagetype != "" else self.image_type)
 
         # if last exposure was aborted, warn before clearing flag
         if self.exposure_flag == self.exposureflags["ABORT"]:
@@ -304,11 +459,13 @@ class Exposure(Tools, Filename, ObjectHeaderMethods):
 
         # begin
         if self.exposure_flag != self.exposureflags["ABORT"]:
-            self.begin(exposure_time, imagetype, title)
+            with self.timeline.phase("begin"):
+                self.begin(exposure_time, imagetype, title)
 
         # integrate
         if self.exposure_flag != self.exposureflags["ABORT"]:
-            self.integrate()
+            with self.timeline.phase("integrate"):
+                self.integrate()
 
         # readout
         if (
@@ -316,15 +473,18 @@ class Exposure(Tools, Filename, ObjectHeaderMethods):
             and self.exposure_flag == self.exposureflags["READ"]
         ):
             try:
-                self.readout()
+                with self.timeline.phase("readout"):
+                    self.readout()
             except azcam.AzcamError:
                 pass
         # end
         if self.exposure_flag != self.exposureflags["ABORT"]:
-            self.end()
+            with self.timeline.phase("end"):
+                self.end()
 
         self.exposure_flag = self.exposureflags["NONE"]
         self.completed = 1
+        self.timeline.finish()
         azcam.log("Exposure finished")
 
         # allow custom operations
@@ -351,6 +511,9 @@ class Exposure(Tools, Filename, ObjectHeaderMethods):
         """
         Make a complete guider exposure sequence.
         NumberExposures is the number of exposures to make, -1 loop forever
+        The exposure is configured once with begin(), then each frame only integrates
+        and reads out the current ROI. Frame data is kept in guide_data and a file is
+        written and sent every guide_write_interval frames.
         """
 
         AbortFlag = 0
@@ -365,39 +528,69 @@ class Exposure(Tools, Filename, ObjectHeaderMethods):
         flusharray = self.flush_array
         azcam.log("Guide started")
 
+        self.guide_frame_number = 0
+        self.guide_frame_rate = 0.0
+        frame_times = collections.deque(maxlen=max(2, self.guide_rate_frames))
+
         # this loop continues even for errors since data is sent to a seperate client receiving images
         LoopCount = 0
         while True:
-            if 0:
+            self.timeline.start("guide")
+            self.guide_status = 0
+
+            # full setup only for first frame
+            if LoopCount == 0:
                 self.begin(exposure_time=-1, imagetype="object", title="guide image")
+            else:
+                self.guide_begin()
 
-                # integrate
-                self.integrate()
+            # integrate
+            if self.exposure_flag != self.exposureflags["ABORT"]:
+                with self.timeline.phase("integrate"):
+                    self.integrate()
 
-                # readout
-                if self.exposure_flag == self.exposureflags["READ"]:
-                    try:
-                        self.readout()
-                        self.guide_status = 1  # image read OK
-                        self.guide_image_copy = self.image
-                    except Exception:
-                        self.guide_status = 2  # image not read OK, but don't stop guide loop
-                        self.image = self.guide_image_copy
-
-                # image writing
-                self.end()
-                self.exposure_flag = self.exposureflags["NONE"]
-            else:
-                self.expose(-1, "object", "guide image")
+            # readout
+            if self.exposure_flag == self.exposureflags["READ"]:
+                try:
+                    with self.timeline.phase("readout"):
+                        data = self.guide_readout()
+                    self.guide_status = 1  # image read OK
+                    self.guide_frame_number += 1
+                    with self.guide_condition:
+                        self.guide_data = data.copy()
+                        self.guide_condition.notify_all()
+                except Exception:
+                    self.guide_status = 2  # image not read OK, but don't stop guide loop
+
+            # image writing every Nth frame
+            if (
+                self.exposure_flag != self.exposureflags["ABORT"]
+                and self.guide_status == 1
+                and self.guide_write_interval > 0
+                and self.guide_frame_number % self.guide_write_interval == 0
+            ):
+                with self.timeline.phase("end"):
+                    self.end()
+            elif not self.flush_array:
+                azcam.db.tools["controller"].start_idle()
+            self.exposure_flag = self.exposureflags["NONE"]
+            self.timeline.finish()
+
+            # frame rate over last frames
+            frame_times.append(time.monotonic())
+            if len(frame_times) > 1:
+                self.guide_frame_rate = (len(frame_times) - 1) / (
+                    frame_times[-1] - frame_times[0]
+                )
 
             AbortFlag = azcam.db.abortflag
             if AbortFlag:
                 break
 
+            LoopCount += 1
+
             if number_exposures == -1:
                 continue
-            else:
-                LoopCount += 1
 
             if LoopCount >= number_exposures:
                 break
@@ -409,10 +602,58 @@ class Exposure(Tools, Filename, ObjectHeaderMethods):
         if AbortFlag:
             azcam.AzcamWarning("Guide aborted")
         else:
-            azcam.log("Guide finished")
+            azcam.log(f"Guide finished: {self.guide_frame_rate:.2f} frames/sec")
 
         return
 
+    def guide_begin(self):
+        """
+        Minimal begin() for guide frames after the first.
+        Headers, ROI, exposure time, shutter and comp lamps are unchanged from the first frame.
+        """
+
+        self.exposure_flag = self.exposureflags["SETUP"]
+
+        self.set_image_valid(0)
+        self.image.written = 0
+        self.image.toggle = 0
+        self.image.assembled = 0
+
+        self.paused_time = 0.0
+        self.paused_time_start = 0.0
+        self.exposure_time_remaining = self.exposure_time
+        self.pixels_remaining = self.image.focalplane.numpix_image
+
+        with self.timeline.phase("flush"):
+            if self.flush_array:
+                self.flush()
+            else:
+                azcam.db.tools["controller"].stop_idle()
+
+        self.record_current_times()
+
+        return
+
+    def guide_readout(self):
+        """
+        Read out one guide frame and return its pixel data.
+        Controllers which transfer pixels only in end() override this.
+        """
+
+        self.readout()
+
+        if self.exposure_flag == self.exposureflags["ABORT"]:
+            raise azcam.AzcamError("Guide readout aborted")
+
+        return self.image.data
+
+    def get_guide_rate(self):
+        """
+        Return measured guide frame rate in frames per second and number of guide frames read.
+        """
+
+        return [self.guide_frame_rate, self.guide_frame_number]
+
     def guide1(self, number_exposures=1):
         """
         Make a complete guider exposure with an immediate return.
@@ -441,8 +682,12 @@ class Exposure(Tools, Filename, ObjectHeaderMethods):
         # set exposure flag
         self.exposure_flag = self.exposureflags["SETUP"]
 
+        # new timeline record if not started by expose()
+        if self.timeline.current is None:
+            self.timeline.start(imagetype if imagetype != "" else self.image_type)
+
         # reset flags as new data coming
-        self.image.valid = 0
+        self.set_image_valid(0)
         self.image.written = 0
         self.image.toggle = 0
         self.image.assembled = 0
@@ -458,12 +703,12 @@ class Exposure(Tools, Filename, ObjectHeaderMethods):
             pass
 
         if self.new_roi:
-            self.image.data = numpy.empty(
-                shape=[
+            self.image.data = self.get_image_buffer(
+                [
                     self.image.focalplane.numamps_image,
                     self.image.focalplane.numpix_amp,
                 ],
-                dtype="<u2",
+                "<u2",
             )
             self.new_roi = 0
 
@@ -533,6 +778,7 @@ class Exposure(Tools, Filename, ObjectHeaderMethods):
 
         # update all headers with current data
         if self.update_headers_in_background:
+            self.header_done.clear()
             headerthread = threading.Thread(
                 target=self.update_headers, name="updateheaders", args=[]
             )
@@ -541,10 +787,11 @@ class Exposure(Tools, Filename, ObjectHeaderMethods):
             self.update_headers()
 
         # flush detector
-        if self.flush_array:
-            self.flush()
-        else:
-            azcam.db.tools["controller"].stop_idle()
+        with self.timeline.phase("flush"):
+            if self.flush_array:
+                self.flush()
+            else:
+                azcam.db.tools["controller"].stop_idle()
 
         # record current time and date in header
         self.record_current_times()
@@ -581,6 +828,49 @@ class Exposure(Tools, Filename, ObjectHeaderMethods):
 
         if self.exposure_flag != self.exposureflags["NONE"]:
             self.exposure_flag = self.exposureflags["READ"]
+        self.integration_timer.wake()
+
+        return
+
+    def wait_integration(self, pausable=False):
+        """
+        Wait for the integration timer to finish.
+        Returns early when the exposure flag is set to ABORT or READ.
+        PAUSE and RESUME pause and resume the timer if pausable, otherwise they are ignored.
+        """
+
+        timer = self.integration_timer
+
+        while True:
+            generation = timer.generation
+            flag = self.exposure_flag
+
+            if flag == self.exposureflags["ABORT"]:
+                break
+            elif flag == self.exposureflags["READ"]:
+                self.exposure_time_actual = timer.elapsed()
+                break
+            elif flag == self.exposureflags["PAUSE"]:
+                if pausable:
+                    timer.pause()
+                    self.exposure_flag = self.exposureflags["PAUSED"]
+                    azcam.log("Integration paused")
+                else:
+                    azcam.log("Integration pause not supported")
+                    self.exposure_flag = self.exposureflags["EXPOSING"]
+            elif flag == self.exposureflags["RESUME"]:
+                timer.resume()
+                self.exposure_flag = self.exposureflags["EXPOSING"]
+                if pausable:
+                    azcam.log("Integration resumed")
+            elif flag == self.exposureflags["PAUSED"]:
+                timer.wait(generation=generation)
+            elif timer.remaining() <= 0:
+                break
+            else:
+                timer.wait(generation=generation)
+
+        self.exposure_time_remaining = timer.remaining()
 
         return
 
@@ -706,6 +996,7 @@ class Exposure(Tools, Filename, ObjectHeaderMethods):
 
         if self.exposure_flag != self.exposureflags["NONE"]:
             self.exposure_flag = self.exposureflags["PAUSE"]
+        self.integration_timer.wake()
 
         return
 
@@ -721,6 +1012,7 @@ class Exposure(Tools, Filename, ObjectHeaderMethods):
 
         if self.exposure_flag != self.exposureflags["NONE"]:
             self.exposure_flag = self.exposureflags["RESUME"]
+        self.integration_timer.wake()
 
         return
 
@@ -732,6 +1024,7 @@ class Exposure(Tools, Filename, ObjectHeaderMethods):
 
         if self.exposure_flag != self.exposureflags["NONE"]:
             self.exposure_flag = self.exposureflags["ABORT"]
+        self.integration_timer.wake()
 
         return
 
@@ -814,9 +1107,12 @@ class Exposure(Tools, Filename, ObjectHeaderMethods):
     def get_exposuretime_remaining(self):
         """
         Return remaining exposure time (in seconds).
+        Uses the integration timer during integration, so the controller is not polled.
         """
 
-        if azcam.db.tools["controller"].is_reset:
+        if self.integration_timer.running:
+            self.exposure_time_remaining = self.integration_timer.remaining()
+        elif azcam.db.tools["controller"].is_reset:
             self.exposure_time_remaining = azcam.db.tools[
                 "controller"
             ].update_exposuretime_remaining()
@@ -860,23 +1156,77 @@ class Exposure(Tools, Filename, ObjectHeaderMethods):
 
         # set flag that update is in progress
         self.updating_header = 1
+        self.header_done.clear()
+        self.timeline.begin_phase("headers")
+
+        if self.header_pool is None:
+            self.header_pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=8, thread_name_prefix="header"
+            )
 
-        # all headers to be updated must be in azcam.db['headers']
-        for objectname in azcam.db.headers:
+        # all headers to be updated must be in azcam.db['headers'], read in parallel
+        start = time.monotonic()
+        stale = []
+        for objectname in list(azcam.db.headers):
             if (
                 objectname == "controller"
                 or objectname == "system"
                 or objectname == "exposure"
                 or objectname == "focalplane"
+                or objectname == "static"
             ):
                 continue
+            # a tool still busy from a previous exposure is not asked again
+            future = self.header_futures.get(objectname)
+            if future is not None and not future.done():
+                azcam.log(f"{objectname} header still busy, using last values")
+                stale.append(objectname)
+                continue
             try:
-                azcam.db.tools[objectname].update_header()  # dont crash so all headers get updated
+                self._get_published_header(objectname)
             except Exception as e:
                 azcam.log(f"could not get {objectname} header: {e}")
+                stale.append(objectname)
+                continue
+            self.header_futures[objectname] = self.header_pool.submit(
+                self._update_tool_header, objectname
+            )
+
+        for objectname, future in self.header_futures.items():
+            if objectname in stale:
+                continue
+            timeout = self.header_timeouts.get(objectname, self.header_timeout)
+            try:
+                header = future.result(max(0.0, start + timeout - time.monotonic()))
+                self._publish_tool_header(objectname, header)
+            except concurrent.futures.TimeoutError:
+                azcam.log(f"{objectname} header timed out, using last values")
+                stale.append(objectname)
+            except Exception as e:  # dont crash so all headers get updated
+                azcam.log(f"could not get {objectname} header: {e}")
+                stale.append(objectname)
+
+        for objectname in stale:
+            self._restore_tool_header(objectname)
+
+        # flag headers which have last good values
+        if len(stale) > 0:
+            self.header.set_keyword(
+                "HDRSTALE", " ".join(stale), "Headers with last good values", "str"
+            )
+        else:
+            self.header.delete_keyword("HDRSTALE")
+
+        # update focalplane header which is not in db, static until geometry changes
+        if not (self.use_static_headers and self.focalplane_header_valid):
+            self.image.focalplane.update_header()
+            self.focalplane_header_valid = 1
 
-        # update focalplane header which is not in db
-        self.image.focalplane.update_header()
+        if not self.use_static_headers:
+            self.static_header.delete_all_keywords()
+            self.static_header_valid = 0
+        elif not self.static_header_valid:
+            self._render_static_header()
 
         # try to update system header last
         if "system" in azcam.db.headers:
@@ -887,6 +1237,483 @@ class Exposure(Tools, Filename, ObjectHeaderMethods):
 
         # set flag that update is finished
         self.updating_header = 0
+        self.timeline.end_phase("headers")
+        self.header_done.set()
+
+        return
+
+    def wait_headers(self, timeout=None):
+        """
+        Wait for a header update to finish before writing an image file.
+        """
+
+        if not self.header_done.wait(timeout):
+            azcam.log("ERROR header update not finished")
+
+        return
+
+    def set_static_keywords(self, header_name, keywords):
+        """
+        Declare keywords of a header as static so they are read once and reused
+        for each exposure until invalidate_static_headers() is called.
+        Static keywords are written from the static header rather than their own header.
+        keywords is a list of keyword names or a space separated string.
+        """
+
+        if isinstance(keywords, str):
+            keywords = keywords.split()
+
+        self.header_static_keywords[header_name] = [k.upper() for k in keywords]
+        self.invalidate_static_headers(header_name)
+
+        return
+
+    def get_static_keywords(self, header_name):
+        """
+        Return the list of static keywords of a header.
+        """
+
+        static = list(self.header_static_keywords.get(header_name, []))
+
+        tool = azcam.db.tools.get(header_name)
+        if tool is not None:
+            for keyword in getattr(tool, "static_keywords", []):
+                if keyword not in static:
+                    static.append(keyword)
+
+        return static
+
+    def invalidate_static_headers(self, header_name=None):
+        """
+        Discard cached static header values for one header or for all headers,
+        so they are read again on the next exposure.
+        """
+
+        if header_name is None:
+            self.static_headers = {}
+            self.focalplane_header_valid = 0
+        elif header_name == "focalplane":
+            self.focalplane_header_valid = 0
+        else:
+            self.static_headers.pop(header_name, None)
+
+        self.static_header_valid = 0
+
+        return
+
+    def _render_static_header(self):
+        """
+        Render the static keywords of all headers into the static header,
+        which is in the header order written to image files.
+        Tool headers are from the static keyword cache and the controller header,
+        which is set by the controller, is read directly.
+        """
+
+        cards = []
+        with self.header_lock:
+            for header_name in list(azcam.db.headers):
+                if header_name in self.static_headers:
+                    cards.extend(self.static_headers[header_name])
+                elif header_name == "controller":
+                    header = azcam.db.headers[header_name]
+                    for keyword in self.get_static_keywords(header_name):
+                        if keyword in header.keywords:
+                            cards.append(
+                                [
+                                    keyword,
+                                    header.values.get(keyword),
+                                    header.comments.get(keyword, ""),
+                                    header.typestrings.get(keyword, "str"),
+                                ]
+                            )
+
+            self.static_header.delete_all_keywords()
+            for keyword, value, comment, typestring in cards:
+                self.static_header.set_keyword(keyword, value, comment, typestring)
+
+        self.static_header_valid = 1
+
+        return
+
+    def get_image_buffer(self, shape, dtype="<u2"):
+        """
+        Return a pool buffer for image.data.
+        The buffer of the previous image is released, it is reused only after code
+        which holds it with hold_image_buffer() has released it.
+        """
+
+        if self.image_buffer is not None:
+            self.buffer_pool.release(self.image_buffer)
+
+        self.image_buffer = self.buffer_pool.get(shape, dtype)
+
+        return self.image_buffer
+
+    def hold_image_buffer(self):
+        """
+        Hold the current image buffer so it is not reused for a new image.
+        Returns the buffer, or None if image.data is not a pool buffer.
+        Call buffer_pool.release() with the returned buffer when finished.
+        """
+
+        return self.buffer_pool.hold(self.image_buffer)
+
+    def send_image_async(self, localfile=None, remotefile=None):
+        """
+        Send image to remote image server in a thread, holding the image buffer until sent.
+        Returns the thread.
+        """
+
+        buffer = self.hold_image_buffer()
+
+        def send():
+            try:
+                azcam.db.tools["sendimage"].send_image(localfile, remotefile)
+            except Exception as e:
+                azcam.log(f"ERROR sending image: {e}")
+            finally:
+                self.buffer_pool.release(buffer)
+
+        sendthread = threading.Thread(target=send, name="writeasync")
+        sendthread.start()
+
+        return sendthread
+
+    def update_image_stats(self, flips=None):
+        """
+        Compute quick-look statistics of each amplifier from image.data and
+        optionally write them as exposure header keywords.
+        flips is the amplifier configuration of each amplifier if data is not in readout order.
+        """
+
+        # remove keywords of previous exposure
+        for keyword in self.image_stats_written:
+            self.header.delete_keyword(keyword)
+        self.image_stats_written = []
+        self.image_stats = []
+
+        if not self.image_stats_enable:
+            return
+
+        try:
+            with self.timeline.phase("stats"):
+                self.image_stats = get_amp_stats(
+                    self.image.data,
+                    self.image.focalplane,
+                    flips,
+                    self.image_stats_saturation,
+                    self.image_stats_sample,
+                )
+        except Exception as e:
+            azcam.log(f"could not compute image statistics: {e}")
+            return
+
+        if not self.image_stats_keywords:
+            return
+
+        for amp in self.image_stats:
+            if amp["amp"] > 99:
+                break
+            n = amp["amp"]
+            for keyword, value, comment, typestring in [
+                (f"OVMEAN{n}", round(amp["overscan_mean"], 2), "Overscan mean", "float"),
+                (f"OVRMS{n}", round(amp["overscan_rms"], 2), "Overscan RMS", "float"),
+                (f"IMMED{n}", round(amp["image_median"], 1), "Image median", "float"),
+                (f"NSAT{n}", amp["saturated"], "Number of saturated pixels", "int"),
+            ]:
+                self.header.set_keyword(keyword, value, f"{comment} amp {n}", typestring)
+                self.image_stats_written.append(keyword)
+
+        return
+
+    def get_image_stats(self):
+        """
+        Return quick-look statistics of each amplifier of the last readout.
+        Each item is a dictionary with overscan mean, median and RMS, image median,
+        number of saturated pixels, and min and max values.
+        """
+
+        return self.image_stats
+
+    def update_quicklook(self, amp_cfg=None, flipped=False):
+        """
+        Make the quick-look image from image.data if quicklook_enable or
+        display_quicklook is True.
+        amp_cfg is the flip of each amplifier, default focalplane.amp_cfg.
+        flipped is True if image.data is already flipped into extension orientation.
+        """
+
+        if not (self.quicklook_enable or self.display_quicklook):
+            return
+
+        if amp_cfg is None:
+            amp_cfg = self.image.focalplane.amp_cfg
+
+        try:
+            # not a pool buffer, previews and tiles keep the published array
+            with self.timeline.phase("quicklook"):
+                out = assemble_quicklook(
+                    self.image.data,
+                    self.image.focalplane,
+                    amp_cfg,
+                    flipped,
+                    None,
+                    self.quicklook_overscan,
+                )
+        except Exception as e:
+            azcam.log(f"could not make quick-look image: {e}")
+            return
+
+        self.quicklook = out
+        self.quicklook_number += 1
+
+        return
+
+    def display_file(self, image):
+        """
+        Display an image file or image object after readout.
+        The number of FITS extensions is taken from the image format rather than the file.
+        If display_quicklook is True the quick-look image is displayed instead.
+        Only a display which waits is recorded in the timeline.
+        """
+
+        display = azcam.db.tools["display"]
+
+        if self.display_quicklook and self.quicklook is not None:
+            image = self.write_quicklook_file()
+
+        # only the ds9 display supports background display
+        if not hasattr(display, "display_nowait"):
+            with self.timeline.phase("display"):
+                display.display(image)
+            return
+
+        if self.display_quicklook and self.quicklook is not None:
+            num_extensions = 0
+        elif self.filetype == self.filetypes["MEF"]:
+            num_extensions = self.image.focalplane.numamps_image
+        else:
+            num_extensions = 0
+
+        if self.display_nowait:
+            display.display_nowait(image, -1, num_extensions)
+        else:
+            with self.timeline.phase("display"):
+                display.display(image, -1, num_extensions)
+
+        return
+
+    def get_quicklook(self):
+        """
+        Return the quick-look image of the last readout as a float32 array, or None.
+        This is the assembled mosaic with overscan subtracted and overscan trimmed,
+        for use by display, preview and image sending code in the server.
+        A new array is made for each readout, a returned array is never modified.
+        """
+
+        return self.quicklook
+
+    def write_quicklook_file(self, filename=""):
+        """
+        Write the quick-look image of the last readout to a single image FITS file.
+        filename default is quicklook.fits in the temporary folder.
+        Returns the filename.
+        """
+
+        if self.quicklook is None:
+            raise azcam.AzcamError("No quick-look image available")
+
+        if filename == "":
+            filename = os.path.join(tempfile.gettempdir(), "quicklook.fits")
+
+        hdu = pyfits.PrimaryHDU(self.quicklook)
+        hdu.header.set("OBJECT", self.title, "Image title")
+        hdu.header.set("IMAGETYP", self.image_type, "Image type")
+        hdu.header.set("QLOOKNUM", self.quicklook_number, "Quick-look image number")
+        hdu.writeto(filename, overwrite=True)
+
+        return filename
+
+    def write_image_file(self, filename):
+        """
+        Write image to disk, as a tile compressed MEF file if compression is set.
+        """
+
+        buffer = self.hold_image_buffer()
+
+        try:
+            if self.compression != "" and self.filetype == self.filetypes["MEF"]:
+                if self.compressed_writer is None:
+                    self.compressed_writer = CompressedFitsWriter(self.compression_workers)
+                self.compressed_writer.write(self.image, filename, self.compression)
+            else:
+                self.image.write_file(filename, self.filetype)
+        finally:
+            self.buffer_pool.release(buffer)
+
+        return
+
+    def write_timeline_keywords(self):
+        """
+        Write times of finished exposure phases to the exposure header
+        if timeline_keywords is True, otherwise remove them.
+        """
+
+        # remove keywords of previous exposure
+        for keyword in PHASE_KEYWORDS.values():
+            self.header.delete_keyword(keyword)
+
+        if not self.timeline_keywords:
+            return
+
+        for keyword, value, comment in self.timeline.get_keywords():
+            self.header.set_keyword(keyword, value, comment, "float")
+
+        return
+
+    def get_timeline(self, count=1):
+        """
+        Return phase times of the last count exposures, -1 for all in history.
+        Each record is a dictionary with phase start and duration in seconds.
+        """
+
+        return self.timeline.get_history(int(count))
+
+    def get_timeline_current(self):
+        """
+        Return phase times of the exposure in progress, None if no exposure.
+        """
+
+        return self.timeline.get_current()
+
+    def get_timeline_summary(self):
+        """
+        Return mean and max time of each exposure phase over timeline history.
+        """
+
+        return self.timeline.get_summary()
+
+    def _update_tool_header(self, objectname):
+        """
+        Update one tool header and return a copy of its keywords as a new Header.
+        Runs in the header pool. Only the tool header is changed, the header written
+        to image files is set by update_headers() if the update finishes in time.
+        Static keywords are set from cache and only dynamic keywords are read.
+        """
+
+        tool = azcam.db.tools[objectname]
+        header = tool.header
+
+        static = self.get_static_keywords(objectname) if self.use_static_headers else []
+        cached = self.static_headers.get(objectname)
+
+        if len(static) == 0 or cached is None or not tool.is_enabled or not tool.is_initialized:
+            tool.update_header()
+
+            if len(static) > 0 and tool.is_enabled:
+                self.static_headers[objectname] = [
+                    [
+                        keyword,
+                        header.values.get(keyword),
+                        header.comments.get(keyword, ""),
+                        header.typestrings.get(keyword, "str"),
+                    ]
+                    for keyword in list(header.keywords)
+                    if keyword in static
+                ]
+                # static header is rendered again with the new values
+                self.static_header_valid = 0
+        else:
+            tool.define_keywords()
+            for keyword, value, comment, typestring in cached:
+                header.set_keyword(keyword, value, comment, typestring)
+            for keyword in header.get_keywords():
+                if keyword not in static:
+                    tool.get_keyword(keyword)
+
+        update = Header()
+        for keyword in list(header.keywords):
+            update.set_keyword(
+                keyword,
+                header.values.get(keyword),
+                header.comments.get(keyword, ""),
+                header.typestrings.get(keyword, "str"),
+            )
+
+        return update
+
+    def _get_published_header(self, objectname):
+        """
+        Return the header of a tool which is written to image files.
+        It is a separate Header from tool.header so that tool updates and keywords
+        set by commands only reach image files when published by update_headers().
+        """
+
+        header = azcam.db.headers[objectname]
+        tool = azcam.db.tools.get(objectname)
+        if tool is None or header is not tool.header:
+            return header
+
+        published = Header()
+        published.title = dict(header.title)
+        with self.header_lock:
+            for keyword in list(header.keywords):
+                published.set_keyword(
+                    keyword,
+                    header.values.get(keyword),
+                    header.comments.get(keyword, ""),
+                    header.typestrings.get(keyword, "str"),
+                )
+            # replaces the tool header but keeps its header order
+            published.set_header(objectname)
+
+        return published
+
+    def _publish_tool_header(self, objectname, header):
+        """
+        Set the published header of a tool from an update and save its values as
+        last good values. Cached static keywords are written from the static header instead.
+        """
+
+        static = []
+        if self.use_static_headers and objectname in self.static_headers:
+            static = [card[0] for card in self.static_headers[objectname]]
+
+        values = [
+            [
+                keyword,
+                header.values.get(keyword),
+                header.comments.get(keyword, ""),
+                header.typestrings.get(keyword, "str"),
+            ]
+            for keyword in list(header.keywords)
+            if keyword not in static
+        ]
+
+        with self.header_lock:
+            published = azcam.db.headers[objectname]
+            published.delete_all_keywords()
+            for keyword, value, comment, typestring in values:
+                published.set_keyword(keyword, value, comment, typestring)
+            self.header_lastgood[objectname] = values
+
+        return
+
+    def _restore_tool_header(self, objectname):
+        """
+        Set last good values in the published header of a tool.
+        """
+
+        if objectname not in self.header_lastgood:
+            return
+
+        try:
+            with self.header_lock:
+                header = azcam.db.headers[objectname]
+                for keyword, value, comment, typestring in self.header_lastgood[objectname]:
+                    header.set_keyword(keyword, value, comment, typestring)
+        except Exception as e:
+            azcam.log(f"could not restore {objectname} header: {e}")
 
         return
 
@@ -1185,6 +2012,8 @@ class Exposure(Tools, Filename, ObjectHeaderMethods):
 
         self.image.set_scaling()
 
+        self.invalidate_static_headers("focalplane")
+
         return reply
 
     def get_focalplane(self):
@@ -1315,6 +2144,7 @@ class Exposure(Tools, Filename, ObjectHeaderMethods):
         """
 
         self.image.focalplane.set_ref_pixel(XY)
+        self.invalidate_static_headers("focalplane")
 
         return
 
@@ -1492,6 +2322,7 @@ class Exposure(Tools, Filename, ObjectHeaderMethods):
             "rowbin": self.image.focalplane.row_bin,
             "systemname": azcam.db.systemname,
             "mode": azcam.db.servermode,
+            "guiderate": self.guide_frame_rate if self.guide_status else 0.0,
         }
 
         return response
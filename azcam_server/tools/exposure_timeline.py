@@ -0,0 +1,238 @@
+"""
+Contains the ExposureTimeline class.
+"""
+
+import collections
+import contextlib
+import datetime
+import threading
+import time
+
+# FITS keyword for each phase written when timing keywords are enabled
+PHASE_KEYWORDS = {
+    "begin": "TM-BEGIN",
+    "headers": "TM-HEADR",
+    "flush": "TM-FLUSH",
+    "integrate": "TM-INTEG",
+    "readout": "TM-READ",
+    "transfer": "TM-XFER",
+    "deinterlace": "TM-DEINT",
+    "stats": "TM-STATS",
+    "quicklook": "TM-QLOOK",
+    "write": "TM-WRITE",
+    "display": "TM-DISP",
+    "sendimage": "TM-SEND",
+}
+
+
+class ExposureTimeline(object):
+    """
+    Defines the ExposureTimeline class.
+    Records the start time and duration of each phase of each exposure.
+    Used by the exposure tool.
+    """
+
+    def __init__(self, history_length=100):
+
+        # finished exposure records, newest last
+        self.history = collections.deque(maxlen=history_length)
+
+        # record of exposure in progress or None
+        self.current = None
+        # monotonic start time of current record
+        self.t0 = 0.0
+        # monotonic start times of phases in progress
+        self.open_phases = {}
+
+        # number of exposures recorded
+        self.count = 0
+
+        # phases may be recorded from header and data threads
+        self.lock = threading.Lock()
+
+        return
+
+    def start(self, label=""):
+        """
+        Start a new exposure record, finishing any record in progress.
+        """
+
+        self.finish()
+
+        with self.lock:
+            self.count += 1
+            self.t0 = time.monotonic()
+            self.open_phases = {}
+            self.current = {
+                "number": self.count,
+                "label": label,
+                "start": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "total": 0.0,
+                "phases": {},
+            }
+
+        return
+
+    def finish(self):
+        """
+        Finish the current exposure record and add it to history.
+        """
+
+        with self.lock:
+            if self.current is None:
+                return
+            self.current["total"] = time.monotonic() - self.t0
+            self.history.append(self.current)
+            self.current = None
+            self.open_phases = {}
+
+        return
+
+    def begin_phase(self, name):
+        """
+        Mark the start of a phase.
+        """
+
+        with self.lock:
+            if self.current is not None:
+                self.open_phases[name] = time.monotonic()
+
+        return
+
+    def end_phase(self, name):
+        """
+        Mark the end of a phase started with begin_phase().
+        """
+
+        with self.lock:
+            if self.current is None:
+                return
+            start = self.open_phases.pop(name, None)
+            if start is None:
+                return
+            self._add(name, start - self.t0, time.monotonic() - start)
+
+        return
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Context manager which records a phase.
+        """
+
+        self.begin_phase(name)
+        try:
+            yield
+        finally:
+            self.end_phase(name)
+
+    def add_phase(self, name, duration, start=None):
+        """
+        Add a phase measured elsewhere.
+        start is monotonic start time, default is duration before now.
+        """
+
+        with self.lock:
+            if self.current is None:
+                return
+            if start is None:
+                start = time.monotonic() - duration
+            self._add(name, start - self.t0, duration)
+
+        return
+
+    def get_current(self):
+        """
+        Return a copy of the record of the exposure in progress or None.
+        """
+
+        with self.lock:
+            if self.current is None:
+                return None
+            record = self._copy(self.current)
+            record["total"] = time.monotonic() - self.t0
+
+        return record
+
+    def get_history(self, count=1):
+        """
+        Return copies of the last count finished records, newest last, -1 for all.
+        """
+
+        with self.lock:
+            records = list(self.history)
+
+        if count >= 0:
+            records = records[-count:] if count > 0 else []
+
+        return [self._copy(r) for r in records]
+
+    def get_summary(self):
+        """
+        Return mean and max duration of each phase over history.
+        """
+
+        with self.lock:
+            records = list(self.history)
+
+        summary = {}
+        for record in records:
+            for name, phase in record["phases"].items():
+                entry = summary.setdefault(name, {"count": 0, "mean": 0.0, "max": 0.0})
+                entry["count"] += 1
+                entry["mean"] += phase["duration"]
+                entry["max"] = max(entry["max"], phase["duration"])
+        for entry in summary.values():
+            entry["mean"] /= entry["count"]
+
+        totals = [r["total"] for r in records]
+        if len(totals) > 0:
+            summary["total"] = {
+                "count": len(totals),
+                "mean": sum(totals) / len(totals),
+                "max": max(totals),
+            }
+
+        return summary
+
+    def get_keywords(self):
+        """
+        Return [keyword, value, comment] for each finished phase of the current record.
+        """
+
+        record = self.get_current()
+        if record is None:
+            return []
+
+        keywords = []
+        for name, phase in record["phases"].items():
+            keyword = PHASE_KEYWORDS.get(name)
+            if keyword is None:
+                continue
+            keywords.append([keyword, round(phase["duration"], 4), f"{name} time (seconds)"])
+
+        return keywords
+
+    def _add(self, name, start, duration):
+        """
+        Add phase time to current record, lock must be held.
+        Repeated phases accumulate duration.
+        """
+
+        phases = self.current["phases"]
+        if name in phases:
+            phases[name]["duration"] += duration
+        else:
+            phases[name] = {"start": start, "duration": duration}
+
+        return
+
+    def _copy(self, record):
+        """
+        Copy a record so callers can not change history.
+        """
+
+        record = dict(record)
+        record["phases"] = {k: dict(v) for k, v in record["phases"].items()}
+
+        return record
@@ -0,0 +1,179 @@
+"""
+Contains the ExposureTimer class.
+"""
+
+import threading
+import time
+
+
+class ExposureTimer(object):
+    """
+    Defines the ExposureTimer class.
+    Integration timer based on a monotonic clock deadline.
+    Used by the exposure tool.
+    """
+
+    def __init__(self):
+
+        # True while an integration is being timed
+        self.running = 0
+        # True while timer is paused
+        self.paused = 0
+
+        # integration time in seconds
+        self.duration = 0.0
+        # monotonic time at which integration ends
+        self.deadline = 0.0
+        # remaining time while paused or after stop
+        self.remaining_frozen = 0.0
+
+        # incremented by wake() so waiters return
+        self.generation = 0
+
+        self.condition = threading.Condition()
+
+        return
+
+    def start(self, duration):
+        """
+        Start timing an integration of duration seconds.
+        """
+
+        with self.condition:
+            self.duration = max(0.0, float(duration))
+            self.deadline = time.monotonic() + self.duration
+            self.remaining_frozen = self.duration
+            self.running = 1
+            self.paused = 0
+            self.condition.notify_all()
+
+        return
+
+    def stop(self):
+        """
+        Stop timing, remaining time is kept for elapsed().
+        """
+
+        with self.condition:
+            if self.running:
+                self.remaining_frozen = self._remaining()
+            self.running = 0
+            self.paused = 0
+            self.condition.notify_all()
+
+        return
+
+    def pause(self):
+        """
+        Pause timer.
+        """
+
+        with self.condition:
+            if self.running and not self.paused:
+                self.remaining_frozen = self._remaining()
+                self.paused = 1
+                self.condition.notify_all()
+
+        return
+
+    def resume(self):
+        """
+        Resume a paused timer.
+        """
+
+        with self.condition:
+            if self.running and self.paused:
+                self.deadline = time.monotonic() + self.remaining_frozen
+                self.paused = 0
+                self.condition.notify_all()
+
+        return
+
+    def sync(self, remaining):
+        """
+        Set remaining time, such as from a controller which times the integration.
+        """
+
+        with self.condition:
+            if self.running:
+                if self.paused:
+                    self.remaining_frozen = max(0.0, float(remaining))
+                else:
+                    self.deadline = time.monotonic() + max(0.0, float(remaining))
+                self.condition.notify_all()
+
+        return
+
+    def remaining(self):
+        """
+        Return remaining integration time in seconds, 0 if not running.
+        """
+
+        with self.condition:
+            if not self.running:
+                return 0.0
+            return self._remaining()
+
+    def elapsed(self):
+        """
+        Return integrated time in seconds, not including paused time.
+        """
+
+        with self.condition:
+            if self.running:
+                return self.duration - self._remaining()
+            return self.duration - self.remaining_frozen
+
+    def wake(self):
+        """
+        Wake all waiters, used when the exposure flag is changed.
+        """
+
+        with self.condition:
+            self.generation += 1
+            self.condition.notify_all()
+
+        return
+
+    def wait(self, timeout=None, generation=None):
+        """
+        Wait until the deadline, timeout seconds, or a wake().
+        generation is the value of self.generation read before checking exposure state,
+        so a wake() between that check and this wait is not lost.
+        Returns remaining time.
+        """
+
+        with self.condition:
+            if generation is None:
+                generation = self.generation
+            end = None if timeout is None else time.monotonic() + timeout
+
+            # only a deadline still ahead ends the wait
+            use_deadline = self.running and not self.paused and self._remaining() > 0
+
+            while self.generation == generation:
+                wait_time = None
+                if use_deadline and self.running and not self.paused:
+                    wait_time = self._remaining()
+                    if wait_time <= 0:
+                        break
+                if end is not None:
+                    left = end - time.monotonic()
+                    if left <= 0:
+                        break
+                    wait_time = left if wait_time is None else min(wait_time, left)
+                self.condition.wait(wait_time)
+
+            if not self.running:
+                return 0.0
+            return self._remaining()
+
+    def _remaining(self):
+        """
+        Remaining time, condition must be held.
+        """
+
+        if self.paused:
+            return self.remaining_frozen
+
+        return max(0.0, self.deadline - time.monotonic())
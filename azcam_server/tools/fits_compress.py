@@ -0,0 +1,368 @@
+"""
+Contains the CompressedFitsWriter class.
+Writes tile compressed MEF files in worker processes.
+"""
+
+import concurrent.futures
+import multiprocessing
+import os
+import threading
+from multiprocessing import shared_memory
+
+import numpy
+from astropy.io import fits as pyfits
+
+import azcam
+
+# header keywords set by astropy from the data
+STRUCTURAL_KEYWORDS = [
+    "SIMPLE",
+    "XTENSION",
+    "BITPIX",
+    "NAXIS",
+    "NAXIS1",
+    "NAXIS2",
+    "PCOUNT",
+    "GCOUNT",
+    "EXTEND",
+    "BZERO",
+    "BSCALE",
+]
+
+# NONE writes uncompressed image extensions
+COMPRESSION_TYPES = ["NONE", "RICE_1", "GZIP_1", "GZIP_2", "HCOMPRESS_1", "PLIO_1"]
+
+
+def attach_shared_memory(name):
+    """
+    Attach to a shared memory block created by the server process.
+    """
+
+    # shared memory is owned and unlinked by the server process
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def _write_compressed_file(
+    filename, shm_name, shape, dtype, primary_header, ext_headers, ext_names, compression_type
+):
+    """
+    Worker process function which writes a tile compressed MEF file from shared memory.
+    shape is [numamps, numrows_amp, numcols_amp].
+    Headers are header strings.
+    """
+
+    shm = attach_shared_memory(shm_name)
+    try:
+        pyfits.EXTENSION_NAME_CASE_SENSITIVE = True
+        data = numpy.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+        phdu = pyfits.PrimaryHDU(header=pyfits.Header.fromstring(primary_header))
+        hdulist = pyfits.HDUList([phdu])
+
+        for ext in range(shape[0]):
+            header = pyfits.Header.fromstring(ext_headers[ext])
+            if compression_type == "NONE":
+                hdulist.append(pyfits.ImageHDU(data=data[ext], header=header, name=ext_names[ext]))
+                continue
+            kwargs = {
+                "data": data[ext],
+                "header": header,
+                "name": ext_names[ext],
+                "compression_type": compression_type,
+            }
+            try:
+                hdu = pyfits.CompImageHDU(tile_shape=(1, shape[2]), **kwargs)
+            except TypeError:
+                hdu = pyfits.CompImageHDU(tile_size=(shape[2], 1), **kwargs)
+            hdulist.append(hdu)
+
+        hdulist.writeto(filename, overwrite=True)
+        hdulist.close()
+
+        # release views before closing shared memory
+        del hdulist, phdu, data
+    finally:
+        shm.close()
+
+    return os.path.getsize(filename)
+
+
+class CompressedFitsWriter(object):
+    """
+    Writes tile compressed or uncompressed MEF image files.
+    Image data are copied once into shared memory and compressed and written by
+    a process pool, so compression does not hold the server GIL.
+    """
+
+    def __init__(self, workers=1):
+
+        # number of worker processes
+        self.workers = workers
+
+        self.pool = None
+        self.shm = None
+
+        # one write at a time uses the shared memory block
+        self.lock = threading.Lock()
+
+        # maximum time (sec) for a worker to finish, the pool is restarted after a timeout
+        self.timeout = 120.0
+
+        # bytes of last file written
+        self.filesize = 0
+
+    def write(self, image, filename, compression_type="RICE_1"):
+        """
+        Write image as a tile compressed MEF file, or uncompressed for NONE.
+        Returns after the file is written.
+        """
+
+        compression_type = compression_type.upper()
+        if compression_type not in COMPRESSION_TYPES:
+            raise azcam.AzcamError(f"Invalid compression type {compression_type}")
+
+        filename = azcam.utils.make_image_filename(filename)
+        image.filename = filename
+
+        if os.path.exists(filename):
+            if image.overwrite or image.test_image:
+                os.remove(filename)
+            else:
+                raise azcam.AzcamError(f"{filename} exists but overwrite flag is not set")
+
+        focalplane = image.focalplane
+        numamps = focalplane.numamps_image
+        shape = (numamps, focalplane.numrows_amp, focalplane.numcols_amp)
+        dtype = numpy.dtype(image.data_types[image.save_data_format])
+
+        primary_header, ext_headers, ext_names = self._make_headers(image, shape)
+
+        # data already in shared memory is written without a copy
+        data = image.data
+        shared = self.is_shared(data)
+        if shared and data.dtype != dtype:
+            data = data.astype(dtype)
+            shared = False
+
+        self.write_data(
+            filename,
+            data,
+            shape,
+            dtype,
+            primary_header,
+            ext_headers,
+            ext_names,
+            compression_type,
+            not shared,
+        )
+
+        # optionally make a lock file indicating the image file has been written
+        if image.make_lockfile:
+            lockfile = filename.replace(".bin", ".OK")
+            with open(lockfile, "w"):
+                pass
+
+        return
+
+    def write_data(
+        self,
+        filename,
+        data,
+        shape,
+        dtype,
+        primary_header,
+        ext_headers,
+        ext_names,
+        compression_type="RICE_1",
+        copy=True,
+    ):
+        """
+        Write data as a tile compressed MEF file with header strings.
+        data is [numamps, pixels] and shape is [numamps, numrows_amp, numcols_amp].
+        copy False means data is already in the shared memory block.
+        Returns size of file in bytes.
+        """
+
+        dtype = numpy.dtype(dtype)
+
+        with self.lock:
+            if copy:
+                self._copy_to_shared_memory(data, shape, dtype)
+
+            future = self._get_pool().submit(
+                _write_compressed_file,
+                filename,
+                self.shm.name,
+                shape,
+                dtype.str,
+                primary_header,
+                ext_headers,
+                ext_names,
+                compression_type,
+            )
+            self.filesize = self._get_result(future, f"writing {filename}")
+
+        return self.filesize
+
+    def close(self):
+        """
+        Stop worker processes and free shared memory.
+        """
+
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown()
+                self.pool = None
+            if self.shm is not None:
+                self._free_shared_memory(self.shm)
+                self.shm = None
+
+        return
+
+    def is_shared(self, data):
+        """
+        Return True if data is a view of the shared memory block.
+        """
+
+        if self.shm is None or data is None:
+            return False
+
+        start = numpy.frombuffer(self.shm.buf, dtype="uint8", count=1).ctypes.data
+
+        return data.ctypes.data == start
+
+    def _get_pool(self):
+        """
+        Return the process pool, starting it if needed.
+        Workers are not forked from the server, which has threads and open sockets.
+        """
+
+        if self.pool is None:
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context("forkserver")
+            else:
+                context = multiprocessing.get_context("spawn")
+            self.pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=context
+            )
+
+        return self.pool
+
+    def _get_result(self, future, description):
+        """
+        Return the result of a worker future, waiting up to timeout seconds.
+        If the worker does not finish or the pool is broken the pool is stopped,
+        so the next call starts new workers.
+        Call with lock held.
+        """
+
+        try:
+            return future.result(self.timeout)
+        except concurrent.futures.TimeoutError:
+            self._reset_pool()
+            raise azcam.AzcamError(f"worker timeout {description}")
+        except concurrent.futures.BrokenExecutor:
+            self._reset_pool()
+            raise azcam.AzcamError(f"worker failed {description}")
+
+    def _reset_pool(self):
+        """
+        Stop the process pool and terminate its workers, which may be hung.
+        The shared memory block is replaced as a hung worker may still use it.
+        Call with lock held.
+        """
+
+        pool = self.pool
+        self.pool = None
+
+        if pool is not None:
+            processes = list((getattr(pool, "_processes", None) or {}).values())
+            pool.shutdown(wait=False, cancel_futures=True)
+            for process in processes:
+                process.terminate()
+
+        if self.shm is not None:
+            self._free_shared_memory(self.shm)
+            self.shm = None
+
+        return
+
+    def _copy_to_shared_memory(self, data, shape, dtype):
+        """
+        Copy image data into the shared memory block, reallocating it if too small.
+        """
+
+        self.shm = self._allocate_shared_memory(self.shm, int(numpy.prod(shape)) * dtype.itemsize)
+
+        shared = numpy.ndarray(shape, dtype=dtype, buffer=self.shm.buf)
+        shared[:] = data[:, : shape[1] * shape[2]].reshape(shape)
+        del shared
+
+        return
+
+    def _allocate_shared_memory(self, shm, nbytes):
+        """
+        Return shm if it holds nbytes, otherwise free it and create a larger block.
+        """
+
+        if shm is not None and shm.size < nbytes:
+            self._free_shared_memory(shm)
+            shm = None
+        if shm is None:
+            shm = shared_memory.SharedMemory(create=True, size=nbytes)
+
+        return shm
+
+    def _free_shared_memory(self, shm):
+        """
+        Close and unlink a shared memory block.
+        """
+
+        try:
+            shm.close()
+        except BufferError:
+            # an array still uses the block, which is freed when released
+            pass
+        shm.unlink()
+
+        return
+
+    def _make_headers(self, image, shape):
+        """
+        Make primary and extension header strings using the image header methods.
+        """
+
+        pyfits.EXTENSION_NAME_CASE_SENSITIVE = True
+
+        phdu = pyfits.PrimaryHDU()
+        image._write_PHU(phdu)
+        primary_header = self._strip(phdu.header).tostring()
+
+        ext_headers = []
+        ext_names = []
+        for ext_number in range(1, shape[0] + 1):
+            ext_name = str(image.focalplane.ext_name[ext_number - 1])
+            hdu = pyfits.ImageHDU(name=ext_name)
+            hdu.header.set("INHERIT", True, "extension inherits PHDU keyword/values?")
+            hdu.header.set("BUNIT", "ADU", "Physical unit of array values")
+            image._write_extension_header(ext_number, hdu)
+            image._write_wcs_keywords(ext_number, hdu)
+            image._write_focalplane_keywords(ext_number, hdu)
+            ext_headers.append(self._strip(hdu.header).tostring())
+            ext_names.append(ext_name)
+
+        return primary_header, ext_headers, ext_names
+
+    def _strip(self, header):
+        """
+        Return a copy of a header without structural keywords.
+        """
+
+        header = header.copy()
+        for keyword in STRUCTURAL_KEYWORDS:
+            header.remove(keyword, ignore_missing=True, remove_all=True)
+
+        return header
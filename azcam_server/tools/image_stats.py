@@ -0,0 +1,80 @@
+"""
+Quick-look statistics of each amplifier of an image.
+"""
+
+import numpy
+
+
+def flip_section(start, stop, size, flip):
+    """
+    Return [start, stop) of a readout section in data which may be flipped.
+    """
+
+    if flip:
+        return size - stop, size - start
+
+    return start, stop
+
+
+def get_amp_stats(data, focalplane, flips=None, saturation=65535, sample=16):
+    """
+    Return a list of statistics dictionaries, one for each amplifier of image data.
+    data is [amplifier, pixels] in focalplane amplifier format.
+    flips is a list of amplifier configurations (0 none, 1 x, 2 y, 3 xy) when data
+    has been flipped from readout order, otherwise None.
+    Image median uses every sample pixel of the imaging section.
+    """
+
+    numamps = data.shape[0]
+    numrows = focalplane.numrows_amp
+    numcols = focalplane.numcols_amp
+
+    # all amplifiers as [amplifier, row, column]
+    cube = data[:, : numrows * numcols].reshape(numamps, numrows, numcols)
+
+    # full frame values for all amplifiers at once
+    mins = cube.min(axis=(1, 2))
+    maxs = cube.max(axis=(1, 2))
+    saturated = numpy.count_nonzero(cube >= saturation, axis=(1, 2))
+
+    x1 = focalplane.xunderscan
+    x2 = x1 + focalplane.xdata
+    y1 = focalplane.yunderscan
+    y2 = y1 + focalplane.ydata
+
+    stats = []
+    for amp in range(numamps):
+        flip = 0 if flips is None else int(flips[amp])
+        c1, c2 = flip_section(x1, x2, numcols, flip in [1, 3])
+        r1, r2 = flip_section(y1, y2, numrows, flip in [2, 3])
+        o1, o2 = flip_section(x2, numcols, numcols, flip in [1, 3])
+
+        image = cube[amp, r1:r2, c1:c2]
+        overscan = cube[amp, r1:r2, o1:o2].astype("float32")
+
+        if image.size > 0:
+            image_median = float(numpy.median(image.reshape(-1)[:: max(1, sample)]))
+        else:
+            image_median = 0.0
+
+        if overscan.size > 0:
+            overscan_mean = float(overscan.mean())
+            overscan_median = float(numpy.median(overscan))
+            overscan_rms = float(overscan.std())
+        else:
+            overscan_mean = overscan_median = overscan_rms = 0.0
+
+        stats.append(
+            {
+                "amp": amp + 1,
+                "overscan_mean": overscan_mean,
+                "overscan_median": overscan_median,
+                "overscan_rms": overscan_rms,
+                "image_median": image_median,
+                "saturated": int(saturated[amp]),
+                "min": int(mins[amp]),
+                "max": int(maxs[amp]),
+            }
+        )
+
+    return stats
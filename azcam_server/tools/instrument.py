@@ -41,6 +41,9 @@ class Instrument(Tools, ObjectHeaderMethods):
         self.header = Header("Instrument")
         self.header.set_header("instrument", 3)
 
+        # keywords which do not change between exposures
+        self.static_keywords = ["INSTRUME"]
+
         return
 
     # ***************************************************************************
@@ -21,8 +21,23 @@ class ExposureMag(Exposure):
 
         self.receive_data = ReceiveData(self)
         self.exp_start = 0
+        # fixed readout wait (sec) used when use_pixel_count is False
         self.curr_delay = 0
 
+        # True to wait for readout on the controller server pixel counter
+        self.use_pixel_count = 1
+        # measured readout rate (pixels/sec), 0 until first readout
+        self.readout_rate = 0.0
+        # weight of newest measurement in readout rate average
+        self.readout_rate_weight = 0.3
+        # minimum time (sec) between pixel counter polls
+        self.readout_poll_time = 0.02
+        # minimum counting time (sec) for a readout rate measurement
+        self.readout_rate_min_time = 0.1
+        # readout timeout is this factor times predicted readout time, or readout_timeout_min
+        self.readout_timeout_factor = 3.0
+        self.readout_timeout_min = 10.0
+
     def integrate(self):
         """
         Integration.
@@ -48,23 +63,19 @@ class ExposureMag(Exposure):
         self.exp_start = time.time()
         azcam.db.tools["controller"].start_exposure()
         self.dark_time_start = time.time()
+        self.integration_timer.start(self.exposure_time)
 
         # Mag controller pause/resume not supported but abort is
-        if self.exposure_time >= 1.0:
-            while self.exposure_time_remaining > 0.15:
-                if self.exposure_flag == self.exposureflags["ABORT"]:
-                    if self.is_exposure_sequence:
-                        azcam.log("Stopping exposure sequence")
-                        self.is_exposure_sequence = 0
-                        self.exposure_sequence_number = 1
-                        self.exposure_flag = self.exposureflags["EXPOSING"]
-                    else:
-                        azcam.db.tools["controller"].exposure_abort()
-                    break
-                time.sleep(0.1)
-                self.exposure_time_remaining = self.exposure_time_remaining - 0.1
-        else:
-            time.sleep(self.exposure_time)
+        self.wait_integration()
+        if self.exposure_flag == self.exposureflags["ABORT"]:
+            if self.is_exposure_sequence:
+                azcam.log("Stopping exposure sequence")
+                self.is_exposure_sequence = 0
+                self.exposure_sequence_number = 1
+                self.exposure_flag = self.exposureflags["EXPOSING"]
+            else:
+                azcam.db.tools["controller"].exposure_abort()
+        self.integration_timer.stop()
 
         azcam.db.tools["controller"].set_shutter(0)  # until shutter issue is solved
 
@@ -92,6 +103,9 @@ class ExposureMag(Exposure):
         Return remaining exposure time (in seconds).
         """
 
+        if self.integration_timer.running:
+            self.exposure_time_remaining = self.integration_timer.remaining()
+
         return self.exposure_time_remaining
 
     def readout(self):
@@ -110,12 +124,14 @@ class ExposureMag(Exposure):
         azcam.log("Readout started")
 
         reply = azcam.db.tools["controller"].start_readout()
+        if self.exposure_flag != self.exposureflags["ABORT"]:
+            self.exposure_flag = self.exposureflags["READOUT"]
 
         # Wait for end of readout
-        t_wait = (self.image.focalplane.numpix_image * 2) / 1000000 + 0.1
-
-        t_wait = self.curr_delay
-        time.sleep(t_wait)
+        if self.use_pixel_count:
+            self.wait_readout(self.image.focalplane.numpix_image)
+        else:
+            time.sleep(self.curr_delay)
 
         self.pixels_remaining = 0
         if self.exposure_flag != self.exposureflags["ABORT"]:
@@ -127,7 +143,11 @@ class ExposureMag(Exposure):
         except azcam.AzcamError:
             self.exposure_flag = self.exposureflags["ABORT"]
 
-        self.image.valid = 1  # new
+        self.set_image_valid()
+
+        if self.exposure_flag != self.exposureflags["ABORT"]:
+            self.update_image_stats()
+            self.update_quicklook()
 
         if imagetype == "ramp":
             azcam.db.tools["controller"].set_shutter(0)
@@ -140,6 +160,107 @@ class ExposureMag(Exposure):
             self.exposure_flag = self.exposureflags["NONE"]
             return
 
+    def wait_readout(self, numpix):
+        """
+        Wait until the controller server pixel counter shows readout is complete.
+        Polls less often while the readout rate model predicts many pixels remain.
+        The first counts after start_readout may be left from the previous frame, so
+        the readout rate is measured only after the count is seen to decrease from a
+        new baseline.
+        numpix is number of pixels in the image.
+        """
+
+        controller = azcam.db.tools["controller"]
+
+        start = time.monotonic()
+        if self.readout_rate > 0:
+            predicted = numpix / self.readout_rate
+        else:
+            predicted = 0.0
+        timeout = max(self.readout_timeout_min, predicted * self.readout_timeout_factor)
+
+        # a zero count before counting is seen may be stale, accept it after this time
+        stale_time = predicted if predicted > 0 else self.readout_rate_min_time
+
+        # pixels remaining and time of first count of this readout
+        baseline = None
+        baseline_time = start
+        counting = False
+
+        self.pixels_remaining = numpix
+        while True:
+            if self.exposure_flag == self.exposureflags["ABORT"]:
+                return
+
+            try:
+                remaining = controller.get_pixels_remaining()
+            except (azcam.AzcamError, ValueError, IndexError):
+                azcam.log("Pixel count not available, using readout delay")
+                time.sleep(self.curr_delay)
+                return
+
+            now = time.monotonic()
+            elapsed = now - start
+
+            # a count which does not decrease is a new baseline
+            if not counting:
+                if baseline is not None and remaining < baseline:
+                    counting = True
+                else:
+                    baseline = remaining
+                    baseline_time = now
+
+            self.pixels_remaining = remaining
+
+            if remaining <= 0 and (counting or elapsed >= stale_time):
+                break
+            if elapsed > timeout:
+                azcam.log("ERROR readout did not complete in time")
+                return
+
+            azcam.log(f"Readout: {remaining:10d} pixels remaining", level=3)
+
+            # time to completion from measured rate or from progress so far
+            done = baseline - remaining
+            if self.readout_rate > 0:
+                eta = max(remaining / self.readout_rate, predicted - elapsed)
+            elif done > 0:
+                eta = remaining * (now - baseline_time) / done
+            else:
+                eta = 0.0
+            time.sleep(min(max(eta / 2.0, self.readout_poll_time), 0.5))
+
+        # update readout rate model from pixels counted after the baseline
+        counted = now - baseline_time
+        if counting and counted >= self.readout_rate_min_time:
+            rate = baseline / counted
+            if self.readout_rate > 0:
+                w = self.readout_rate_weight
+                self.readout_rate = w * rate + (1.0 - w) * self.readout_rate
+            else:
+                self.readout_rate = rate
+        azcam.log(f"Readout of {numpix} pixels took {elapsed:.3f} sec", level=3)
+
+        return
+
+    def get_pixels_remaining(self):
+        """
+        Return number of remaining pixels to be read (counts down).
+        During readout returns the value last read by wait_readout().
+        """
+
+        if self.exposure_flag == self.exposureflags["READOUT"]:
+            return self.pixels_remaining
+
+        return super().get_pixels_remaining()
+
+    def get_readout_rate(self):
+        """
+        Return measured readout rate in pixels per second (0 if not yet measured).
+        """
+
+        return self.readout_rate
+
     def end(self):
         """
         Completes an exposure by writing file and displaying image.
@@ -157,18 +278,18 @@ class ExposureMag(Exposure):
             local_file = self.get_filename()
 
         # wait for image data to be received
-        loop = 0
-        while not self.image.valid and loop < 100:
-            loop += 1
-            time.sleep(0.050)
-            if loop >= 100:
-                azcam.log("ERROR image data not received in time")
+        if not self.wait_image_valid(5.0):
+            azcam.log("ERROR image data not received in time")
+
+        # wait for headers to be updated
+        self.wait_headers()
 
         # update controller header with keywords which might have changed
         et = float(int(self.exposure_time_actual * 1000.0) / 1000.0)
         dt = float(int(self.dark_time * 1000.0) / 1000.0)
         azcam.db.headers["exposure"].set_keyword("EXPTIME", et, "Exposure time (seconds)", "float")
         azcam.db.headers["exposure"].set_keyword("DARKTIME", dt, "Dark time (seconds)", "float")
+        self.write_timeline_keywords()
 
         # write file(s) to disk
         if self.save_file:
@@ -177,7 +298,8 @@ class ExposureMag(Exposure):
             # write the file to disk
             self.image.overwrite = self.overwrite
             self.image.test_image = self.test_image
-            reply = self.image.write_file(local_file, self.filetype)
+            with self.timeline.phase("write"):
+                self.write_image_file(local_file)
             azcam.log("Writing finished", level=2)
 
             # set flag that image now written to disk
@@ -185,7 +307,8 @@ class ExposureMag(Exposure):
 
             if self.send_image:
                 azcam.log("Sending image")
-                azcam.db.tools["sendimage"].send_image(local_file, self.get_filename())
+                with self.timeline.phase("sendimage"):
+                    azcam.db.tools["sendimage"].send_image(local_file, self.get_filename())
 
         # image data and file are now ready
         self.image.toggle = 1
@@ -194,7 +317,7 @@ class ExposureMag(Exposure):
         if self.display_image:
             try:
                 azcam.log("Displaying image")
-                azcam.db.tools["display"].display(self.image)
+                self.display_file(self.image)
             except Exception:
                 pass
 
@@ -46,6 +46,8 @@ class ReceiveData(object):
             self.mock_data()
             return
 
+        self.exposure.timeline.begin_phase("transfer")
+
         # create a new socket for binary data and connect to the controller server
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 
@@ -62,6 +64,20 @@ class ReceiveData(object):
         self.numamps_image = self.exposure.image.focalplane.numamps_image
         self.numpix_amp = self.exposure.image.focalplane.numpix_amp
 
+        # temporary image buffer from pool
+        BufferTemp = self.exposure.buffer_pool.get(self.exposure.image.data.size, "<u2")
+        try:
+            self._receive_data(dataSize, BufferTemp)
+        finally:
+            self.exposure.buffer_pool.release(BufferTemp)
+
+        return
+
+    def _receive_data(self, dataSize, BufferTemp):
+        """
+        Receive data into BufferTemp and deinterlace into exposure.image.data.
+        """
+
         reqCnt = min(
             dataSize - 17, self.RecBufferSize - 17
         )  # 17 bytes for the data frame size (%16d + space)
@@ -72,9 +88,6 @@ class ReceiveData(object):
         self.PixelsReadout = 0
         self.pixels_remaining = totalpixels
 
-        # create temporary image buffer
-        BufferTemp = numpy.empty(shape=(self.exposure.image.data.size), dtype="<u2")
-
         # set image data pointer
         ptrData = 0
 
@@ -144,7 +157,10 @@ class ReceiveData(object):
                 raise azcam.AzcamError("Aborted in receive_image_data", error_code=3)
         self.socket.close()
 
+        self.exposure.timeline.end_phase("transfer")
+
         # deinterlace into exposure.image.data
+        self.exposure.timeline.begin_phase("deinterlace")
         BufferTemp = BufferTemp.reshape(self.numpix_amp, self.numamps_image)
 
         if len(self.exposure.data_order) == 0:
@@ -160,6 +176,8 @@ class ReceiveData(object):
                 ]
                 indx += 1
 
+        self.exposure.timeline.end_phase("deinterlace")
+
         return
 
     def request_data(self, datacnt):
@@ -4,7 +4,10 @@ Allows sending UDP register request to the Azcam Monitor application
 Allows sending and receiving broadcast ID request
 """
 
+import ipaddress
+import select
 import socket
+import threading
 import time
 
 import azcam
@@ -26,117 +29,204 @@ class UDPinterface(object):
         self.resp = []
         self.wait = 1  # seconds
 
-    def get_ip(self, hostName):
+        # port for ID requests and port on which IDs are received
+        self.id_port = 2400
+        self.reply_port = 2401
+
+        # seconds a resolved IP address is used before discovery is repeated
+        self.cache_ttl = 60.0
+        # resolved hosts, hostname => [ip_address, monotonic time resolved]
+        self.hosts = {}
+
+        # only one discovery at a time may bind the reply port
+        self.lock = threading.Lock()
+
+        self.refresh_thread = None
+        self.refresh_stop = threading.Event()
+
+    def get_ip(self, hostName, use_cache=True):
         """
         Sends UDP Get ID request (port 2400) and looks for a hostName,
         then returns IP address if found.
+        A cached IP address is returned without discovery if younger than cache_ttl.
         """
 
+        if use_cache:
+            ip_address = self.get_cached_ip(hostName)
+            if ip_address is not None:
+                return ip_address
+
         azcam.log("Resolving " + hostName + " IP Address")
 
-        # create a ne wsocket for receiving IDs
-        udp_socket_data = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        udp_socket_data.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        udp_socket_data.setblocking(0)
-        udp_socket_data.bind(("", 2401))
+        self.discover(hostName, use_cache)
 
-        # ID request
-        cmd = "0\r\n"
+        ip_address = self.get_cached_ip(hostName, -1)
+        if ip_address is None:
+            if len(self.resp) == 0:
+                azcam.log("ERROR No IDs available")
+            ip_address = "0.0.0.0"
 
-        # create a new socket for sending register command
-        udp_socket_ctrl = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        udp_socket_ctrl.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        udp_socket_ctrl.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        return ip_address
 
-        # send ID request
-        udp_socket_ctrl.sendto(bytes(cmd, "utf-8"), ("255.255.255.255", 2400))
+    def get_ids(self):
+        """
+        Sends UDP Get ID request (port 2400).
+        """
 
-        # close socket
-        udp_socket_ctrl.close()
+        return self.discover()
 
-        # wait self.wait time for the responses
-        start = time.time()
-        loop_ok = True
+    def get_cached_ip(self, hostName, ttl=None):
+        """
+        Return the cached IP address of a host or None if not cached or expired.
+        ttl is the maximum age in seconds, default cache_ttl, -1 for any age.
+        """
 
-        while loop_ok:
+        ttl = self.cache_ttl if ttl is None else ttl
 
-            stop = time.time()
-            if stop - start > self.wait:
-                loop_ok = False
+        entry = self.hosts.get(hostName)
+        if entry is None:
+            return None
+        if ttl >= 0 and time.monotonic() - entry[1] > ttl:
+            return None
+
+        return entry[0]
+
+    def discover(self, hostName=None, use_cache=True):
+        """
+        Broadcast an ID request and collect responses for up to wait seconds.
+        If hostName is given, returns as soon as that host responds.
+        Updates the host cache and returns the list of responses.
+        """
+
+        with self.lock:
+            # another discovery may have resolved host while waiting for lock
+            if hostName is not None and use_cache:
+                if self.get_cached_ip(hostName) is not None:
+                    return self.resp
+
+            resp = []
+
+            # create a new socket for receiving IDs
+            udp_socket_data = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            udp_socket_data.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            udp_socket_data.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            udp_socket_data.setblocking(0)
 
             try:
-                recv = udp_socket_data.recvfrom(1024)
-
-                # store the whole response
-                self.resp.append(recv)
-            except Exception:
-                pass
-
-        # close socket
-        udp_socket_data.close()
-
-        # check IDs
-        cnt = len(self.resp)
-        ip_address = "0.0.0.0"
-
-        if cnt > 0:
-            for indx in self.resp:
-                recv = str(indx).split(" ")
-                try:
-                    if recv[2] == hostName:
-                        ip_address = recv[4]
-                except Exception:
-                    pass
-        else:
-            azcam.log("ERROR No IDs available")
+                udp_socket_data.bind(("", self.reply_port))
 
-        return ip_address
+                # ID request
+                cmd = "0\r\n"
 
-    def get_ids(self):
+                # create a new socket for sending register command
+                udp_socket_ctrl = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                udp_socket_ctrl.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+                udp_socket_ctrl.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+                # send ID request
+                udp_socket_ctrl.sendto(bytes(cmd, "utf-8"), ("255.255.255.255", self.id_port))
+
+                # close socket
+                udp_socket_ctrl.close()
+
+                # wait up to self.wait time for the responses
+                deadline = time.monotonic() + self.wait
+                found = False
+
+                while not found:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+
+                    readable, _, _ = select.select([udp_socket_data], [], [], remaining)
+                    if not readable:
+                        break
+
+                    try:
+                        recv = udp_socket_data.recvfrom(1024)
+                    except OSError:
+                        continue
+
+                    # store the whole response
+                    reply = recv[0].decode(errors="replace")
+                    resp.append((reply, recv[1]))
+
+                    name = self._update_host(reply)
+                    if hostName is not None and name == hostName:
+                        found = True
+
+            finally:
+                # close socket
+                udp_socket_data.close()
+
+            self.resp = resp
+
+        return self.resp
+
+    def _update_host(self, reply):
         """
-        Sends UDP Get ID request (port 2400).
+        Record the IP address of an ID response in the host cache.
+        Returns the host name of the response or None if not valid.
         """
 
-        self.resp = []
+        tokens = reply.split(" ")
+        try:
+            name = tokens[2].strip()
+            ip_address = tokens[4].strip()
+        except IndexError:
+            return None
+
+        # reply ends with a line terminator and may be corrupted
+        try:
+            ip_address = str(ipaddress.ip_address(ip_address))
+        except ValueError:
+            azcam.log(f"Invalid IP address in ID response: {reply.strip()}", level=2)
+            return None
 
-        # create a new socket for receiving IDs
-        udp_socket_data = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        udp_socket_data.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        udp_socket_data.setblocking(0)
-        udp_socket_data.bind(("", 2401))
+        self.hosts[name] = [ip_address, time.monotonic()]
 
-        # ID request
-        cmd = "0\r\n"
+        return name
 
-        # create a new socket for sending register command
-        udp_socket_ctrl = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        udp_socket_ctrl.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        udp_socket_ctrl.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    def start_refresh(self, period=30.0):
+        """
+        Start a background thread which repeats discovery every period seconds,
+        so get_ip() returns from the cache without waiting on broadcast discovery.
+        """
 
-        # send ID request
-        udp_socket_ctrl.sendto(bytes(cmd, "utf-8"), ("255.255.255.255", 2400))
+        if self.refresh_thread is not None and self.refresh_thread.is_alive():
+            return
 
-        # close socket
-        udp_socket_ctrl.close()
+        self.refresh_stop.clear()
+        self.refresh_thread = threading.Thread(
+            target=self._refresh, name="udp_discovery", args=[float(period)], daemon=True
+        )
+        self.refresh_thread.start()
 
-        # wait self.wait time for the responses
-        start = time.time()
-        loop_ok = True
+        return
 
-        while loop_ok:
+    def stop_refresh(self):
+        """
+        Stop the background discovery thread.
+        """
 
-            stop = time.time()
-            if stop - start > self.wait:
-                loop_ok = False
+        self.refresh_stop.set()
+        if self.refresh_thread is not None:
+            self.refresh_thread.join()
+            self.refresh_thread = None
 
+        return
+
+    def _refresh(self, period):
+        """
+        Background discovery loop.
+        """
+
+        while not self.refresh_stop.is_set():
             try:
-                recv = udp_socket_data.recvfrom(1024)
-                # store the whole response
-                self.resp.append((recv[0].decode(), recv[1]))
-            except Exception:
-                pass
+                self.discover()
+            except Exception as e:
+                azcam.log(f"ERROR UDP discovery: {e}")
 
-        # close socket
-        udp_socket_data.close()
+            self.refresh_stop.wait(period)
 
-        return self.resp
+        return
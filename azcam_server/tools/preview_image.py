@@ -0,0 +1,165 @@
+"""
+Downsampled and zscale stretched 8-bit preview images.
+"""
+
+import io
+import math
+import struct
+import zlib
+
+import numpy
+
+import azcam
+
+
+def block_reduce(data, factor):
+    """
+    Return the float32 mean of factor x factor pixel blocks of a 2D array.
+    Edge rows and columns which do not fill a block are dropped.
+    """
+
+    factor = max(1, int(factor))
+    rows = data.shape[0] // factor
+    cols = data.shape[1] // factor
+
+    blocks = data[: rows * factor, : cols * factor].reshape(rows, factor, cols, factor)
+
+    return blocks.mean(axis=(1, 3), dtype="float32")
+
+
+def zscale_limits(data, nsamples=1000, contrast=0.25, krej=2.5, max_iterations=5):
+    """
+    Return (z1, z2) display limits of data using the IRAF zscale algorithm.
+    A line is fit to the sorted sample values with iterative rejection,
+    and its slope divided by contrast sets the range about the median.
+    """
+
+    values = data.reshape(-1)
+    stride = max(1, values.size // nsamples)
+    samples = numpy.sort(values[::stride][:nsamples].astype("float32"))
+    samples = samples[numpy.isfinite(samples)]
+
+    npix = samples.size
+    if npix == 0:
+        return 0.0, 1.0
+
+    zmin = float(samples[0])
+    zmax = float(samples[-1])
+    center = (npix - 1) // 2
+    median = float(samples[center])
+
+    # need at least half the samples to accept the fit
+    minpix = max(5, npix // 2)
+    if npix < minpix:
+        return zmin, zmax
+
+    x = numpy.arange(npix, dtype="float32")
+    good = numpy.ones(npix, dtype=bool)
+    grow = numpy.ones(max(1, npix // 100), dtype="float32")
+    slope = 0.0
+
+    for _ in range(max_iterations):
+        ngood = int(good.sum())
+        if ngood < minpix:
+            break
+
+        slope, intercept = numpy.polyfit(x[good], samples[good], 1)
+        residuals = samples - (intercept + slope * x)
+        sigma = residuals[good].std()
+
+        # reject outliers and their neighbors
+        bad = numpy.abs(residuals) > krej * sigma
+        bad = numpy.convolve(bad, grow, mode="same") > 0
+        newgood = ~bad
+        if numpy.array_equal(newgood, good):
+            break
+        good = newgood
+
+    if good.sum() < minpix:
+        return zmin, zmax
+
+    if contrast > 0:
+        slope = slope / contrast
+
+    z1 = max(zmin, median - (center - 1) * slope)
+    z2 = min(zmax, median + (npix - center) * slope)
+
+    return float(z1), float(z2)
+
+
+def make_preview(data, size=512, contrast=0.25):
+    """
+    Make an 8-bit preview of a 2D image no larger than size pixels on a side.
+    Rows are reversed so the first image row is at the bottom.
+    Returns a uint8 array.
+    """
+
+    size = max(1, int(size))
+    factor = max(1, math.ceil(max(data.shape) / size))
+    reduced = block_reduce(data, factor)
+
+    z1, z2 = zscale_limits(reduced, contrast=contrast)
+
+    return scale_to_bytes(reduced[::-1], z1, z2)
+
+
+def scale_to_bytes(data, z1, z2):
+    """
+    Linearly scale data from z1 to z2 into a uint8 array.
+    """
+
+    if z2 <= z1:
+        z2 = z1 + 1.0
+
+    scaled = (data - numpy.float32(z1)) * numpy.float32(255.0 / (z2 - z1))
+    numpy.clip(scaled, 0, 255, out=scaled)
+
+    return scaled.astype("uint8")
+
+
+def encode_png(image):
+    """
+    Encode a 2D uint8 array as a grayscale PNG image.
+    Returns bytes.
+    """
+
+    height, width = image.shape
+
+    # each row starts with filter type 0
+    raw = numpy.zeros((height, width + 1), dtype="uint8")
+    raw[:, 1:] = image
+
+    def chunk(name, body):
+        return (
+            struct.pack(">I", len(body))
+            + name
+            + body
+            + struct.pack(">I", zlib.crc32(name + body) & 0xFFFFFFFF)
+        )
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(raw.tobytes(), 6))
+        + chunk(b"IEND", b"")
+    )
+
+
+def encode_jpeg(image, quality=85):
+    """
+    Encode a 2D uint8 array as a grayscale JPEG image.
+    Requires the Pillow package.
+    Returns bytes.
+    """
+
+    try:
+        from PIL import Image as PILImage
+    except ImportError:
+        raise azcam.AzcamError("JPEG previews require the Pillow package")
+
+    output = io.BytesIO()
+    PILImage.fromarray(image, mode="L").save(output, format="JPEG", quality=int(quality))
+
+    return output.getvalue()
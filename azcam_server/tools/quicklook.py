@@ -0,0 +1,88 @@
+"""
+Assembled, overscan corrected and trimmed quick-look image.
+"""
+
+import numpy
+
+from azcam_server.tools.image_stats import flip_section
+
+
+def get_quicklook_size(focalplane):
+    """
+    Return [rows, cols] of the trimmed quick-look mosaic.
+    """
+
+    return [
+        focalplane.numamps_y * focalplane.ydata,
+        focalplane.numamps_x * focalplane.xdata,
+    ]
+
+
+def assemble_quicklook(data, focalplane, amp_cfg, flipped=False, out=None, overscan="row"):
+    """
+    Assemble image data into a trimmed float32 mosaic with overscan subtracted.
+    data is [amplifier, pixels] in focalplane amplifier format.
+    amp_cfg is the configuration (0 none, 1 flip x, 2 flip y, 3 flip xy) of each amplifier.
+    flipped is True if data is already flipped by amp_cfg, otherwise data is in readout order.
+    out is an optional float32 output array of get_quicklook_size().
+    overscan is "row" to subtract the overscan mean of each row, "mean" for the amplifier
+    mean, or "none".
+    Amplifiers are placed by extpos_x and extpos_y, with (1,1) at bottom left.
+    Returns the mosaic.
+    """
+
+    numamps = data.shape[0]
+    numrows = focalplane.numrows_amp
+    numcols = focalplane.numcols_amp
+    xdata = focalplane.xdata
+    ydata = focalplane.ydata
+
+    cube = data[:, : numrows * numcols].reshape(numamps, numrows, numcols)
+
+    size = get_quicklook_size(focalplane)
+    if out is None:
+        out = numpy.empty(size, dtype="float32")
+
+    x1 = focalplane.xunderscan
+    x2 = x1 + xdata
+    y1 = focalplane.yunderscan
+    y2 = y1 + ydata
+
+    # amplifier positions in mosaic, by index if not defined for each amplifier
+    if len(focalplane.extpos_x) == numamps and len(focalplane.extpos_y) == numamps:
+        pos_x = [int(x) - 1 for x in focalplane.extpos_x]
+        pos_y = [int(y) - 1 for y in focalplane.extpos_y]
+    else:
+        pos_x = [i % focalplane.numamps_x for i in range(numamps)]
+        pos_y = [i // focalplane.numamps_x for i in range(numamps)]
+
+    for amp in range(numamps):
+        flip = int(amp_cfg[amp]) if amp < len(amp_cfg) else 0
+        flip_x = flip in [1, 3]
+        flip_y = flip in [2, 3]
+
+        c1, c2 = flip_section(x1, x2, numcols, flipped and flip_x)
+        r1, r2 = flip_section(y1, y2, numrows, flipped and flip_y)
+        o1, o2 = flip_section(x2, numcols, numcols, flipped and flip_x)
+
+        row0 = pos_y[amp] * ydata
+        col0 = pos_x[amp] * xdata
+        if row0 + ydata > size[0] or col0 + xdata > size[1]:
+            continue
+        tile = out[row0 : row0 + ydata, col0 : col0 + xdata]
+
+        # orient tile view so data is copied in readout order
+        if not flipped:
+            if flip_x:
+                tile = tile[:, ::-1]
+            if flip_y:
+                tile = tile[::-1, :]
+
+        numpy.copyto(tile, cube[amp, r1:r2, c1:c2], casting="unsafe")
+
+        if o2 > o1 and overscan == "row":
+            tile -= cube[amp, r1:r2, o1:o2].mean(axis=1, dtype="float32")[:, None]
+        elif o2 > o1 and overscan == "mean":
+            tile -= cube[amp, r1:r2, o1:o2].mean(dtype="float32")
+
+    return out
@@ -23,6 +23,9 @@ class Telescope(Tools, ObjectHeaderMethods):
         self.header = Header("Telescope")
         self.header.set_header("telescope", 5)
 
+        # keywords which do not change between exposures
+        self.static_keywords = ["TELESCOP", "OBSERVAT"]
+
         azcam.db.tools_init["telescope"] = self
         azcam.db.tools_reset["telescope"] = self
 
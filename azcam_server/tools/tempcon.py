@@ -51,6 +51,9 @@ class TempCon(Tools, ObjectHeaderMethods):
         self.header = Header("Temperature")
         self.header.set_header("tempcon", 4)
 
+        # keywords which do not change between exposures
+        self.static_keywords = ["TEMPUNIT"]
+
         # add keywords
         self.define_keywords()
 
@@ -0,0 +1,135 @@
+"""
+Contains the TilePyramid class.
+"""
+
+import collections
+import hashlib
+import math
+import threading
+
+import numpy
+
+import azcam
+from azcam_server.tools.preview_image import block_reduce, encode_png, scale_to_bytes, zscale_limits
+
+
+class TilePyramid(object):
+    """
+    Multi-resolution PNG tiles of a large image for pan and zoom browsing.
+    Zoom 0 is a single tile covering the whole image and each zoom level doubles
+    the resolution up to full resolution at max_zoom. Tile (0, 0) is at the top left.
+    Tiles are computed from the in-memory image only when requested and kept
+    in a least recently used cache. All tiles of a frame use the same stretch.
+    """
+
+    def __init__(self, tile_size=256, cache_length=512):
+
+        # tile size in pixels
+        self.tile_size = tile_size
+        # number of cached tiles
+        self.cache_length = cache_length
+
+        # cached tiles as (content, etag) by (frame, zoom, x, y)
+        self.cache = collections.OrderedDict()
+
+        # current image and its frame number
+        self.data = None
+        self.frame = None
+        # zscale display limits of current image
+        self.limits = (0.0, 1.0)
+        # full resolution zoom level of current image
+        self.max_zoom = 0
+
+        self.lock = threading.Lock()
+
+    def set_image(self, data, frame, contrast=0.25):
+        """
+        Set the 2D image for tiles, identified by frame number.
+        Cached tiles of the previous image are dropped.
+        """
+
+        with self.lock:
+            if frame == self.frame and data is self.data:
+                return
+
+            self.cache.clear()
+            self.data = data
+            self.frame = frame
+            self.limits = zscale_limits(data, contrast=contrast)
+            self.max_zoom = max(0, math.ceil(math.log2(max(data.shape) / self.tile_size)))
+
+        return
+
+    def get_info(self):
+        """
+        Return the current frame, image shape, tile size, maximum zoom,
+        and [rows, cols] of tiles at each zoom level as a dictionary.
+        """
+
+        with self.lock:
+            if self.data is None:
+                return {"frame": 0, "shape": [0, 0], "tile_size": self.tile_size, "max_zoom": 0}
+
+            tiles = []
+            for zoom in range(self.max_zoom + 1):
+                span = self.tile_size * 2 ** (self.max_zoom - zoom)
+                tiles.append([math.ceil(n / span) for n in self.data.shape])
+
+            return {
+                "frame": self.frame,
+                "shape": list(self.data.shape),
+                "tile_size": self.tile_size,
+                "max_zoom": self.max_zoom,
+                "tiles": tiles,
+            }
+
+    def get_tile(self, zoom, x, y):
+        """
+        Return (content, etag) of the PNG tile at zoom level, column x, and row y.
+        Edge tiles are padded with black to the full tile size.
+        """
+
+        zoom = int(zoom)
+        x = int(x)
+        y = int(y)
+
+        with self.lock:
+            if self.data is None:
+                raise azcam.AzcamError("No image available for tiles")
+
+            key = (self.frame, zoom, x, y)
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+
+            data = self.data
+            limits = self.limits
+            max_zoom = self.max_zoom
+
+        if not 0 <= zoom <= max_zoom:
+            raise azcam.AzcamError(f"Invalid tile zoom {zoom}")
+
+        # full resolution pixels of tile, with image rows from the top
+        factor = 2 ** (max_zoom - zoom)
+        span = self.tile_size * factor
+        region = data[::-1][y * span : (y + 1) * span, x * span : (x + 1) * span]
+        if x < 0 or y < 0 or region.size == 0:
+            raise azcam.AzcamError(f"Invalid tile {x} {y} for zoom {zoom}")
+
+        if factor > 1:
+            region = block_reduce(region, factor)
+
+        tile = numpy.zeros((self.tile_size, self.tile_size), dtype="uint8")
+        tile[: region.shape[0], : region.shape[1]] = scale_to_bytes(region, *limits)
+
+        content = encode_png(tile)
+        etag = '"' + hashlib.md5(content).hexdigest() + '"'
+
+        with self.lock:
+            # image may have changed while tile was made
+            if key[0] == self.frame:
+                self.cache[key] = (content, etag)
+                while len(self.cache) > self.cache_length:
+                    self.cache.popitem(last=False)
+
+        return content, etag
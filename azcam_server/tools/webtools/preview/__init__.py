@@ -0,0 +1,3 @@
+"""
+Preview web tool.
+"""
@@ -0,0 +1,213 @@
+"""
+Browser-based image preview.
+"""
+
+import collections
+import hashlib
+import threading
+
+import azcam
+
+from fastapi import Request, APIRouter, HTTPException, Query
+from fastapi.responses import Response, JSONResponse
+
+from azcam_server.tools.preview_image import encode_jpeg, encode_png, make_preview
+from azcam_server.tools.tile_pyramid import TilePyramid
+
+
+class Preview(object):
+    """
+    Implement fastapi based PNG and JPEG previews of the last image.
+    Previews are made from the exposure quick-look image and cached for each
+    frame, size, and format, so any number of viewers share one computation.
+    Large images may be browsed as zoom/x/y tiles of a multi-resolution pyramid.
+    """
+
+    def __init__(self):
+
+        self.router = APIRouter(
+            prefix="/preview",
+        )
+
+        # default preview size in pixels
+        self.size = 512
+        # largest preview size in pixels
+        self.max_size = 4096
+        # zscale contrast
+        self.contrast = 0.25
+        # JPEG quality
+        self.jpeg_quality = 85
+        # 1 to set exposure quicklook_enable on initialize, previews are made from
+        # the quick-look image and are not available without it
+        self.enable_quicklook = 1
+
+        # number of cached previews
+        self.cache_length = 8
+        # cached previews as (content, etag) by (frame, size, format)
+        self.cache = collections.OrderedDict()
+
+        self.lock = threading.Lock()
+
+        # tiles of the quick-look image
+        self.pyramid = TilePyramid()
+
+    def initialize(self):
+        """
+        Initialize preview.
+        """
+
+        if self.enable_quicklook:
+            azcam.db.tools["exposure"].quicklook_enable = 1
+
+        @self.router.get("/image")
+        def image(
+            request: Request, size: int = 0, image_format: str = Query("png", alias="format")
+        ):
+            """
+            Preview image of the last readout, such as /preview/image?size=512&format=png
+            """
+
+            try:
+                content, etag = self.get_preview(size, image_format)
+            except azcam.AzcamError as e:
+                raise HTTPException(status_code=404, detail=str(e))
+
+            media_type = "image/jpeg" if image_format.lower() in ["jpg", "jpeg"] else "image/png"
+
+            return self._image_response(request, content, etag, media_type)
+
+        @self.router.get("/tile/{zoom}/{x}/{y}")
+        def tile(request: Request, zoom: int, x: int, y: int):
+            """
+            PNG tile of the last readout, such as /preview/tile/2/1/3
+            """
+
+            try:
+                content, etag = self.get_tile(zoom, x, y)
+            except azcam.AzcamError as e:
+                raise HTTPException(status_code=404, detail=str(e))
+
+            return self._image_response(request, content, etag, "image/png")
+
+        @self.router.get("/tiles", response_class=JSONResponse)
+        def tiles():
+            """
+            Tile size, zoom levels and number of tiles of the current image.
+            """
+
+            return JSONResponse(self.get_tile_info())
+
+        @self.router.get("/info", response_class=JSONResponse)
+        def info():
+            """
+            Frame number and size of the image available for preview.
+            """
+
+            return JSONResponse(self.get_info())
+
+        azcam.db.tools["webserver"].add_router(self.router)
+
+        return
+
+    def get_info(self):
+        """
+        Return the frame number and [rows, cols] of the current quick-look image.
+        Frame is 0 if no image is available.
+        """
+
+        exposure = azcam.db.tools["exposure"]
+        quicklook = exposure.get_quicklook()
+
+        if quicklook is None:
+            return {"frame": 0, "shape": [0, 0]}
+
+        return {"frame": exposure.quicklook_number, "shape": list(quicklook.shape)}
+
+    def get_preview(self, size=0, image_format="png"):
+        """
+        Return (content, etag) of a preview of the last readout.
+        size is the largest preview dimension in pixels, 0 for the default size.
+        image_format is "png" or "jpeg".
+        """
+
+        image_format = image_format.lower()
+        if image_format == "jpg":
+            image_format = "jpeg"
+        if image_format not in ["png", "jpeg"]:
+            raise azcam.AzcamError(f"Invalid preview format {image_format}")
+
+        size = self.size if int(size) <= 0 else min(int(size), self.max_size)
+
+        exposure = azcam.db.tools["exposure"]
+
+        with self.lock:
+            quicklook = exposure.get_quicklook()
+            if quicklook is None:
+                raise azcam.AzcamError("No image available for preview")
+
+            key = (exposure.quicklook_number, size, image_format)
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+
+            preview = make_preview(quicklook, size, self.contrast)
+            if image_format == "png":
+                content = encode_png(preview)
+            else:
+                content = encode_jpeg(preview, self.jpeg_quality)
+
+            etag = '"' + hashlib.md5(content).hexdigest() + '"'
+
+            self.cache[key] = (content, etag)
+            while len(self.cache) > self.cache_length:
+                self.cache.popitem(last=False)
+
+        return content, etag
+
+    def get_tile_info(self):
+        """
+        Return the tile pyramid description of the current quick-look image.
+        """
+
+        self._update_pyramid()
+
+        return self.pyramid.get_info()
+
+    def get_tile(self, zoom, x, y):
+        """
+        Return (content, etag) of a PNG tile of the last readout.
+        zoom is 0 for the whole image in one tile, x and y are the tile column and
+        row from the top left.
+        """
+
+        if not self._update_pyramid():
+            raise azcam.AzcamError("No image available for tiles")
+
+        return self.pyramid.get_tile(zoom, x, y)
+
+    def _update_pyramid(self):
+        """
+        Set the current quick-look image in the tile pyramid.
+        Returns False if no image is available.
+        """
+
+        exposure = azcam.db.tools["exposure"]
+        quicklook = exposure.get_quicklook()
+        if quicklook is None:
+            return False
+
+        self.pyramid.set_image(quicklook, exposure.quicklook_number, self.contrast)
+
+        return True
+
+    def _image_response(self, request, content, etag, media_type):
+        """
+        Return an image response, or 304 if the browser has the same image.
+        """
+
+        # browsers must revalidate, which is cheap with the ETag
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+
+        return Response(content, media_type=media_type, headers=headers)
@@ -21,8 +21,22 @@ $(document).ready(function() {
         return false;
     }
 
+    // show preview of last image when a new frame is available
+    var previewframe = 0;
+    function getpreview() {
+        $.getJSON('/preview/info', {}, function(data) {
+            if (data.frame > 0 && data.frame != previewframe) {
+                previewframe = data.frame;
+                $("#preview").attr("src", "/preview/image?size=512&frame=" + data.frame);
+                $("#previewcard").show();
+            }
+        });
+        return false;
+    }
+
     // set timer to get status
     setInterval(getstatus, 1000);
+    setInterval(getpreview, 2000);
 
 
 }); // end ready
\ No newline at end of file
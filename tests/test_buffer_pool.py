@@ -0,0 +1,75 @@
+"""
+Tests for the image buffer pool.
+"""
+
+import mmap
+
+from azcam_server.tools.buffer_pool import BufferPool
+
+
+def test_get_aligned():
+    pool = BufferPool()
+    buffer = pool.get((100, 200), "<u2")
+
+    assert buffer.shape == (100, 200)
+    assert buffer.dtype == "<u2"
+    assert buffer.ctypes.data % mmap.PAGESIZE == 0
+
+
+def test_release_reuses_buffer():
+    pool = BufferPool()
+    buffer = pool.get((100, 200))
+    pool.release(buffer)
+
+    assert pool.get((100, 200)) is buffer
+    assert pool.get((100, 200)) is not buffer
+    assert pool.get_status()["reused"] == 1
+
+
+def test_release_twice():
+    pool = BufferPool()
+    buffer = pool.get((10, 10))
+    pool.release(buffer)
+    pool.release(buffer)
+
+    assert pool.get((10, 10)) is buffer
+    assert pool.get((10, 10)) is not buffer
+
+
+def test_held_buffer_not_reused():
+    pool = BufferPool()
+    buffer = pool.get((100, 200))
+    held = pool.hold(buffer)
+
+    # owner releases while the buffer is still held
+    pool.release(buffer)
+    other = pool.get((100, 200))
+    assert other is not buffer
+
+    pool.release(held)
+    assert pool.get((100, 200)) is buffer
+    assert pool.get_status()["held_buffers"] == 0
+
+
+def test_hold_none():
+    pool = BufferPool()
+
+    assert pool.hold(None) is None
+    pool.release(None)
+
+
+def test_max_free_bytes():
+    pool = BufferPool(max_free_bytes=2500)
+    first = pool.get((1000,), "uint8")
+    second = pool.get((1000,), "uint16")
+    pool.release(first)
+    pool.release(second)
+
+    # least recently used buffer is dropped to stay under the limit
+    assert pool.free_bytes == 2000
+    assert pool.get((1000,), "uint16") is second
+    assert pool.get((1000,), "uint8") is not first
+
+    large = pool.get((4000,), "uint8")
+    pool.release(large)
+    assert pool.free_bytes == 0
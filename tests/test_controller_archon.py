@@ -0,0 +1,122 @@
+"""
+Tests for Archon FETCH data transfers.
+"""
+
+import socket
+import threading
+
+import numpy
+import pytest
+
+import azcam
+from azcam_server.tools.archon.controller_archon import (
+    BURST_LEN,
+    ControllerArchon,
+    decode_fetch_blocks,
+)
+
+
+def make_fetch_blocks(pixels):
+    """
+    Return FETCH reply bytes for uint16 pixels, padded to whole blocks.
+    """
+
+    data = numpy.asarray(pixels, dtype="<u2").tobytes()
+    lines = -(-len(data) // BURST_LEN)
+    data = data.ljust(lines * BURST_LEN, b"\0")
+
+    blocks = b""
+    for line in range(lines):
+        blocks += b"<%02X:" % (line & 0xFF) + data[line * BURST_LEN : (line + 1) * BURST_LEN]
+
+    return blocks, lines
+
+
+class FakeSocketInterface(object):
+    """
+    Socket interface on one end of a socket pair, the test writes replies to the other end.
+    """
+
+    def __init__(self, sock):
+        self.socket = sock
+        self.cmd_id = 0
+        self.lastcmd_id = 0
+        self.commands = []
+
+    def open(self):
+        return True
+
+    def close(self):
+        return
+
+    def set_timeout(self, timeout):
+        return
+
+    def send(self, command, terminator):
+        self.commands.append(command)
+
+
+def test_decode_fetch_blocks():
+    pixels = numpy.arange(1000, dtype="<u2")
+    blocks, lines = make_fetch_blocks(pixels)
+
+    data = decode_fetch_blocks(blocks, lines, len(pixels))
+
+    assert numpy.array_equal(data, pixels)
+
+
+def test_decode_fetch_blocks_bad_preamble():
+    blocks, lines = make_fetch_blocks(numpy.zeros(100))
+    blocks = b"<00;" + blocks[4:]
+
+    with pytest.raises(azcam.AzcamError):
+        decode_fetch_blocks(blocks, lines, 100)
+
+
+@pytest.mark.parametrize("use_data_connection", [0, 1])
+def test_fetch_data(use_data_connection):
+    pixels = numpy.arange(3000, dtype="<u2")
+    blocks, lines = make_fetch_blocks(pixels)
+
+    controller = ControllerArchon()
+    controller.use_data_connection = use_data_connection
+
+    local, remote = socket.socketpair()
+    server = FakeSocketInterface(local)
+    if use_data_connection:
+        controller.dataserver = server
+    else:
+        controller.camserver = server
+    remote.sendall(blocks)
+
+    result = {}
+
+    def fetch():
+        result["data"] = controller.fetch_data(0x100, lines, len(pixels))
+
+    # a deadlock on the connection lock would never return
+    thread = threading.Thread(target=fetch, daemon=True)
+    thread.start()
+    thread.join(5.0)
+
+    local.close()
+    remote.close()
+
+    assert not thread.is_alive()
+    assert server.commands[0].endswith("FETCH%08X%08X" % (0x100, lines))
+    assert numpy.array_equal(result["data"], pixels)
+
+
+def test_fetch_data_short_read():
+    blocks, lines = make_fetch_blocks(numpy.zeros(2000))
+
+    controller = ControllerArchon()
+    local, remote = socket.socketpair()
+    controller.dataserver = FakeSocketInterface(local)
+    remote.sendall(blocks[:-10])
+    remote.close()
+
+    with pytest.raises(azcam.AzcamError):
+        controller.fetch_data(0, lines, 2000)
+
+    local.close()
@@ -0,0 +1,88 @@
+"""
+Tests for Archon ROI readout.
+"""
+
+import types
+
+import numpy
+import pytest
+
+import azcam
+from azcam_server.tools.archon.controller_archon import BURST_LEN
+from azcam_server.tools.archon.exposure_archon import (
+    ArchonFileConverter,
+    ExposureArchon,
+    ReceiveDataArchon,
+)
+
+WIDTH = 40
+HEIGHT = 30
+
+
+class FakeController(object):
+    """
+    Controller with one frame in buffer 1, read with fetch_data().
+    """
+
+    def __init__(self, frame):
+        self.read_buffer = 1
+        self.dict_frame = {
+            "BUF1FRAME": "1",
+            "BUF1BASE": "0",
+            "BUF1WIDTH": str(frame.shape[1]),
+            "BUF1SAMPLE": "0",
+            "BUF1PIXELS": str(frame.shape[1]),
+            "BUF1LINES": str(frame.shape[0]),
+        }
+        self.memory = frame.astype("<u2").tobytes() + bytes(2 * BURST_LEN)
+
+    def fetch_data(self, address, lines, numpix):
+        data = numpy.frombuffer(self.memory[address : address + lines * BURST_LEN], "<u2")
+        return data[:numpix]
+
+
+@pytest.fixture
+def exposure(monkeypatch):
+    frame = numpy.arange(WIDTH * HEIGHT, dtype="<u2").reshape(HEIGHT, WIDTH)
+
+    converter = ArchonFileConverter()
+    converter.numparamps = 1
+    converter.numseramps = 1
+    converter.extpos_x = [1]
+    converter.extpos_y = [1]
+    converter.amp_cfg = [0]
+
+    exposure = ExposureArchon.__new__(ExposureArchon)
+    exposure.fileconverter = converter
+    exposure.receive_data = ReceiveDataArchon(exposure)
+    exposure.frame = frame
+
+    image = types.SimpleNamespace(focalplane=types.SimpleNamespace(num_detectors=1))
+    monkeypatch.setitem(azcam.db.tools, "controller", FakeController(frame))
+    monkeypatch.setitem(azcam.db.tools, "exposure", types.SimpleNamespace(image=image))
+
+    return exposure
+
+
+def test_readout_roi_full_frame(exposure):
+    roi = exposure.readout_roi(1, 1, -1, 1, -1)
+
+    assert numpy.array_equal(roi, exposure.frame)
+
+
+def test_readout_roi_starts_at_one(exposure):
+    roi = exposure.readout_roi(1, 3, 5, 2, 4)
+
+    assert numpy.array_equal(roi, exposure.frame[1:4, 2:5])
+
+
+def test_readout_roi_last_row_and_column(exposure):
+    roi = exposure.readout_roi(1, WIDTH, WIDTH, HEIGHT, HEIGHT)
+
+    assert roi.shape == (1, 1)
+    assert roi[0, 0] == exposure.frame[-1, -1]
+
+
+def test_readout_roi_outside_image(exposure):
+    with pytest.raises(azcam.AzcamError):
+        exposure.readout_roi(1, 1, WIDTH + 1, 1, -1)
@@ -0,0 +1,147 @@
+"""
+Tests for exposure header updates and static keywords.
+"""
+
+import threading
+
+from astropy.io import fits as pyfits
+import pytest
+
+import azcam
+from azcam.header import Header, ObjectHeaderMethods
+from azcam_server.tools.exposure import Exposure
+
+
+class HeaderTool(ObjectHeaderMethods):
+    """
+    Tool with one static and one dynamic keyword which counts reads.
+    """
+
+    def __init__(self):
+        self.is_enabled = 1
+        self.is_initialized = 1
+        self.static_keywords = ["STATKEY"]
+        self.reads = {"STATKEY": 0, "DYNKEY": 0}
+
+        self.header = Header("Test")
+        self.header.set_header("testtool")
+        azcam.db.tools["testtool"] = self
+
+    def define_keywords(self):
+        for keyword in self.reads:
+            if keyword not in self.header.keywords:
+                self.header.set_keyword(keyword, 0, f"{keyword} value", "int")
+
+    def get_keyword(self, keyword):
+        self.reads[keyword] += 1
+        self.header.set_keyword(keyword, self.reads[keyword], f"{keyword} value", "int")
+
+        return self.header.get_keyword(keyword)
+
+
+@pytest.fixture
+def exposure():
+    tools = dict(azcam.db.tools)
+    headers = dict(azcam.db.headers)
+    headerorder = list(azcam.db.headerorder)
+
+    exposure = Exposure()
+    tool = HeaderTool()
+    exposure.image.filename = "test.fits"
+
+    yield exposure, tool
+
+    if exposure.header_pool is not None:
+        exposure.header_pool.shutdown()
+    azcam.db.tools.clear()
+    azcam.db.tools.update(tools)
+    azcam.db.headers.clear()
+    azcam.db.headers.update(headers)
+    azcam.db.headerorder[:] = headerorder
+
+
+def write_primary_header(exposure, filename):
+    phdu = pyfits.PrimaryHDU()
+    exposure.image._write_PHU(phdu)
+    phdu.writeto(filename)
+
+    return pyfits.getheader(filename)
+
+
+def test_static_keywords_written(exposure, tmp_path):
+    exposure, tool = exposure
+
+    for number in range(3):
+        exposure.update_headers()
+        header = write_primary_header(exposure, tmp_path / f"test{number}.fits")
+
+        assert header["STATKEY"] == 1
+        assert header["DYNKEY"] == number + 1
+        assert list(header.keys()).count("STATKEY") == 1
+
+    # static keyword is read once and rendered once
+    assert tool.reads["STATKEY"] == 1
+    assert "STATKEY" not in azcam.db.headers["testtool"].keywords
+    assert "STATKEY" in exposure.static_header.keywords
+
+
+def test_static_keywords_invalidated(exposure, tmp_path):
+    exposure, tool = exposure
+
+    exposure.update_headers()
+    exposure.invalidate_static_headers()
+    exposure.update_headers()
+    header = write_primary_header(exposure, tmp_path / "test.fits")
+
+    assert tool.reads["STATKEY"] == 2
+    assert header["STATKEY"] == 2
+
+
+def test_static_headers_disabled(exposure, tmp_path):
+    exposure, tool = exposure
+    exposure.use_static_headers = 0
+
+    exposure.update_headers()
+    exposure.update_headers()
+    header = write_primary_header(exposure, tmp_path / "test.fits")
+
+    assert tool.reads["STATKEY"] == 2
+    assert header["STATKEY"] == 2
+    assert len(exposure.static_header.keywords) == 0
+
+
+def test_late_header_not_published(exposure, tmp_path):
+    exposure, tool = exposure
+    exposure.header_timeout = 0.2
+
+    exposure.update_headers()
+    tool_header = tool.header
+
+    # a tool which is slower than the header timeout
+    started = threading.Event()
+    release = threading.Event()
+    get_keyword = tool.get_keyword
+
+    def slow_get_keyword(keyword):
+        started.set()
+        release.wait(5.0)
+        return get_keyword(keyword)
+
+    tool.get_keyword = slow_get_keyword
+    exposure.update_headers()
+    assert started.is_set()
+
+    header = write_primary_header(exposure, tmp_path / "test.fits")
+    assert header["DYNKEY"] == 1
+    assert "testtool" in header["HDRSTALE"]
+
+    # keywords set by commands during the update are kept in the tool header
+    tool.set_keyword("CMDKEY", 5, "Command keyword", "int")
+    release.set()
+    exposure.header_futures["testtool"].result(5.0)
+
+    assert tool.header is tool_header
+    assert tool.header.values["CMDKEY"] == 5
+    assert tool.header.values["DYNKEY"] == 2
+    assert azcam.db.headers["testtool"] is not tool_header
+    assert azcam.db.headers["testtool"].values["DYNKEY"] == 1
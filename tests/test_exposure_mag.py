@@ -0,0 +1,84 @@
+"""
+Tests for Magellan readout waits on the pixel counter.
+"""
+
+import time
+
+import pytest
+
+import azcam
+from azcam_server.tools.mag.exposure_mag import ExposureMag
+
+NUMPIX = 100000
+
+
+class FakeController(object):
+    """
+    Pixel counter which shows a stale count, then counts down at rate pixels per second.
+    """
+
+    def __init__(self, stale, stale_time, rate):
+        self.stale = stale
+        self.stale_time = stale_time
+        self.rate = rate
+        self.start = time.monotonic()
+
+    def get_pixels_remaining(self):
+        elapsed = time.monotonic() - self.start
+        if elapsed < self.stale_time:
+            return self.stale
+
+        return max(0, int(NUMPIX - self.rate * (elapsed - self.stale_time)))
+
+
+@pytest.fixture
+def exposure(monkeypatch):
+    monkeypatch.setattr(azcam, "log", lambda *args, **kwargs: None)
+
+    exposure = ExposureMag.__new__(ExposureMag)
+    exposure.exposureflags = {"ABORT": 1, "READOUT": 2}
+    exposure._exposure_flag = exposure.exposureflags["READOUT"]
+    exposure.curr_delay = 0
+    exposure.readout_rate = 0.0
+    exposure.readout_rate_weight = 0.3
+    exposure.readout_poll_time = 0.01
+    exposure.readout_rate_min_time = 0.1
+    exposure.readout_timeout_factor = 3.0
+    exposure.readout_timeout_min = 5.0
+
+    def set_controller(controller):
+        monkeypatch.setitem(azcam.db.tools, "controller", controller)
+
+    return exposure, set_controller
+
+
+@pytest.mark.parametrize("stale", [0, 30000])
+def test_stale_count_not_measured(exposure, stale):
+    exposure, set_controller = exposure
+    set_controller(FakeController(stale, 0.05, NUMPIX / 0.4))
+
+    exposure.wait_readout(NUMPIX)
+
+    assert exposure.pixels_remaining == 0
+    assert NUMPIX / 0.4 * 0.7 < exposure.readout_rate < NUMPIX / 0.4 * 1.3
+
+
+def test_short_readout_not_measured(exposure):
+    exposure, set_controller = exposure
+    set_controller(FakeController(NUMPIX, 0.0, NUMPIX / 0.02))
+
+    exposure.wait_readout(NUMPIX)
+
+    assert exposure.pixels_remaining == 0
+    assert exposure.readout_rate == 0.0
+
+
+def test_zero_count_accepted(exposure):
+    exposure, set_controller = exposure
+    set_controller(FakeController(0, 10.0, 0))
+
+    start = time.monotonic()
+    exposure.wait_readout(NUMPIX)
+
+    assert time.monotonic() - start < 1.0
+    assert exposure.readout_rate == 0.0
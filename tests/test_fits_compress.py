@@ -0,0 +1,76 @@
+"""
+Tests for tile compressed MEF files written by worker processes.
+"""
+
+import numpy
+import pytest
+from astropy.io import fits as pyfits
+
+import azcam
+from azcam_server.tools.fits_compress import CompressedFitsWriter
+
+SHAPE = (2, 20, 30)
+
+
+def make_headers():
+    primary = pyfits.Header()
+    primary["OBJECT"] = ("test", "Object name")
+
+    ext_headers = []
+    ext_names = []
+    for ext in range(SHAPE[0]):
+        header = pyfits.Header()
+        header["AMPNAME"] = (f"amp{ext}", "Amplifier name")
+        ext_headers.append(header.tostring())
+        ext_names.append(f"im{ext + 1}")
+
+    return primary.tostring(), ext_headers, ext_names
+
+
+@pytest.fixture
+def writer():
+    writer = CompressedFitsWriter()
+    yield writer
+    writer.close()
+
+
+def make_data():
+    data = numpy.arange(SHAPE[0] * SHAPE[1] * SHAPE[2], dtype="<u2")
+
+    return data.reshape(SHAPE[0], SHAPE[1] * SHAPE[2])
+
+
+@pytest.mark.parametrize("compression_type", ["RICE_1", "GZIP_2", "NONE"])
+def test_round_trip(writer, tmp_path, compression_type):
+    filename = str(tmp_path / "test.fits")
+    data = make_data()
+
+    size = writer.write_data(
+        filename, data, SHAPE, "<u2", *make_headers(), compression_type=compression_type
+    )
+
+    with pyfits.open(filename) as hdulist:
+        assert size == writer.filesize > 0
+        assert hdulist[0].header["OBJECT"] == "test"
+        assert len(hdulist) == SHAPE[0] + 1
+        for ext in range(SHAPE[0]):
+            hdu = hdulist[f"im{ext + 1}"]
+            assert hdu.header["AMPNAME"] == f"amp{ext}"
+            assert numpy.array_equal(hdu.data, data[ext].reshape(SHAPE[1:]))
+
+
+def test_timeout_restarts_pool(writer, tmp_path):
+    data = make_data()
+
+    # starting the first worker takes longer than the timeout
+    writer.timeout = 0.001
+    with pytest.raises(azcam.AzcamError):
+        writer.write_data(str(tmp_path / "slow.fits"), data, SHAPE, "<u2", *make_headers())
+    assert writer.pool is None
+
+    writer.timeout = 60.0
+    filename = str(tmp_path / "test.fits")
+    writer.write_data(filename, data, SHAPE, "<u2", *make_headers())
+
+    with pyfits.open(filename) as hdulist:
+        assert numpy.array_equal(hdulist[1].data, data[0].reshape(SHAPE[1:]))
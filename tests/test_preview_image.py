@@ -0,0 +1,129 @@
+"""
+Tests for preview images and the quick-look image they are made from.
+"""
+
+import struct
+import types
+import zlib
+
+import numpy
+
+from azcam_server.tools.exposure import Exposure
+from azcam_server.tools.exposure_timeline import ExposureTimeline
+from azcam_server.tools.preview_image import (
+    block_reduce,
+    encode_png,
+    make_preview,
+    scale_to_bytes,
+    zscale_limits,
+)
+
+
+def decode_png(content):
+    """
+    Return the uint8 pixels of a grayscale PNG made by encode_png.
+    """
+
+    assert content[:8] == b"\x89PNG\r\n\x1a\n"
+
+    chunks = {}
+    position = 8
+    while position < len(content):
+        (length,) = struct.unpack(">I", content[position : position + 4])
+        name = content[position + 4 : position + 8]
+        chunks[name] = content[position + 8 : position + 8 + length]
+        position += 12 + length
+
+    width, height = struct.unpack(">II", chunks[b"IHDR"][:8])
+    raw = numpy.frombuffer(zlib.decompress(chunks[b"IDAT"]), "uint8")
+
+    return raw.reshape(height, width + 1)[:, 1:]
+
+
+def test_block_reduce():
+    data = numpy.arange(7 * 9, dtype="uint16").reshape(7, 9)
+
+    reduced = block_reduce(data, 3)
+
+    assert reduced.shape == (2, 3)
+    assert reduced.dtype == "float32"
+    assert reduced[1, 2] == data[3:6, 6:9].mean()
+
+
+def test_zscale_limits_ramp():
+    data = numpy.arange(10000, dtype="float32").reshape(100, 100)
+
+    z1, z2 = zscale_limits(data, contrast=1.0)
+
+    assert abs(z1) < 50
+    assert abs(z2 - 9999) < 50
+
+
+def test_zscale_limits_constant():
+    z1, z2 = zscale_limits(numpy.full((10, 10), 7.0))
+
+    assert z1 == z2 == 7.0
+    assert scale_to_bytes(numpy.full((2, 2), 7.0, "float32"), z1, z2).max() == 0
+
+
+def test_scale_to_bytes():
+    data = numpy.array([[-10, 0, 50, 100, 200]], dtype="float32")
+
+    assert scale_to_bytes(data, 0, 100).tolist() == [[0, 0, 127, 255, 255]]
+
+
+def test_make_preview():
+    data = numpy.zeros((1000, 600), dtype="float32")
+    data[:10] = 1000.0
+
+    preview = make_preview(data, 250)
+
+    assert preview.shape == (250, 150)
+    assert preview.dtype == "uint8"
+
+    # first image row is at the bottom
+    assert preview[-1].min() > preview[0].max()
+
+
+def test_encode_png():
+    image = numpy.arange(12 * 20, dtype="uint8").reshape(12, 20)
+
+    assert numpy.array_equal(decode_png(encode_png(image)), image)
+
+
+def test_quicklook_not_reused():
+    focalplane = types.SimpleNamespace(
+        numamps_x=1,
+        numamps_y=1,
+        numrows_amp=4,
+        numcols_amp=6,
+        xdata=4,
+        ydata=4,
+        xunderscan=0,
+        yunderscan=0,
+        extpos_x=[1],
+        extpos_y=[1],
+        amp_cfg=[0],
+    )
+
+    exposure = Exposure.__new__(Exposure)
+    exposure.quicklook_enable = 1
+    exposure.display_quicklook = 0
+    exposure.quicklook_overscan = "none"
+    exposure.quicklook = None
+    exposure.quicklook_number = 0
+    exposure.timeline = ExposureTimeline()
+    exposure.image = types.SimpleNamespace(focalplane=focalplane)
+
+    exposure.image.data = numpy.ones((1, 24), dtype="uint16")
+    exposure.update_quicklook()
+    published = exposure.get_quicklook()
+
+    exposure.image.data = numpy.full((1, 24), 2, dtype="uint16")
+    exposure.update_quicklook()
+
+    # a preview or tile pyramid using the previous image is not changed
+    assert exposure.quicklook_number == 2
+    assert exposure.get_quicklook() is not published
+    assert numpy.all(published == 1)
+    assert numpy.all(exposure.get_quicklook() == 2)
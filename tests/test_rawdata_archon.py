@@ -0,0 +1,67 @@
+"""
+Tests for Archon raw channel data.
+"""
+
+import numpy
+import pytest
+from astropy.io import fits as pyfits
+
+import azcam
+from azcam_server.tools.archon.rawdata_archon import RawDataArchon
+
+
+class FakeController(object):
+    """
+    Controller which records header keywords.
+    """
+
+    def __init__(self):
+        self.keywords = {}
+
+    def set_keyword(self, keyword, value, comment, typestring):
+        self.keywords[keyword] = value
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    controller = FakeController()
+    monkeypatch.setitem(azcam.db.tools, "controller", controller)
+
+    return controller
+
+
+def make_rawdata(lines=4, frequency=1.0e6):
+    rawdata = RawDataArchon()
+    time = numpy.arange(lines * rawdata.block_samples) * rawdata.sample_time
+    samples = 1000 + 10 * numpy.sin(2 * numpy.pi * frequency * time)
+
+    return rawdata, samples.astype("uint16")
+
+
+def test_not_analyzed_by_default(controller):
+    rawdata, samples = make_rawdata()
+
+    rawdata.analyze(samples, 2, 1)
+
+    assert rawdata.data.shape == (4, rawdata.block_samples)
+    assert rawdata.noise_density is None
+    assert rawdata.get_stats() == {"channel": 2, "lines": 4, "samples": rawdata.block_samples}
+    assert controller.keywords == {}
+
+
+def test_analyze(controller, tmp_path):
+    rawdata, samples = make_rawdata(frequency=1.0e6)
+    rawdata.analyze_enable = 1
+
+    rawdata.analyze(samples, 2, 1)
+    stats = rawdata.get_stats()
+
+    assert abs(stats["peak_frequency"] - 1.0e6) < 2.0e5
+    assert controller.keywords["RAWCHAN"] == 2
+    assert abs(controller.keywords["RAWMEAN"] - stats["mean"]) < 0.01
+
+    rawdata.write_file(str(tmp_path / "test.fits"))
+    rawdata.write_thread.join()
+    with pyfits.open(tmp_path / "test_raw.fits") as hdulist:
+        assert hdulist[0].header["RAWCHAN"] == 2
+        assert len(hdulist["SPECTRUM"].data) == rawdata.block_samples // 2 + 1
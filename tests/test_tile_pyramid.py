@@ -0,0 +1,74 @@
+"""
+Tests for preview image tiles.
+"""
+
+import numpy
+import pytest
+
+import azcam
+from azcam_server.tools.tile_pyramid import TilePyramid
+
+from .test_preview_image import decode_png
+
+
+def test_no_image():
+    pyramid = TilePyramid()
+
+    assert pyramid.get_info()["frame"] == 0
+    with pytest.raises(azcam.AzcamError):
+        pyramid.get_tile(0, 0, 0)
+
+
+def test_info():
+    pyramid = TilePyramid(tile_size=64)
+    pyramid.set_image(numpy.zeros((300, 200), dtype="float32"), 1)
+
+    info = pyramid.get_info()
+
+    assert info["frame"] == 1
+    assert info["shape"] == [300, 200]
+    assert info["max_zoom"] == 3
+    assert info["tiles"] == [[1, 1], [2, 1], [3, 2], [5, 4]]
+
+
+def test_full_resolution_tile():
+    data = numpy.zeros((100, 100), dtype="float32")
+    data[-1, 0] = 1000.0
+
+    pyramid = TilePyramid(tile_size=64)
+    pyramid.set_image(data, 1)
+
+    # last image row is at the top left
+    tile = decode_png(pyramid.get_tile(1, 0, 0)[0])
+    assert tile.shape == (64, 64)
+    assert tile[0, 0] == 255
+
+    # edge tiles are padded
+    tile = decode_png(pyramid.get_tile(1, 1, 1)[0])
+    assert numpy.all(tile[36:] == 0)
+    assert numpy.all(tile[:, 36:] == 0)
+
+
+def test_invalid_tile():
+    pyramid = TilePyramid(tile_size=64)
+    pyramid.set_image(numpy.zeros((100, 100), dtype="float32"), 1)
+
+    for zoom, x, y in [(2, 0, 0), (1, 2, 0), (1, 0, -1)]:
+        with pytest.raises(azcam.AzcamError):
+            pyramid.get_tile(zoom, x, y)
+
+
+def test_tiles_cached_by_frame():
+    pyramid = TilePyramid(tile_size=64)
+    pyramid.set_image(numpy.zeros((100, 100), dtype="float32"), 1)
+    first = pyramid.get_tile(0, 0, 0)
+
+    assert (1, 0, 0, 0) in pyramid.cache
+    assert pyramid.get_tile(0, 0, 0) == first
+
+    data = numpy.zeros((100, 100), dtype="float32")
+    data[:50] = 100.0
+    pyramid.set_image(data, 2)
+
+    assert pyramid.get_tile(0, 0, 0)[1] != first[1]
+    assert list(pyramid.cache) == [(2, 0, 0, 0)]
@@ -0,0 +1,33 @@
+"""
+Tests for the Magellan UDP discovery host cache.
+"""
+
+import pytest
+
+import azcam
+from azcam_server.tools.mag.udpinterface import UDPinterface
+
+
+@pytest.fixture(autouse=True)
+def log(monkeypatch):
+    monkeypatch.setattr(azcam, "log", lambda *args, **kwargs: None)
+
+
+def test_reply_ip_cached():
+    udp = UDPinterface()
+
+    assert udp._update_host("0 4501 guider_z1 2425 10.0.1.100\r\n") == "guider_z1"
+    assert udp.get_cached_ip("guider_z1") == "10.0.1.100"
+
+    assert udp._update_host("0 4501 guider_z2 2425 10.0.1.101 0\r\n") == "guider_z2"
+    assert udp.get_cached_ip("guider_z2") == "10.0.1.101"
+
+
+@pytest.mark.parametrize(
+    "reply", ["0 4501 guider_z1 2425 10.0.1\r\n", "0 4501 guider_z1 2425 \r\n", "0 4501 guider_z1"]
+)
+def test_invalid_reply_not_cached(reply):
+    udp = UDPinterface()
+
+    assert udp._update_host(reply) is None
+    assert udp.get_cached_ip("guider_z1") is None